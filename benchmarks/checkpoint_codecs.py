@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+"""
+# Checkpoint codec benchmark
+
+Compares save time, load time and size of checkpoints
+in each format, codec and storage dtype, on random float32 weights.
+Weights of trained models compress better than random ones,
+particularly with `shuffle-zlib`; pass `--checkpoint` to use a real checkpoint.
+
+```
+python benchmarks/checkpoint_codecs.py --size 256
+python benchmarks/checkpoint_codecs.py --checkpoint logs/my_experiment/checkpoints/1000
+```
+"""
+import argparse
+import pathlib
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from lab.experiment import checkpoint
+
+TARGETS = [
+    ('npy', None, None),
+    ('packed', None, None),
+    ('packed', 'zlib', None),
+    ('packed', 'lzma', None),
+    ('packed', 'shuffle-zlib', None),
+    ('packed', None, 'float16'),
+    ('packed', None, 'bfloat16'),
+    ('packed', None, 'int8'),
+]
+
+
+def random_arrays(size_mb: int):
+    """
+    Returns float32 arrays of about `size_mb` megabytes,
+    rounded to 2 decimals so that they have some redundancy
+    """
+    rng = np.random.default_rng(0)
+    arrays = {}
+    n = size_mb * 1024 * 1024 // 4
+    i = 0
+    while n > 0:
+        count = min(n, 1024 * 1024)
+        array = rng.standard_normal(count).astype(np.float32)
+        arrays[f"w{i}.npy"] = np.round(array, 2).reshape(-1, 1024)
+        n -= count
+        i += 1
+
+    return {'model': {name: name for name in arrays}}, arrays
+
+
+def load_arrays(path: pathlib.Path):
+    with checkpoint.CheckpointReader(path) as reader:
+        return reader.files, {n: np.array(reader.read(n)) for n in reader.names()}
+
+
+def directory_size(path: pathlib.Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob('*') if f.is_file())
+
+
+def measure(path: pathlib.Path, checkpoint_format: str, codec, storage_dtype,
+            files, arrays, threads):
+    writer = checkpoint.CheckpointWriter(path, path / '.trash',
+                                         checkpoint_format=checkpoint_format,
+                                         codec=codec,
+                                         storage_dtype=storage_dtype,
+                                         threads=threads)
+    start = time.perf_counter()
+    writer.save(1, files, arrays)
+    save_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with checkpoint.CheckpointReader(path / '1', threads=threads) as reader:
+        for name in arrays:
+            # Touch every page of memory mapped arrays
+            reader.read(name).sum()
+    load_time = time.perf_counter() - start
+
+    return save_time, load_time, directory_size(path / '1')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark checkpoint codecs')
+    parser.add_argument('--size', type=int, default=128, help='Size of random weights in MB')
+    parser.add_argument('--checkpoint', help='Use the arrays of this checkpoint')
+    parser.add_argument('--threads', type=int, default=None, help='Compression threads')
+    args = parser.parse_args()
+
+    if args.checkpoint:
+        files, arrays = load_arrays(pathlib.Path(args.checkpoint))
+    else:
+        files, arrays = random_arrays(args.size)
+    raw_size = sum(a.nbytes for a in arrays.values())
+
+    print(f"{'target':<20} {'save (s)':>9} {'load (s)':>9} {'size (MB)':>10} {'ratio':>6}")
+    for checkpoint_format, codec, storage_dtype in TARGETS:
+        path = pathlib.Path(tempfile.mkdtemp())
+        try:
+            save_time, load_time, size = measure(path, checkpoint_format, codec, storage_dtype,
+                                                 files, arrays, args.threads)
+        finally:
+            shutil.rmtree(str(path))
+
+        name = ' '.join(t for t in [checkpoint_format, codec, storage_dtype] if t is not None)
+        print(f"{name:<20} {save_time:>9.2f} {load_time:>9.2f} "
+              f"{size / 1024 / 1024:>10.1f} {raw_size / size:>6.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+# Startup benchmark
+
+Measures cold import time and peak memory (RSS) of `lab` modules and the CLI.
+Each measurement runs in a new Python process, so nothing is cached in memory
+between runs; the operating system file cache is still warm after the first run.
+
+```
+python benchmarks/import_time.py --runs 10
+```
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+TARGETS = {
+    'lab': [sys.executable, '-c', 'import lab'],
+    'lab.experiment.pytorch': [sys.executable, '-c', 'import lab.experiment.pytorch'],
+    'cli': [sys.executable, str(ROOT / 'tensorboard.py'), '-h'],
+}
+
+
+def measure(command):
+    """
+    Returns the wall time in seconds and the peak RSS in MB of `command`
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([str(ROOT), env.get('PYTHONPATH', '')])
+
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=str(ROOT), env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.read().decode('utf-8'))
+
+    # `ru_maxrss` is in kilobytes on Linux and bytes on macOS
+    rss = usage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+    return elapsed, rss
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark startup time')
+    parser.add_argument('--runs', type=int, default=5, help='Runs per target')
+    parser.add_argument('targets', nargs='*', default=list(TARGETS.keys()),
+                        help='Targets to measure')
+    args = parser.parse_args()
+
+    print(f"{'target':<24} {'median (ms)':>12} {'min (ms)':>10} {'rss (MB)':>10}")
+    for name in args.targets:
+        try:
+            results = [measure(TARGETS[name]) for _ in range(args.runs)]
+        except RuntimeError as e:
+            last_line = str(e).strip().splitlines()[-1:]
+            print(f"{name:<24} failed: {' '.join(last_line)}")
+            continue
+
+        times = [t * 1000 for t, _ in results]
+        rss = max(r for _, r in results)
+        print(f"{name:<24} {statistics.median(times):>12.1f} {min(times):>10.1f} {rss:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
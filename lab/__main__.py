@@ -0,0 +1,192 @@
+"""
+# Lab maintenance commands
+
+```
+python -m lab du
+python -m lab gc --keep-trials 5 --diff-age 30
+python -m lab gc --keep-trials 5 --diff-age 30 --delete
+python -m lab important my_experiment
+python -m lab archive my_experiment -o my_experiment.labarc
+python -m lab restore my_experiment.labarc --latest-checkpoint
+python -m lab verify my_experiment.labarc
+python -m lab pack-checkpoints my_experiment
+python -m lab pack-checkpoints my_experiment --codec shuffle-zlib
+```
+"""
+import argparse
+import os
+import pathlib
+
+from lab import archive, colors, logger
+from lab import disk_usage
+from lab.experiment import ExperimentInfo, checkpoint, codecs
+from lab.lab import Lab
+
+
+def _du(lab: Lab, args):
+    usage = disk_usage.DiskUsage(lab).scan(refresh=args.refresh)
+    totals = {name: sum(sizes.values()) for name, sizes in usage.items()}
+
+    for name in sorted(usage.keys(), key=lambda n: -totals[n]):
+        parts = [(f"{disk_usage.format_size(totals[name]):>10}", colors.BrightColor.cyan),
+                 (f"  {name}", colors.Style.bold)]
+        if disk_usage.is_important(ExperimentInfo(lab, name)):
+            parts.append((" [important]", colors.BrightColor.orange))
+        logger.log_color(parts)
+
+        if args.details:
+            for child, size in sorted(usage[name].items(), key=lambda c: -c[1]):
+                logger.log(f"{disk_usage.format_size(size):>10}    {child}")
+
+    logger.log_color([(f"{disk_usage.format_size(sum(totals.values())):>10}", colors.BrightColor.cyan),
+                      ("  total", None)])
+
+
+def _gc(lab: Lab, args):
+    garbage = disk_usage.find_garbage(lab,
+                                      keep_trials=args.keep_trials,
+                                      diff_age=args.diff_age,
+                                      checkpoint_age=args.checkpoint_age)
+    sizes = disk_usage.garbage_sizes(garbage)
+
+    for (info, path, reason), size in zip(garbage, sizes):
+        logger.log_color([(f"{disk_usage.format_size(size):>10}", colors.BrightColor.cyan),
+                          (f"  {info.name}", colors.Style.bold),
+                          (f"  {path.relative_to(info.experiment_path)}", None),
+                          (f"  ({reason})", colors.BrightColor.purple)])
+
+    total = disk_usage.format_size(sum(sizes))
+    if args.delete:
+        disk_usage.remove_garbage(garbage)
+        logger.log(f"Freeing {total}", color=colors.BrightColor.green)
+    else:
+        logger.log(f"{total} can be freed; run with --delete to remove",
+                   color=colors.BrightColor.orange)
+
+
+def _important(lab: Lab, args):
+    for name in args.experiments:
+        info = ExperimentInfo(lab, name)
+        if not os.path.isdir(str(info.experiment_path)):
+            raise Exception(f"Experiment {name} does not exist")
+        disk_usage.set_important(info, not args.remove)
+
+
+def _archive(lab: Lab, args):
+    info = ExperimentInfo(lab, args.experiment)
+    path = pathlib.Path(info.experiment_path)
+    if not path.is_dir():
+        raise Exception(f"Experiment {args.experiment} does not exist")
+
+    output = pathlib.Path(args.output or f"{args.experiment}.labarc")
+    with logger.section(f"Archiving {args.experiment} to {output}"):
+        archive.create(path, output, level=args.level, threads=args.threads)
+    logger.log(disk_usage.format_size(output.stat().st_size), color=colors.BrightColor.cyan)
+
+
+def _restore(lab: Lab, args):
+    archive_path = pathlib.Path(args.archive)
+    members = archive.select(archive.read_index(archive_path), args.member,
+                             is_latest_checkpoint=args.latest_checkpoint)
+
+    if args.list:
+        for m in members:
+            logger.log(f"{disk_usage.format_size(m['size']):>10}    {m['name']}")
+        return
+
+    name = args.name or archive_path.name.split('.')[0]
+    path = pathlib.Path(ExperimentInfo(lab, name).experiment_path)
+    if path.exists() and not args.force:
+        raise Exception(f"Experiment {name} exists; use --force to overwrite its files")
+
+    with logger.section(f"Restoring {len(members)} files to {name}"):
+        archive.extract(archive_path, path, members, threads=args.threads)
+
+
+def _verify(lab: Lab, args):
+    with logger.section(f"Verifying {args.archive}"):
+        bad = archive.verify(pathlib.Path(args.archive), threads=args.threads)
+        logger.set_successful(len(bad) == 0)
+
+    for name in bad:
+        logger.log(f"Checksum mismatch: {name}", color=colors.BrightColor.red)
+
+
+def _pack_checkpoints(lab: Lab, args):
+    for name in args.experiments:
+        info = ExperimentInfo(lab, name)
+        path = pathlib.Path(info.checkpoint_path)
+        for step in checkpoint.checkpoint_steps(path):
+            with logger.section(f"Packing {name} checkpoint {step}"):
+                checkpoint.convert_to_packed(path / str(step), pathlib.Path(info.trash_path),
+                                             codec=args.codec)
+
+
+def main():
+    lab = Lab(os.getcwd())
+    parser = argparse.ArgumentParser(prog='python -m lab', description='Lab maintenance')
+    commands = parser.add_subparsers(dest='command')
+
+    du = commands.add_parser('du', help='Show disk usage of experiments')
+    du.add_argument('--details', action='store_true',
+                    help='Show the usage of checkpoints, logs, etc.')
+    du.add_argument('--refresh', action='store_true',
+                    help='Ignore cached directory sizes')
+    du.set_defaults(run=_du)
+
+    gc = commands.add_parser('gc', help='Remove old diffs, checkpoints and trash')
+    gc.add_argument('--keep-trials', type=int,
+                    help='Keep diffs of only the last N trials')
+    gc.add_argument('--diff-age', type=float,
+                    help='Remove diffs older than this many days')
+    gc.add_argument('--checkpoint-age', type=float,
+                    help='Remove checkpoints of experiments not updated for this many days')
+    gc.add_argument('--delete', action='store_true',
+                    help='Remove; otherwise only show what would be removed')
+    gc.set_defaults(run=_gc)
+
+    important = commands.add_parser('important',
+                                    help='Mark experiments as important, so that gc skips them')
+    important.add_argument('experiments', nargs='+')
+    important.add_argument('--remove', action='store_true', help='Remove the mark')
+    important.set_defaults(run=_important)
+
+    archive_parser = commands.add_parser('archive', help='Archive an experiment into a single file')
+    archive_parser.add_argument('experiment')
+    archive_parser.add_argument('-o', dest='output', help='Archive file')
+    archive_parser.add_argument('--level', type=int, default=6, help='zlib compression level')
+    archive_parser.add_argument('--threads', type=int, help='Compression threads')
+    archive_parser.set_defaults(run=_archive)
+
+    restore = commands.add_parser('restore', help='Restore an experiment from an archive')
+    restore.add_argument('archive')
+    restore.add_argument('--name', help='Experiment name; the archive name by default')
+    restore.add_argument('--member', nargs='+',
+                         help='Restore only files matching these patterns, like checkpoints/1000/*')
+    restore.add_argument('--latest-checkpoint', action='store_true',
+                         help='Restore only the latest checkpoint and the trials')
+    restore.add_argument('--list', action='store_true', help='List files instead of restoring')
+    restore.add_argument('--force', action='store_true', help='Overwrite files of an existing experiment')
+    restore.add_argument('--threads', type=int, help='Decompression threads')
+    restore.set_defaults(run=_restore)
+
+    verify = commands.add_parser('verify', help='Check the checksums of an archive')
+    verify.add_argument('archive')
+    verify.add_argument('--threads', type=int, help='Decompression threads')
+    verify.set_defaults(run=_verify)
+
+    pack = commands.add_parser('pack-checkpoints',
+                               help='Convert checkpoints with a file per variable to single file checkpoints')
+    pack.add_argument('experiments', nargs='+')
+    pack.add_argument('--codec', choices=codecs.CODECS, help='Compress the checkpoints')
+    pack.set_defaults(run=_pack_checkpoints)
+
+    args = parser.parse_args()
+    if args.command is None:
+        parser.print_usage()
+    else:
+        args.run(lab, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+"""
+# Experiment archives
+
+An archive holds the files of an experiment in a single file.
+Each file is split into chunks that are compressed with `zlib` on a thread pool.
+The archive ends with an index of the files and their chunks,
+followed by a fixed size footer that locates the index;
+so single files can be extracted without reading the rest.
+
+```
+magic | chunks... | zlib(json index) | index offset, index size, footer magic
+```
+
+The index has the SHA-256 of each file,
+which is checked while extracting or verifying, without a separate pass.
+"""
+import fnmatch
+import hashlib
+import json
+import os
+import pathlib
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from lab import util
+
+_MAGIC = b'LABARC1\n'
+_FOOTER_MAGIC = b'LABIDX1\n'
+_FOOTER = struct.Struct('<QQ8s')
+
+CHUNK_SIZE = 4 * 1024 * 1024
+
+# Derived data that is not archived
+_EXCLUDE = {'.trash', 'log_cache'}
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def _files(path: pathlib.Path) -> List[pathlib.Path]:
+    files = []
+    for p in sorted(path.iterdir()):
+        if p.name in _EXCLUDE and p.parent == path:
+            continue
+        if p.is_dir() and not p.is_symlink():
+            files += _files(p)
+        elif p.is_file():
+            files.append(p)
+
+    return files
+
+
+def _read_chunks(files: List[Tuple[str, pathlib.Path]]):
+    # Empty files get an empty chunk
+    for i, (_, path) in enumerate(files):
+        with open(str(path), 'rb') as f:
+            while True:
+                data = f.read(CHUNK_SIZE)
+                if not data and f.tell() > 0:
+                    break
+                yield i, data
+                if len(data) < CHUNK_SIZE:
+                    break
+
+
+def create(path: pathlib.Path, archive_path: pathlib.Path, *,
+           level: int = 6,
+           threads: Optional[int] = None,
+           on_file: Optional[Callable[[str], None]] = None):
+    """
+    ## Archive the files in `path`
+    """
+    files = [(p.relative_to(path).as_posix(), p) for p in _files(path)]
+    members = []
+    for name, p in files:
+        stat = p.stat()
+        members.append(dict(name=name, size=0, mode=stat.st_mode & 0o777,
+                            mtime=stat.st_mtime, chunks=[]))
+    hashes = [hashlib.sha256() for _ in files]
+    threads = threads or os.cpu_count() or 1
+
+    tmp = archive_path.parent / f".{archive_path.name}.{os.getpid()}.tmp"
+    with open(str(tmp), 'wb') as f, ThreadPoolExecutor(threads) as pool:
+        f.write(_MAGIC)
+        last = -1
+        for (i, data), compressed in util.map_ordered(pool, lambda c: zlib.compress(c[1], level),
+                                                      _read_chunks(files), threads * 2):
+            if i != last and on_file is not None:
+                on_file(members[i]['name'])
+            last = i
+            hashes[i].update(data)
+            members[i]['chunks'].append([f.tell(), len(compressed), len(data)])
+            members[i]['size'] += len(data)
+            f.write(compressed)
+
+        for m, h in zip(members, hashes):
+            m['sha256'] = h.hexdigest()
+
+        index_offset = f.tell()
+        index = zlib.compress(json.dumps(dict(members=members)).encode('utf-8'), level)
+        f.write(index)
+        f.write(_FOOTER.pack(index_offset, len(index), _FOOTER_MAGIC))
+
+    os.replace(str(tmp), str(archive_path))
+
+
+def read_index(archive_path: pathlib.Path) -> List[Dict[str, any]]:
+    """
+    ## Read the list of files in an archive
+    """
+    with open(str(archive_path), 'rb') as f:
+        if f.read(len(_MAGIC)) != _MAGIC:
+            raise ArchiveError(f"Not a lab archive: {archive_path}")
+        f.seek(-_FOOTER.size, os.SEEK_END)
+        offset, size, magic = _FOOTER.unpack(f.read(_FOOTER.size))
+        if magic != _FOOTER_MAGIC:
+            raise ArchiveError(f"Incomplete archive: {archive_path}")
+        f.seek(offset)
+        return json.loads(zlib.decompress(f.read(size)).decode('utf-8'))['members']
+
+
+def select(members: List[Dict[str, any]], patterns: Optional[List[str]] = None, *,
+           is_latest_checkpoint: bool = False) -> List[Dict[str, any]]:
+    """
+    ## Select files by glob patterns
+
+    `is_latest_checkpoint` selects the files of the latest checkpoint
+    and the trials files.
+    """
+    patterns = list(patterns or [])
+    if is_latest_checkpoint:
+        steps = [int(m['name'].split('/')[1]) for m in members
+                 if m['name'].startswith('checkpoints/') and m['name'].split('/')[1].isdigit()]
+        if steps:
+            patterns.append(f"checkpoints/{max(steps)}/*")
+        patterns += ['trials.*']
+
+    if not patterns:
+        return members
+
+    return [m for m in members if any(fnmatch.fnmatch(m['name'], p) for p in patterns)]
+
+
+def _decompressed(f, members: List[Dict[str, any]], pool: ThreadPoolExecutor, window: int):
+    def chunks():
+        for i, m in enumerate(members):
+            for offset, size, raw_size in m['chunks']:
+                f.seek(offset)
+                yield i, f.read(size), raw_size
+
+    # `None` for corrupt chunks
+    def decompress(c):
+        try:
+            data = zlib.decompress(c[1])
+        except zlib.error:
+            return None
+        if len(data) != c[2]:
+            return None
+        return data
+
+    for (i, _, _), data in util.map_ordered(pool, decompress, chunks(), window):
+        yield i, data
+
+
+def extract(archive_path: pathlib.Path, path: pathlib.Path,
+            members: List[Dict[str, any]], *,
+            threads: Optional[int] = None,
+            on_file: Optional[Callable[[str], None]] = None):
+    """
+    ## Extract files from an archive into `path`
+
+    Each file is written to a temporary file, and moved into place
+    only if its checksum matches.
+    """
+    threads = threads or os.cpu_count() or 1
+    with open(str(archive_path), 'rb') as f, ThreadPoolExecutor(threads) as pool:
+        current, out, h, tmp = -1, None, None, None
+
+        def finish():
+            out.close()
+            m = members[current]
+            if h.hexdigest() != m['sha256']:
+                tmp.unlink()
+                raise ArchiveError(f"Checksum mismatch: {m['name']}")
+            target = path / m['name']
+            os.chmod(str(tmp), m['mode'])
+            os.utime(str(tmp), (m['mtime'], m['mtime']))
+            os.replace(str(tmp), str(target))
+
+        def start(i):
+            m = members[i]
+            if m['name'].startswith('/') or '..' in m['name'].split('/'):
+                raise ArchiveError(f"Invalid path in archive: {m['name']}")
+            if on_file is not None:
+                on_file(m['name'])
+            target = path / m['name']
+            target.parent.mkdir(parents=True, exist_ok=True)
+            t = target.parent / f".{target.name}.tmp"
+            return open(str(t), 'wb'), hashlib.sha256(), t
+
+        # Every file has at least one chunk
+        for i, data in _decompressed(f, members, pool, threads * 2):
+            if data is None:
+                if out is not None:
+                    out.close()
+                    tmp.unlink()
+                raise ArchiveError(f"Corrupt chunk in {members[i]['name']}")
+            if i != current:
+                if out is not None:
+                    finish()
+                current = i
+                out, h, tmp = start(i)
+            h.update(data)
+            out.write(data)
+
+        if out is not None:
+            finish()
+
+
+def verify(archive_path: pathlib.Path, *,
+           threads: Optional[int] = None) -> List[str]:
+    """
+    ## Check the checksums of all files in an archive
+
+    Returns the names of files that don't match.
+    """
+    members = read_index(archive_path)
+    hashes = [hashlib.sha256() for _ in members]
+    is_corrupt = [False for _ in members]
+    threads = threads or os.cpu_count() or 1
+
+    with open(str(archive_path), 'rb') as f, ThreadPoolExecutor(threads) as pool:
+        for i, data in _decompressed(f, members, pool, threads * 2):
+            if data is None:
+                is_corrupt[i] = True
+            else:
+                hashes[i].update(data)
+
+    return [m['name'] for m, h, c in zip(members, hashes, is_corrupt)
+            if c or h.hexdigest() != m['sha256']]
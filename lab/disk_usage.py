@@ -0,0 +1,237 @@
+"""
+# Disk usage and garbage collection
+
+Sizes of experiment directories are found with a parallel `os.scandir` walk.
+The size of the files directly in each directory is cached in
+`logs/.lab_du.json`, keyed by the modification time of the directory,
+so a directory is listed again only if files were added, removed or renamed in it.
+Files that grow in place (like TensorBoard event files) are counted again
+after their directory changes, or with `refresh`.
+
+Retention policies pick files and directories to remove,
+and they are removed in the background through the experiment's `.trash`.
+Experiments with an `.important` file are never touched.
+"""
+import json
+import os
+import pathlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from lab import util
+from lab.experiment import ExperimentInfo
+from lab.experiment.index import LabIndex
+from lab.lab import Lab
+
+_CACHE_FILE = '.lab_du.json'
+_IMPORTANT_FILE = '.important'
+_THREADS = 16
+
+_DAY = 24 * 60 * 60
+
+
+def format_size(size: int) -> str:
+    """
+    ## Human readable size
+    """
+    if size < 1024:
+        return f"{size} B"
+
+    for unit in ['KB', 'MB', 'GB']:
+        size /= 1024
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+
+    return f"{size / 1024:,.1f} TB"
+
+
+class _SizeScanner:
+    def __init__(self, cache: Dict[str, list]):
+        self.cache = cache
+        self.updated: Dict[str, list] = {}
+
+    def scan(self, path: str) -> int:
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+        cached = self.cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            files_size, directories = cached[1], cached[2]
+        else:
+            files_size, directories = 0, []
+            try:
+                with os.scandir(path) as entries:
+                    for e in entries:
+                        try:
+                            if e.is_dir(follow_symlinks=False):
+                                directories.append(e.name)
+                            else:
+                                files_size += e.stat(follow_symlinks=False).st_size
+                        except FileNotFoundError:
+                            pass
+            except FileNotFoundError:
+                return 0
+
+        self.updated[path] = [mtime, files_size, directories]
+
+        return files_size + sum(self.scan(os.path.join(path, d)) for d in directories)
+
+
+class DiskUsage:
+    """
+    ## Disk usage of experiments in a lab
+    """
+
+    def __init__(self, lab: Lab):
+        self.lab = lab
+        self.path = pathlib.Path(lab.experiments)
+        self.cache_file = self.path / _CACHE_FILE
+
+    def __load_cache(self) -> Dict[str, list]:
+        try:
+            with open(str(self.cache_file), 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def scan(self, *, refresh: bool = False) -> Dict[str, Dict[str, int]]:
+        """
+        ### Sizes of the top level files and directories of each experiment
+        """
+        scanner = _SizeScanner({} if refresh else self.__load_cache())
+
+        paths = []
+        for experiment in self.lab.get_experiments():
+            with os.scandir(str(experiment)) as entries:
+                for e in entries:
+                    paths.append((experiment.name, e.name, e.path, e.is_dir(follow_symlinks=False)))
+
+        def size(item):
+            name, child, path, is_dir = item
+            if is_dir:
+                return scanner.scan(path)
+            try:
+                return os.stat(path, follow_symlinks=False).st_size
+            except FileNotFoundError:
+                return 0
+
+        with ThreadPoolExecutor(_THREADS) as pool:
+            sizes = list(pool.map(size, paths))
+
+        usage = {e.name: {} for e in self.lab.get_experiments()}
+        for (name, child, _, is_dir), s in zip(paths, sizes):
+            key = child if is_dir else 'files'
+            usage[name][key] = usage[name].get(key, 0) + s
+
+        if self.path.exists():
+            util.write_atomic(self.cache_file, json.dumps(scanner.updated))
+
+        return usage
+
+
+def is_important(info: ExperimentInfo) -> bool:
+    return pathlib.Path(info.experiment_path / _IMPORTANT_FILE).exists()
+
+
+def set_important(info: ExperimentInfo, value: bool):
+    """
+    ## Mark an experiment as important, so that it's never collected
+    """
+    marker = pathlib.Path(info.experiment_path / _IMPORTANT_FILE)
+    if value:
+        marker.touch()
+    elif marker.exists():
+        marker.unlink()
+
+
+def _path_size(path: pathlib.Path) -> int:
+    if path.is_dir() and not path.is_symlink():
+        return _SizeScanner({}).scan(str(path))
+    try:
+        return os.stat(str(path), follow_symlinks=False).st_size
+    except FileNotFoundError:
+        return 0
+
+
+def _diff_index(path: pathlib.Path) -> Optional[int]:
+    index = path.name.split('.')[0]
+    if not index.isdigit():
+        return None
+    return int(index)
+
+
+def find_garbage(lab: Lab, *,
+                 keep_trials: Optional[int] = None,
+                 diff_age: Optional[float] = None,
+                 checkpoint_age: Optional[float] = None) -> List[Tuple[ExperimentInfo, pathlib.Path, str]]:
+    """
+    ## Find files and directories to remove
+
+    * `keep_trials` keeps the diffs of only the last `keep_trials` trials
+    * `diff_age` removes diffs older than this many days
+    * `checkpoint_age` removes checkpoints of experiments that haven't
+     been updated for this many days
+    * leftovers in `.trash` are always removed
+
+    Returns the experiment, the path and the reason for each.
+    """
+    now = time.time()
+    trials = LabIndex(lab).load()
+    garbage = []
+
+    for experiment in lab.get_experiments():
+        info = ExperimentInfo(lab, experiment.name)
+        if is_important(info):
+            continue
+
+        trash = pathlib.Path(info.trash_path)
+        if trash.is_dir():
+            for c in trash.iterdir():
+                garbage.append((info, c, 'trash'))
+
+        diffs = pathlib.Path(info.diff_path)
+        if diffs.is_dir():
+            n_trials = len(trials.get(experiment.name, []))
+            for d in diffs.iterdir():
+                index = _diff_index(d)
+                if index is None:
+                    continue
+                if keep_trials is not None and index < n_trials - keep_trials:
+                    garbage.append((info, d, f'not in last {keep_trials} trials'))
+                elif diff_age is not None and now - d.stat().st_mtime > diff_age * _DAY:
+                    garbage.append((info, d, f'older than {diff_age:g} days'))
+
+        checkpoints = pathlib.Path(info.checkpoint_path)
+        if checkpoint_age is not None and checkpoints.is_dir():
+            updated = max([f.stat().st_mtime
+                           for f in [pathlib.Path(info.trials_log_file),
+                                     pathlib.Path(info.trials_journal_file),
+                                     checkpoints]
+                           if f.exists()])
+            if now - updated > checkpoint_age * _DAY:
+                garbage.append((info, checkpoints, f'not updated for {checkpoint_age:g} days'))
+
+    return garbage
+
+
+def garbage_sizes(garbage: List[Tuple[ExperimentInfo, pathlib.Path, str]]) -> List[int]:
+    """
+    ## Sizes of garbage found by `find_garbage`
+    """
+    with ThreadPoolExecutor(_THREADS) as pool:
+        return list(pool.map(lambda g: _path_size(g[1]), garbage))
+
+
+def remove_garbage(garbage: List[Tuple[ExperimentInfo, pathlib.Path, str]]):
+    """
+    ## Remove garbage found by `find_garbage` in the background
+    """
+    for info, path, reason in garbage:
+        trash = pathlib.Path(info.trash_path)
+        if path.parent == trash:
+            util.resume_removals(trash)
+        else:
+            util.rm_tree_background(path, trash)
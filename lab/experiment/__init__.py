@@ -1,17 +1,24 @@
+import atexit
+import copy
 import pathlib
 import time
-from typing import Dict, Optional
-
-import git
-import numpy as np
+import typing
+from typing import Dict, Optional, List
 
 from lab import colors, util
 from lab import logger
 from lab.commenter import Commenter
 from lab.experiment.experiment_trial import Trial
+from lab.experiment.git_capture import GitCapture
+from lab.experiment.index import LabIndex
+from lab.experiment.journal import TrialsJournal
+from lab.experiment.persister import CoalescingWriter
 from lab.lab import Lab
 from lab.logger_class import ProgressSaver
 
+if typing.TYPE_CHECKING:
+    import numpy as np
+
 commenter = Commenter(
     comment_start='"""',
     comment_end='"""',
@@ -40,8 +47,11 @@ class ExperimentInfo:
         self.diff_path = self.experiment_path / "diffs"
 
         self.summary_path = self.experiment_path / "log"
+        self.summary_cache_path = self.experiment_path / "log_cache"
         self.screenshots_path = self.experiment_path / 'screenshots'
         self.trials_log_file = self.experiment_path / "trials.yaml"
+        self.trials_journal_file = self.experiment_path / "trials.journal"
+        self.trash_path = self.experiment_path / ".trash"
 
     def exists(self) -> bool:
         """
@@ -54,36 +64,59 @@ class ExperimentInfo:
 class _ExperimentProgressSaver(ProgressSaver):
     def __init__(self, *,
                  trial: Trial,
+                 name: str,
+                 lab_index: LabIndex,
                  trials_log_file: pathlib.PurePath,
-                 is_log_python_file: bool):
+                 trials_journal_file: pathlib.PurePath,
+                 is_log_python_file: bool,
+                 is_trials_journal: bool,
+                 save_interval: float):
         self.trial = trial
+        self.name = name
+        self.lab_index = lab_index
         self.trials_log_file = trials_log_file
         self.is_log_python_file = is_log_python_file
 
-    def __log_python_file(self):
+        if is_trials_journal:
+            self.journal = TrialsJournal(trials_journal_file, trials_log_file)
+            atexit.register(self.journal.compact)
+        else:
+            self.journal = None
+
+        # Registered after the journal, so that it's flushed before compaction
+        self.__writer = CoalescingWriter(self.__write, save_interval)
+        self.__last_trials = None
+
+    def __log_python_file(self, trial_print: List[str]):
         if not self.is_log_python_file:
             return
 
         try:
             with open(self.trial.python_file, "r") as file:
-                lines = file.read().splitlines()
+                code = file.read()
 
-            trial_print = self.trial.pretty_print()
+            lines = commenter.update(code.splitlines(), trial_print)
+            updated = '\n'.join(lines)
 
-            lines = commenter.update(lines, trial_print)
-            code = '\n'.join(lines)
-
-            with open(self.trial.python_file, "w") as file:
-                file.write(code)
+            if updated != code:
+                util.write_atomic(pathlib.Path(self.trial.python_file), updated)
         except FileNotFoundError:
             pass
 
-    def __log_trial(self, is_add: bool):
+    def __log_trial(self, is_add: bool, trial: Dict[str, any]):
         """
         ### Log trial
 
-        This will add or update a trial in the `trials.yaml` file
+        This will add or update a trial in the `trials.yaml` file,
+        or append it to the trials journal.
         """
+        if self.journal is not None:
+            if is_add or self.trial.index < 0:
+                self.trial.index = self.journal.add(trial)
+            else:
+                self.journal.update(self.trial.index, trial)
+            return
+
         try:
             with open(str(self.trials_log_file), "r") as file:
                 trials = util.yaml_load(file.read())
@@ -93,23 +126,49 @@ class _ExperimentProgressSaver(ProgressSaver):
             trials = []
 
         if is_add or len(trials) == 0:
-            trials.append(self.trial.to_dict())
+            trials.append(trial)
         else:
-            trials[-1] = self.trial.to_dict()
+            trials[-1] = trial
 
         self.trial.index = len(trials) - 1
 
-        with open(str(self.trials_log_file), "w") as file:
-            file.write(util.yaml_dump(trials))
+        content = util.yaml_dump(trials)
+        if content != self.__last_trials:
+            util.write_atomic(pathlib.Path(self.trials_log_file), content)
+            self.__last_trials = content
+
+    def __write(self, payload):
+        is_add, trial, trial_print = payload
+        self.__log_trial(is_add, trial)
+        self.lab_index.update_trial(self.name, self.trial.index, trial)
+        self.__log_python_file(trial_print)
 
     def save(self, progress: Optional[Dict[str, str]] = None):
+        """
+        ### Save the trial
+
+        A new trial is saved right away, since its index is needed.
+        Progress is saved on a background thread,
+        at most once every `save_interval` seconds.
+        """
         if progress is not None:
             self.trial.set_progress(progress)
-            self.__log_trial(is_add=False)
+
+        payload = (progress is None,
+                   copy.deepcopy(self.trial.to_dict()),
+                   self.trial.pretty_print())
+
+        if progress is None:
+            self.__writer.flush()
+            self.__write(payload)
         else:
-            self.__log_trial(is_add=True)
+            self.__writer.request(payload)
 
-        self.__log_python_file()
+    def flush(self):
+        """
+        ### Write pending progress
+        """
+        self.__writer.flush()
 
 
 class Experiment:
@@ -156,21 +215,25 @@ class Experiment:
         experiment_path = pathlib.Path(self.info.experiment_path)
         if not experiment_path.exists():
             experiment_path.mkdir(parents=True)
+        util.resume_removals(pathlib.Path(self.info.trash_path))
 
         self.trial = Trial.new_trial(
             python_file=python_file,
             trial_time=time.localtime(),
             comment=comment)
 
-        repo = git.Repo(self.lab.path)
-
-        self.trial.commit = repo.head.commit.hexsha
-        self.trial.commit_message = repo.head.commit.message.strip()
-        self.trial.is_dirty = repo.is_dirty()
-        self.trial.diff = repo.git.diff()
+        self.__git = GitCapture(repo_path=self.lab.path,
+                                diff_path=self.info.diff_path,
+                                paths=self.lab.diff_paths,
+                                max_diff_size=self.lab.max_diff_size)
         self.__progress_saver = _ExperimentProgressSaver(trial=self.trial,
+                                                         name=self.info.name,
+                                                         lab_index=LabIndex(self.lab),
                                                          trials_log_file=self.info.trials_log_file,
-                                                         is_log_python_file=is_log_python_file)
+                                                         trials_journal_file=self.info.trials_journal_file,
+                                                         is_log_python_file=is_log_python_file,
+                                                         is_trials_journal=self.lab.is_trials_journal,
+                                                         save_interval=self.lab.progress_save_interval)
 
         checkpoint_saver = self._create_checkpoint_saver()
         logger.set_progress_saver(self.__progress_saver)
@@ -179,10 +242,18 @@ class Experiment:
     def _create_checkpoint_saver(self):
         return None
 
+    def __wait_git_status(self):
+        self.__git.wait_status()
+        self.trial.commit = self.__git.commit
+        self.trial.commit_message = self.__git.commit_message
+        self.trial.is_dirty = self.__git.is_dirty
+
     def print_info_and_check_repo(self):
         """
         ## 🖨 Print the experiment info and check git repo status
         """
+        self.__wait_git_status()
+
         logger.log_color([
             (self.info.name, colors.Style.bold)
         ])
@@ -204,12 +275,14 @@ class Experiment:
             logger.log("[FAIL]", color=colors.BrightColor.red)
             exit(1)
 
-    def save_npy(self, array: np.ndarray, name: str):
+    def save_npy(self, array: 'np.ndarray', name: str):
         """
         ## Save a single numpy array
 
         This is used to save processed data
         """
+        import numpy as np
+
         npy_path = pathlib.Path(self.info.npy_path)
         npy_path.mkdir(parents=True)
         file_name = name + ".npy"
@@ -221,6 +294,8 @@ class Experiment:
 
         This is used to save processed data
         """
+        import numpy as np
+
         file_name = name + ".npy"
         return np.load(str(self.info.npy_path / file_name))
 
@@ -232,7 +307,7 @@ class Experiment:
         """
         path = pathlib.Path(self.info.checkpoint_path)
         if path.exists():
-            util.rm_tree(path)
+            util.rm_tree_background(path, pathlib.Path(self.info.trash_path))
 
     def clear_summaries(self):
         """
@@ -242,7 +317,11 @@ class Experiment:
         """
         path = pathlib.Path(self.info.summary_path)
         if path.exists():
-            util.rm_tree(path)
+            util.rm_tree_background(path, pathlib.Path(self.info.trash_path))
+
+        path = pathlib.Path(self.info.summary_cache_path)
+        if path.exists():
+            util.rm_tree_background(path, pathlib.Path(self.info.trash_path))
 
     def clear_screenshots(self):
         """
@@ -250,7 +329,7 @@ class Experiment:
         """
         path = pathlib.Path(self.info.screenshots_path)
         if path.exists():
-            util.rm_tree(path)
+            util.rm_tree_background(path, pathlib.Path(self.info.trash_path))
 
         path.mkdir(parents=True)
 
@@ -266,11 +345,7 @@ class Experiment:
         self.trial.start_step = global_step
         logger.set_start_global_step(global_step)
 
+        self.__wait_git_status()
         self.__progress_saver.save()
 
-        path = pathlib.Path(self.info.diff_path)
-        if not path.exists():
-            path.mkdir(parents=True)
-
-        with open(str(path / f"{self.trial.index}.diff"), "w") as f:
-            f.write(self.trial.diff)
+        self.__git.save_diff(self.trial.index)
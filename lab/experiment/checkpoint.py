@@ -0,0 +1,726 @@
+"""
+# Checkpoint storage
+
+This is shared by the PyTorch and TensorFlow checkpoints.
+A checkpoint is a directory named by the global step, with the saved arrays
+and an `info.json` header that maps model variables to them.
+
+In the `packed` format all arrays are in a single `tensors.bin` file,
+each starting at a multiple of 64 bytes, and `info.json` has
+
+```
+{"format": "packed",
+ "files": {model variable: array name},
+ "tensors": {array name: {"offset": ..., "dtype": ..., "shape": ...}}}
+```
+
+Arrays are loaded as views of a memory map of `tensors.bin`, without copying,
+or read into memory with `read_all`.
+Large arrays are split into shards that are written and read in parallel
+with `pwrite` and `preadv` on a thread pool, which uses more of the bandwidth
+of fast and network storage than a single thread.
+In the `npy` format, the default, each array is a `.npy` file, and
+`info.json` only has the mapping of model variables to file names.
+
+In the `blobs` format arrays are split into chunks stored in `checkpoints/blobs`,
+named by the hash of their content, and `info.json` lists the chunks of each array.
+Chunks that are already stored aren't written again,
+so keeping many checkpoints of a model with frozen parts costs little more than one.
+Blobs not listed by any checkpoint are removed after old checkpoints are deleted.
+
+Packed and blob checkpoints can be compressed with a codec from
+`lab.experiment.codecs`, which is recorded in `info.json`.
+Compressed arrays of packed checkpoints have a list of `chunks`
+(offset, compressed size and size) instead of an `offset`.
+
+Arrays stored with reduced precision by `lab.experiment.precision` have
+`storage_dtype` and `original_dtype`, and `int8` arrays name their `scales` array
+and the `scales_axis` they are along.
+They are converted back to the original type when read.
+
+Checkpoints are written to `{step}.tmp` and renamed when complete,
+so a partially written checkpoint is never loaded.
+With `is_async`, checkpoints are written on a background thread,
+with at most `max_in_flight` checkpoints waiting to be written.
+"""
+import atexit
+import fnmatch
+import hashlib
+import json
+import os
+import pathlib
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from lab import util
+from lab.experiment import codecs, precision
+
+INFO_FILE = 'info.json'
+DATA_FILE = 'tensors.bin'
+BLOBS_DIR = 'blobs'
+
+FORMATS = ['packed', 'npy', 'blobs']
+
+_ALIGNMENT = 64
+BLOB_SIZE = 16 * 1024 * 1024
+# Arrays are read and written in parallel in shards of this size
+SHARD_SIZE = 8 * 1024 * 1024
+
+_HAS_PREADV = hasattr(os, 'preadv')
+
+
+def checkpoint_steps(path: pathlib.Path) -> List[int]:
+    """
+    ## Steps of complete checkpoints, in ascending order
+    """
+    if not path.exists():
+        return []
+
+    return sorted(int(c.name) for c in path.iterdir() if c.name.isdigit())
+
+
+def latest_step(path: pathlib.Path) -> Optional[int]:
+    """
+    ## Step of the latest complete checkpoint
+    """
+    steps = checkpoint_steps(path)
+    if not steps:
+        return None
+
+    return steps[-1]
+
+
+def _pread_into(fd: int, out: np.ndarray, offset: int):
+    done = 0
+    while done < len(out):
+        if _HAS_PREADV:
+            n = os.preadv(fd, [out[done:]], offset + done)
+        else:
+            data = os.pread(fd, len(out) - done, offset + done)
+            n = len(data)
+            out[done:done + n] = np.frombuffer(data, dtype=np.uint8)
+        if n == 0:
+            raise EOFError(f"Checkpoint data ends at {offset + done}")
+        done += n
+
+
+def _pwrite(fd: int, data: np.ndarray, offset: int):
+    done = 0
+    while done < len(data):
+        done += os.pwrite(fd, data[done:], offset + done)
+
+
+class CheckpointReader:
+    """
+    ## Read a checkpoint in any format
+
+    A pool of `threads` threads reads shards of arrays in parallel,
+    and decompresses compressed checkpoints.
+    """
+
+    def __init__(self, checkpoint_path: pathlib.Path, *, threads: Optional[int] = None):
+        self.path = checkpoint_path
+        self.threads = threads
+        self.__pool: Optional[ThreadPoolExecutor] = None
+        self.__fd: Optional[int] = None
+
+        with open(str(checkpoint_path / INFO_FILE), "r") as f:
+            info = json.loads(f.readline())
+
+        if isinstance(info, dict) and info.get('format') in ['packed', 'blobs']:
+            self.format = info['format']
+            self.files = info['files']
+            self.tensors = info['tensors']
+            self.codec = info.get('codec')
+            self.blob_size = info.get('blob_size', BLOB_SIZE)
+        else:
+            self.format = 'npy'
+            self.files = info
+            self.tensors = None
+            self.codec = None
+
+        if self.format == 'packed':
+            data_file = checkpoint_path / DATA_FILE
+            self.__fd = os.open(str(data_file), os.O_RDONLY)
+            if os.fstat(self.__fd).st_size == 0:
+                self.__data = np.zeros(0, dtype=np.uint8)
+            else:
+                # Copy on write, so that arrays are writable views
+                self.__data = np.memmap(str(data_file), dtype=np.uint8, mode='c')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        if self.__pool is not None:
+            self.__pool.shutdown()
+            self.__pool = None
+        if self.__fd is not None:
+            os.close(self.__fd)
+            self.__fd = None
+
+    def __get_pool(self) -> ThreadPoolExecutor:
+        if self.__pool is None:
+            self.__pool = ThreadPoolExecutor(self.threads)
+        return self.__pool
+
+    def names(self) -> List[str]:
+        """
+        ### Names of the arrays of model variables
+
+        Arrays of `int8` scales are not included.
+        """
+        names = []
+
+        def collect(files: any):
+            if isinstance(files, dict):
+                for v in files.values():
+                    collect(v)
+            else:
+                names.append(files)
+
+        collect(self.files)
+        return names
+
+    def shape_dtype(self, name: str) -> Tuple[Tuple[int, ...], np.dtype]:
+        """
+        ### Shape and data type of an array
+        """
+        if self.tensors is None:
+            # Only reads the header
+            array = np.load(str(self.path / name), mmap_mode='r')
+            return array.shape, array.dtype
+
+        tensor = self.tensors[name]
+        return tuple(tensor['shape']), np.dtype(tensor.get('original_dtype', tensor['dtype']))
+
+    def __jobs(self, name: str, out: np.ndarray) -> List[Tuple[Callable[[], None], int]]:
+        """
+        Jobs that read the array `name` into `out`, with the number of bytes each reads
+        """
+        data = out.reshape(-1).view(np.uint8)
+        itemsize = out.dtype.itemsize
+
+        if self.tensors is None:
+            def load():
+                out[...] = np.load(str(self.path / name), mmap_mode='r')
+
+            return [(load, len(data))]
+
+        tensor = self.tensors[name]
+
+        if self.format == 'blobs':
+            blobs_path = self.path.parent / BLOBS_DIR
+
+            def read_blob(blob: str, shard: np.ndarray):
+                with open(str(_blob_path(blobs_path, blob)), 'rb') as f:
+                    if self.codec is None:
+                        f.readinto(shard)
+                    else:
+                        codecs.decompress_into(self.codec, f.read(), shard, itemsize)
+
+            jobs = []
+            for i, blob in enumerate(tensor['blobs']):
+                shard = data[i * self.blob_size:(i + 1) * self.blob_size]
+                jobs.append((lambda b=blob, s=shard: read_blob(b, s), len(shard)))
+            return jobs
+
+        if 'chunks' in tensor:
+            def decompress(offset: int, size: int, shard: np.ndarray):
+                codecs.decompress_into(self.codec, self.__data[offset:offset + size], shard, itemsize)
+
+            jobs = []
+            start = 0
+            for offset, size, raw_size in tensor['chunks']:
+                shard = data[start:start + raw_size]
+                jobs.append((lambda o=offset, c=size, s=shard: decompress(o, c, s), raw_size))
+                start += raw_size
+            return jobs
+
+        jobs = []
+        for start in range(0, len(data), SHARD_SIZE):
+            shard = data[start:start + SHARD_SIZE]
+            offset = tensor['offset'] + start
+            jobs.append((lambda o=offset, s=shard: _pread_into(self.__fd, s, o), len(shard)))
+        return jobs
+
+    def __run(self, jobs: List[Tuple[Callable[[], None], int]],
+              on_progress: Optional[Callable[[float], None]]):
+        if len(jobs) == 1 and on_progress is None:
+            jobs[0][0]()
+            return
+
+        total = max(sum(size for _, size in jobs), 1)
+        done = 0
+        futures = {self.__get_pool().submit(job): size for job, size in jobs}
+        try:
+            for future in as_completed(futures):
+                future.result()
+                done += futures[future]
+                if on_progress is not None:
+                    on_progress(done / total)
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def read(self, name: str) -> np.ndarray:
+        """
+        ### Read an array
+
+        Arrays of uncompressed packed checkpoints are views of the memory mapped file,
+        which are read from disk when they are accessed.
+        """
+        if self.format == 'packed' and self.codec is None and \
+                'storage_dtype' not in self.tensors[name]:
+            tensor = self.tensors[name]
+            dtype = np.dtype(tensor['dtype'])
+            size = int(np.prod(tensor['shape'], dtype=np.int64)) * dtype.itemsize
+            offset = tensor['offset']
+            return self.__data[offset:offset + size].view(dtype).reshape(tensor['shape'])
+
+        shape, dtype = self.shape_dtype(name)
+        array = np.empty(shape, dtype=dtype)
+        self.read_into({name: array})
+
+        return array
+
+    def read_all(self, names: List[str], *,
+                 on_progress: Optional[Callable[[float], None]] = None) -> Dict[str, np.ndarray]:
+        """
+        ### Read arrays into memory
+
+        Large arrays are read in shards of `SHARD_SIZE` bytes, and all shards
+        are read in parallel on the thread pool.
+        `on_progress` is called with the fraction of bytes read,
+        on the calling thread.
+        """
+        arrays = {}
+        for name in names:
+            shape, dtype = self.shape_dtype(name)
+            arrays[name] = np.empty(shape, dtype=dtype)
+        self.read_into(arrays, on_progress=on_progress)
+
+        return arrays
+
+    def read_into(self, arrays: Dict[str, np.ndarray], *,
+                  on_progress: Optional[Callable[[float], None]] = None):
+        """
+        ### Read arrays into existing arrays
+
+        `arrays` maps array names to C contiguous arrays of the same shape and type,
+        like NumPy views of model parameters.
+        Data is read straight into them, without other copies in memory;
+        except for arrays stored with reduced precision,
+        which are read one at a time and converted.
+        """
+        jobs = []
+        converted = []
+        for name, out in arrays.items():
+            shape, dtype = self.shape_dtype(name)
+            if tuple(out.shape) != shape or out.dtype != dtype:
+                raise ValueError(f"Can't read {name} of {dtype}{list(shape)} "
+                                 f"into {out.dtype}{list(out.shape)}")
+            if not out.flags.c_contiguous:
+                raise ValueError(f"Can't read {name} into an array that is not contiguous")
+            if self.tensors is not None and 'storage_dtype' in self.tensors[name]:
+                converted.append((name, out))
+            else:
+                jobs += self.__jobs(name, out)
+
+        total = max(sum(out.nbytes for out in arrays.values()), 1)
+
+        def progress(start: int, size: int):
+            if on_progress is None:
+                return None
+            return lambda f: on_progress((start + f * size) / total)
+
+        done = sum(size for _, size in jobs)
+        self.__run(jobs, progress(0, done))
+
+        for name, out in converted:
+            tensor = self.tensors[name]
+            stored = np.empty(tensor['shape'], dtype=np.dtype(tensor['dtype']))
+            self.__run(self.__jobs(name, stored), progress(done, out.nbytes))
+            scales = self.read(tensor['scales']) if 'scales' in tensor else None
+            # Scales of checkpoints written before `scales_axis` are along the first axis
+            precision.decode(tensor['storage_dtype'], stored, scales, out,
+                             axis=tensor.get('scales_axis', 0))
+            done += out.nbytes
+
+
+def _blob_path(blobs_path: pathlib.Path, blob: str) -> pathlib.Path:
+    return blobs_path / blob[:2] / blob
+
+
+def _write_blobs(path: pathlib.Path, blobs_path: pathlib.Path,
+                 files: any, arrays: Iterable[Tuple[str, np.ndarray]],
+                 codec: Optional[str], pool: ThreadPoolExecutor, window: int,
+                 storage: Dict[str, Dict[str, any]]):
+    def write(job) -> str:
+        data, itemsize = job
+        h = hashlib.blake2b(digest_size=20)
+        # Blobs of different codecs are different files
+        h.update((codec or '').encode('utf-8'))
+        h.update(data)
+        blob = h.hexdigest()
+
+        blob_path = _blob_path(blobs_path, blob)
+        if blob_path.exists():
+            return blob
+        if codec is not None:
+            data = codecs.compress(codec, data, itemsize)
+        blob_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = blob_path.parent / f"{blob}.{threading.get_ident()}.tmp"
+        with open(str(tmp), 'wb') as f:
+            f.write(data)
+        tmp.rename(blob_path)
+
+        return blob
+
+    tensors = {}
+    for name, array in arrays:
+        array = np.require(array, requirements='C')
+        data = array.reshape(-1).view(np.uint8)
+        jobs = ((data[start:start + BLOB_SIZE], array.dtype.itemsize)
+                for start in range(0, max(len(data), 1), BLOB_SIZE))
+        blobs = [blob for _, blob in util.map_ordered(pool, write, jobs, window)]
+        tensors[name] = dict(dtype=array.dtype.str, shape=list(array.shape), blobs=blobs)
+
+    for name, tensor_storage in storage.items():
+        tensors[name].update(tensor_storage)
+
+    with open(str(path / INFO_FILE), "w") as f:
+        f.write(json.dumps(dict(format='blobs', codec=codec, blob_size=BLOB_SIZE,
+                                files=files, tensors=tensors)))
+
+
+def collect_blobs(path: pathlib.Path):
+    """
+    ## Remove blobs that no checkpoint refers to
+
+    Reference counts are taken from the `info.json` of the checkpoints in `path`.
+    """
+    blobs_path = path / BLOBS_DIR
+    if not blobs_path.exists():
+        return
+
+    references = {}
+    for step in checkpoint_steps(path):
+        # Only the header is needed, not a reader of the data
+        with open(str(path / str(step) / INFO_FILE), "r") as f:
+            info = json.loads(f.readline())
+        if not isinstance(info, dict) or info.get('format') != 'blobs':
+            continue
+        for tensor in info['tensors'].values():
+            for blob in tensor['blobs']:
+                references[blob] = references.get(blob, 0) + 1
+
+    for directory in blobs_path.iterdir():
+        for blob_path in directory.iterdir():
+            if references.get(blob_path.name, 0) == 0:
+                blob_path.unlink()
+
+
+def _write_npy(path: pathlib.Path, files: any, arrays: Iterable[Tuple[str, np.ndarray]]):
+    for file_name, array in arrays:
+        np.save(str(path / file_name), array)
+
+    with open(str(path / INFO_FILE), "w") as f:
+        f.write(json.dumps(files))
+
+
+def _write_raw(data_file: pathlib.Path, arrays: Iterable[Tuple[str, np.ndarray]],
+               pool: ThreadPoolExecutor, window: int) -> Dict[str, Dict[str, any]]:
+    tensors = {}
+    offset = 0
+
+    def shards():
+        nonlocal offset
+        for name, array in arrays:
+            array = np.require(array, requirements='C')
+            data = array.reshape(-1).view(np.uint8)
+            offset += -offset % _ALIGNMENT
+            tensors[name] = dict(dtype=array.dtype.str, shape=list(array.shape), offset=offset)
+            for start in range(0, len(data), SHARD_SIZE):
+                yield offset + start, data[start:start + SHARD_SIZE]
+            offset += len(data)
+
+    # Padding is left as holes, which read as zeros
+    with open(str(data_file), "wb") as f:
+        fd = f.fileno()
+        for _ in util.map_ordered(pool, lambda shard: _pwrite(fd, shard[1], shard[0]),
+                                  shards(), window):
+            pass
+        f.truncate(offset)
+
+    return tensors
+
+
+def _write_compressed(data_file: pathlib.Path, arrays: Iterable[Tuple[str, np.ndarray]],
+                      codec: str, pool: ThreadPoolExecutor,
+                      window: int) -> Dict[str, Dict[str, any]]:
+    tensors = {}
+    with open(str(data_file), "wb") as f:
+        offset = 0
+        for name, array in arrays:
+            array = np.require(array, requirements='C')
+            data = array.reshape(-1).view(np.uint8)
+            itemsize = array.dtype.itemsize
+            chunks = (data[start:start + codecs.CHUNK_SIZE]
+                      for start in range(0, max(len(data), 1), codecs.CHUNK_SIZE))
+            tensor = dict(dtype=array.dtype.str, shape=list(array.shape), chunks=[])
+            for chunk, compressed in util.map_ordered(pool,
+                                                      lambda c: codecs.compress(codec, c, itemsize),
+                                                      chunks, window):
+                tensor['chunks'].append([offset, len(compressed), len(chunk)])
+                f.write(compressed)
+                offset += len(compressed)
+
+            tensors[name] = tensor
+
+    return tensors
+
+
+def _write_packed(path: pathlib.Path, files: any, arrays: Iterable[Tuple[str, np.ndarray]],
+                  codec: Optional[str], pool: ThreadPoolExecutor, window: int,
+                  storage: Dict[str, Dict[str, any]]):
+    if codec is None:
+        tensors = _write_raw(path / DATA_FILE, arrays, pool, window)
+    else:
+        tensors = _write_compressed(path / DATA_FILE, arrays, codec, pool, window)
+
+    for name, tensor_storage in storage.items():
+        tensors[name].update(tensor_storage)
+
+    with open(str(path / INFO_FILE), "w") as f:
+        f.write(json.dumps(dict(format='packed', codec=codec, files=files, tensors=tensors)))
+
+
+def convert_to_packed(checkpoint_path: pathlib.Path, trash_path: pathlib.Path, *,
+                      codec: Optional[str] = None):
+    """
+    ## Convert a checkpoint to the `packed` format
+
+    It's compressed with `codec`, if given.
+    Blobs that only this checkpoint referred to are removed.
+    """
+    if codec is not None:
+        codecs.check(codec)
+
+    with CheckpointReader(checkpoint_path) as reader:
+        if reader.format == 'packed' and reader.codec == codec:
+            return
+        is_blobs = reader.format == 'blobs'
+
+        tmp_path = checkpoint_path.parent / f"{checkpoint_path.name}.tmp"
+        if tmp_path.exists():
+            util.rm_tree(tmp_path)
+        tmp_path.mkdir()
+        threads = _pool_threads(None)
+        with ThreadPoolExecutor(threads) as pool:
+            _write_packed(tmp_path, reader.files, ((n, reader.read(n)) for n in reader.names()),
+                          codec, pool, 2 * threads, {})
+
+    util.rm_tree_background(checkpoint_path, trash_path)
+    tmp_path.rename(checkpoint_path)
+
+    if is_blobs:
+        collect_blobs(checkpoint_path.parent)
+
+
+def _pool_threads(threads: Optional[int]) -> int:
+    # The default of `ThreadPoolExecutor`
+    return threads if threads is not None else min(32, (os.cpu_count() or 1) + 4)
+
+
+class CheckpointWriter:
+    """
+    ## Write checkpoints
+
+    `files` is the header saved in `info.json`,
+    and `arrays` maps file names to the arrays.
+    The latest `keep_checkpoints` checkpoints are kept.
+    Arrays are written in shards, and compressed with `codec`,
+    on a pool of `threads` threads.
+
+    Floating point arrays are stored with reduced precision with `storage_dtype`,
+    one of `lab.experiment.precision.STORAGE_DTYPES`,
+    or a dictionary of glob patterns of array names to storage types
+    (or `None` to keep the original type); the first matching pattern is used.
+    Arrays with NaN or infinite values are kept in the original type instead of `int8`.
+    """
+
+    def __init__(self, path: pathlib.PurePath, trash_path: pathlib.PurePath, *,
+                 checkpoint_format: str = 'npy',
+                 codec: Optional[str] = None,
+                 keep_checkpoints: int = 1,
+                 threads: Optional[int] = None,
+                 is_async: bool = False,
+                 max_in_flight: int = 1,
+                 storage_dtype: Union[None, str, Dict[str, Optional[str]]] = None):
+        if checkpoint_format not in FORMATS:
+            raise ValueError(f"Unknown checkpoint format {checkpoint_format}")
+        if codec is not None:
+            codecs.check(codec)
+            if checkpoint_format == 'npy':
+                raise ValueError("The npy checkpoint format can't be compressed; "
+                                 "use the packed or blobs format")
+        if storage_dtype is not None:
+            patterns = storage_dtype if isinstance(storage_dtype, dict) else {'*': storage_dtype}
+            for d in patterns.values():
+                if d is not None:
+                    precision.check(d)
+            if checkpoint_format == 'npy':
+                raise ValueError("The npy checkpoint format can't have a storage dtype; "
+                                 "use the packed or blobs format")
+
+        self.path = pathlib.Path(path)
+        self.trash_path = pathlib.Path(trash_path)
+        self.checkpoint_format = checkpoint_format
+        self.codec = codec
+        self.keep_checkpoints = max(keep_checkpoints, 1)
+        self.threads = threads
+        self.is_async = is_async
+        self.storage_dtype = storage_dtype
+
+        self.__slots = threading.Semaphore(max_in_flight)
+        self.__queue = queue.Queue()
+        self.__thread: Optional[threading.Thread] = None
+        self.__error: Optional[BaseException] = None
+
+    def save(self, step: int, files: any,
+             arrays: Union[Dict[str, np.ndarray], Iterable[Tuple[str, np.ndarray]]], *,
+             on_written: Optional[Callable[[], None]] = None):
+        """
+        ### Save a checkpoint
+
+        `arrays` can be an iterator of names and arrays,
+        which is consumed while the checkpoint is written,
+        so that all arrays don't have to be in memory at once.
+
+        In async mode this returns once the checkpoint is queued,
+        and blocks while `max_in_flight` checkpoints are waiting to be written.
+        `arrays` must not be changed until `on_written` is called.
+        """
+        self.__raise_error()
+
+        if not self.is_async:
+            self.__write(step, files, arrays)
+            if on_written is not None:
+                on_written()
+            return
+
+        self.__slots.acquire()
+        if self.__thread is None:
+            self.__thread = threading.Thread(target=self.__run, daemon=True)
+            self.__thread.start()
+            atexit.register(self.wait)
+        self.__queue.put((step, files, arrays, on_written))
+
+    def wait(self):
+        """
+        ### Wait for queued checkpoints to be written
+        """
+        self.__queue.join()
+        self.__raise_error()
+
+    def __raise_error(self):
+        if self.__error is not None:
+            error, self.__error = self.__error, None
+            raise error
+
+    def __run(self):
+        while True:
+            step, files, arrays, on_written = self.__queue.get()
+            try:
+                self.__write(step, files, arrays)
+            except BaseException as e:
+                self.__error = e
+            finally:
+                if on_written is not None:
+                    on_written()
+                self.__slots.release()
+                self.__queue.task_done()
+
+    def __get_storage_dtype(self, name: str) -> Optional[str]:
+        if not isinstance(self.storage_dtype, dict):
+            return self.storage_dtype
+
+        for pattern, storage_dtype in self.storage_dtype.items():
+            if fnmatch.fnmatch(name, pattern):
+                return storage_dtype
+
+        return None
+
+    def __convert(self, arrays: Iterable[Tuple[str, np.ndarray]],
+                  storage: Dict[str, Dict[str, any]]):
+        """
+        Convert arrays to their storage types as they are written,
+        and collect the original types in `storage`
+        """
+        for name, array in arrays:
+            storage_dtype = self.__get_storage_dtype(name)
+            if storage_dtype is None or not precision.is_convertible(array):
+                yield name, array
+                continue
+
+            try:
+                stored, scales = precision.encode(storage_dtype, array)
+            except precision.NonFiniteError:
+                # Kept in the original type
+                yield name, array
+                continue
+
+            storage[name] = dict(storage_dtype=storage_dtype, original_dtype=array.dtype.str)
+            if scales is not None:
+                storage[name]['scales'] = f"{name}.scales"
+                storage[name]['scales_axis'] = -1
+                yield storage[name]['scales'], scales
+            yield name, stored
+
+    def __write(self, step: int, files: any,
+                arrays: Union[Dict[str, np.ndarray], Iterable[Tuple[str, np.ndarray]]]):
+        self.path.mkdir(parents=True, exist_ok=True)
+        if isinstance(arrays, dict):
+            arrays = arrays.items()
+
+        checkpoint_path = self.path / str(step)
+        assert not checkpoint_path.exists()
+
+        tmp_path = self.path / f"{step}.tmp"
+        if tmp_path.exists():
+            util.rm_tree(tmp_path)
+        tmp_path.mkdir()
+
+        if self.checkpoint_format == 'npy':
+            _write_npy(tmp_path, files, arrays)
+        else:
+            storage = {}
+            arrays = self.__convert(arrays, storage)
+            threads = _pool_threads(self.threads)
+            # Shards in flight are bounded, so that they don't all wait in memory
+            window = 2 * threads
+            with ThreadPoolExecutor(threads) as pool:
+                if self.checkpoint_format == 'packed':
+                    _write_packed(tmp_path, files, arrays, self.codec, pool, window, storage)
+                else:
+                    _write_blobs(tmp_path, self.path / BLOBS_DIR, files, arrays,
+                                 self.codec, pool, window, storage)
+
+        tmp_path.rename(checkpoint_path)
+
+        # Delete old checkpoints and incomplete ones
+        keep = {str(s) for s in checkpoint_steps(self.path)[-self.keep_checkpoints:]}
+        keep.add(BLOBS_DIR)
+        for c in self.path.iterdir():
+            if c.name not in keep:
+                util.rm_tree_background(c, self.trash_path)
+
+        collect_blobs(self.path)
@@ -0,0 +1,58 @@
+"""
+# Checkpoint compression codecs
+
+* `zlib`: `zlib` at level 6
+* `lzma`: `lzma` with preset 1; smaller and slower
+* `shuffle-zlib`: bytes of the array elements are regrouped by their position
+ in the element before `zlib`, so that the exponent bytes of floats,
+ which vary little, are next to each other
+
+Arrays are split into chunks of `CHUNK_SIZE` bytes that are compressed
+independently, so that they can be compressed and decompressed on a thread pool;
+`zlib` and `lzma` release the GIL.
+"""
+import lzma
+import zlib
+
+import numpy as np
+
+CODECS = ['zlib', 'lzma', 'shuffle-zlib']
+
+# A multiple of all item sizes, so that chunks have whole elements
+CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def check(codec: str):
+    if codec not in CODECS:
+        raise ValueError(f"Unknown checkpoint codec {codec}")
+
+
+def compress(codec: str, data: np.ndarray, itemsize: int) -> bytes:
+    """
+    ## Compress `data`, a `uint8` array of elements of `itemsize` bytes
+    """
+    if codec == 'lzma':
+        return lzma.compress(data, preset=1)
+    if codec == 'shuffle-zlib' and itemsize > 1:
+        data = data.reshape(-1, itemsize).T.copy()
+
+    return zlib.compress(data, 6)
+
+
+def decompress_into(codec: str, data, out: np.ndarray, itemsize: int):
+    """
+    ## Decompress `data` into `out`, a `uint8` array
+    """
+    if codec == 'lzma':
+        raw = lzma.decompress(data)
+    else:
+        raw = zlib.decompress(data)
+
+    raw = np.frombuffer(raw, dtype=np.uint8)
+    if len(raw) != len(out):
+        raise ValueError(f"Decompressed {len(raw)} bytes, expected {len(out)}")
+
+    if codec == 'shuffle-zlib' and itemsize > 1:
+        out.reshape(-1, itemsize)[:] = raw.reshape(itemsize, -1).T
+    else:
+        out[:] = raw
@@ -0,0 +1,145 @@
+"""
+# Git capture
+
+The commit, the dirty status and the diff of the repository are captured
+on a background thread, so that it overlaps with setting up models and data.
+
+The diff is streamed through `gzip` to a temporary file in the diffs directory,
+and renamed to `{trial index}.diff.gz` once the trial index is known.
+It can be limited to some paths, and is truncated at a maximum size.
+If it can't be saved, the error is logged and the trial has no diff.
+"""
+import atexit
+import gzip
+import os
+import pathlib
+import threading
+import typing
+from typing import List, Optional
+
+from lab import colors, logger
+
+if typing.TYPE_CHECKING:
+    import git
+
+_CHUNK_SIZE = 1 << 16
+
+
+class GitCapture:
+    """
+    ## Capture git information of a trial
+    """
+
+    def __init__(self, *,
+                 repo_path: pathlib.PurePath,
+                 diff_path: pathlib.PurePath,
+                 paths: Optional[List[str]],
+                 max_diff_size: int):
+        self.repo_path = repo_path
+        self.diff_path = pathlib.Path(diff_path)
+        self.paths = list(paths) if paths else []
+        self.max_diff_size = max_diff_size
+
+        self.commit: Optional[str] = None
+        self.commit_message: Optional[str] = None
+        self.is_dirty: Optional[bool] = None
+
+        self.__status_ready = threading.Event()
+        self.__lock = threading.Lock()
+        self.__error: Optional[BaseException] = None
+        self.__diff_file: Optional[pathlib.Path] = None
+        self.__is_diff_done = False
+        self.__index: Optional[int] = None
+
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+        atexit.register(self.join)
+
+    def __run(self):
+        try:
+            # GitPython is slow to import, so it's imported on the background thread
+            import git
+
+            repo = git.Repo(self.repo_path)
+            self.commit = repo.head.commit.hexsha
+            self.commit_message = repo.head.commit.message.strip()
+            status = repo.git.status('--porcelain', '--untracked-files=no', '--', *self.paths)
+            self.is_dirty = len(status.strip()) > 0
+        except BaseException as e:
+            self.__error = e
+            return
+        finally:
+            self.__status_ready.set()
+
+        diff_file = None
+        if self.is_dirty:
+            try:
+                diff_file = self.__save_diff(repo)
+            except Exception as e:
+                logger.log(f"Failed to save the git diff: {e}", color=colors.BrightColor.red)
+
+        with self.__lock:
+            self.__diff_file = diff_file
+            self.__is_diff_done = True
+            self.__publish()
+
+    def __save_diff(self, repo: 'git.Repo') -> pathlib.Path:
+        self.diff_path.mkdir(parents=True, exist_ok=True)
+        diff_file = self.diff_path / f".{os.getpid()}.{threading.get_ident()}.diff.gz.tmp"
+
+        process = repo.git.diff('--', *self.paths, as_process=True)
+        size = 0
+        try:
+            with gzip.open(str(diff_file), 'wb') as f:
+                while True:
+                    chunk = process.proc.stdout.read(_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    if size + len(chunk) > self.max_diff_size:
+                        f.write(chunk[:self.max_diff_size - size])
+                        f.write(f"\n# Diff truncated at {self.max_diff_size} bytes\n".encode('utf-8'))
+                        process.proc.kill()
+                        break
+                    f.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            process.proc.kill()
+            if diff_file.exists():
+                diff_file.unlink()
+            raise
+        finally:
+            process.proc.stdout.close()
+            process.proc.wait()
+
+        return diff_file
+
+    def __publish(self):
+        if not self.__is_diff_done or self.__index is None or self.__diff_file is None:
+            return
+
+        os.replace(str(self.__diff_file), str(self.diff_path / f"{self.__index}.diff.gz"))
+        self.__diff_file = None
+
+    def wait_status(self):
+        """
+        ### Wait for the commit and dirty status
+        """
+        self.__status_ready.wait()
+        if self.__error is not None:
+            raise self.__error
+
+    def save_diff(self, index: int):
+        """
+        ### Save the diff for the trial at `index`
+
+        The diff is moved into place when it's ready.
+        """
+        with self.__lock:
+            self.__index = index
+            self.__publish()
+
+    def join(self):
+        """
+        ### Wait for the capture to finish
+        """
+        self.__thread.join()
@@ -0,0 +1,265 @@
+"""
+# Lab index
+
+An index of the trials of all experiments, kept at the root of the logs directory,
+so that listing and querying trials doesn't parse every `trials.yaml`.
+
+The index keeps the trials of each experiment with only their latest progress,
+along with the size and modification time of the experiment's trials files.
+Trials append their updates to a journal next to the index;
+the journal is merged into the index when it is loaded.
+Experiments whose trials files changed otherwise are re-read in parallel.
+"""
+import json
+import os
+import pathlib
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from lab import util
+from lab.experiment.experiment_trial import Trial
+from lab.experiment.journal import FileLock, read_trials
+from lab.lab import Lab
+
+_INDEX_FILE = '.lab_index.json'
+_JOURNAL_FILE = '.lab_index.journal'
+_TRIALS_FILES = ('trials.yaml', 'trials.journal')
+
+_THREADS = 16
+
+
+def _stat(path: pathlib.Path) -> Optional[List[int]]:
+    try:
+        stat = os.stat(str(path))
+    except FileNotFoundError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _experiment_stat(experiment_path: pathlib.Path) -> List[Optional[List[int]]]:
+    return [_stat(experiment_path / f) for f in _TRIALS_FILES]
+
+
+def _summary(trial: Dict[str, any]) -> Dict[str, any]:
+    summary = dict(trial)
+    summary['progress'] = list(trial.get('progress') or [])[-1:]
+    return summary
+
+
+def _read_experiment(experiment_path: pathlib.Path) -> List[Dict[str, any]]:
+    try:
+        trials = read_trials(experiment_path / _TRIALS_FILES[1],
+                             experiment_path / _TRIALS_FILES[0])
+    except FileNotFoundError:
+        return []
+
+    return [_summary(t) for t in trials]
+
+
+def _to_float(value: str) -> Optional[float]:
+    try:
+        return float(str(value).replace(',', ''))
+    except ValueError:
+        return None
+
+
+_OPERATORS = {
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+    '=': lambda a, b: a == b,
+}
+
+_CONDITION = re.compile(r'^\s*([^<>=\s]+)\s*(<=|>=|<|>|=)\s*(\S+)\s*$')
+
+
+def parse_condition(condition: str) -> Tuple[str, str, float]:
+    """
+    ## Parse a metric condition like `loss<0.5`
+    """
+    match = _CONDITION.match(condition)
+    if match is None:
+        raise ValueError(f"Invalid metric condition: {condition}")
+
+    value = _to_float(match.group(3))
+    if value is None:
+        raise ValueError(f"Invalid metric condition: {condition}")
+
+    return match.group(1), match.group(2), value
+
+
+class LabIndex:
+    """
+    ## Index of trials of all experiments in a lab
+    """
+
+    def __init__(self, lab: Lab):
+        self.path = pathlib.Path(lab.experiments)
+        self.index_file = self.path / _INDEX_FILE
+        self.journal_file = self.path / _JOURNAL_FILE
+
+    def update_trial(self, name: str, index: int, trial: Dict[str, any]):
+        """
+        ### Record the latest state of a trial
+
+        This is called after the experiment's trials files are written,
+        so that the recorded sizes and modification times match them.
+        """
+        if not self.path.exists():
+            return
+
+        record = dict(experiment=name,
+                      index=index,
+                      trial=_summary(trial),
+                      stat=_experiment_stat(self.path / name))
+        with open(str(self.journal_file), 'a') as f:
+            with FileLock(f):
+                f.write(json.dumps(record) + '\n')
+
+    def __load_index(self) -> Dict[str, Dict[str, any]]:
+        try:
+            with open(str(self.index_file), 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    @staticmethod
+    def __replay(index: Dict[str, Dict[str, any]], lines: List[str]):
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+
+            entry = index.setdefault(record['experiment'], dict(stat=None, trials=[]))
+            trials = entry['trials']
+            i = record['index']
+            if i < len(trials):
+                trials[i] = record['trial']
+            elif i == len(trials):
+                trials.append(record['trial'])
+            else:
+                # Missed records; rebuild this experiment
+                entry['stat'] = None
+                continue
+            entry['stat'] = record['stat']
+
+    def __read_journal(self) -> List[str]:
+        try:
+            with open(str(self.journal_file), 'r') as journal:
+                with FileLock(journal, is_shared=True):
+                    return journal.read().splitlines()
+        except FileNotFoundError:
+            return []
+
+    def __save(self, index: Dict[str, Dict[str, any]], lines: List[str]):
+        """
+        Write the index and empty the journal,
+        merging records appended after `lines` were read
+        """
+        try:
+            with open(str(self.journal_file), 'a+') as journal:
+                with FileLock(journal):
+                    journal.seek(0)
+                    current = journal.read().splitlines()
+                    if current[:len(lines)] != lines:
+                        # Another process saved the index in between
+                        return
+                    self.__replay(index, current[len(lines):])
+                    util.write_atomic(self.index_file, json.dumps(index))
+                    journal.seek(0)
+                    journal.truncate()
+        except PermissionError:
+            # The index is only a cache; a read-only lab is read without it
+            pass
+
+    def load(self) -> Dict[str, List[Dict[str, any]]]:
+        """
+        ### Load the index, bringing stale experiments up to date
+
+        Returns the trials of each experiment, with only their latest progress.
+        The index is written only when it is updated.
+        """
+        if not self.path.exists():
+            return {}
+
+        lines = self.__read_journal()
+        index = self.__load_index()
+        self.__replay(index, lines)
+
+        names = sorted(e.name for e in os.scandir(str(self.path))
+                       if e.is_dir() and not e.name.startswith('.'))
+        is_changed = bool(lines) or set(index.keys()) != set(names)
+        index = {n: index[n] for n in names if n in index}
+
+        with ThreadPoolExecutor(_THREADS) as pool:
+            stats = list(pool.map(lambda n: _experiment_stat(self.path / n), names))
+            stale = [(n, s) for n, s in zip(names, stats)
+                     if n not in index or index[n]['stat'] != s]
+            rebuilt = list(pool.map(lambda n: _read_experiment(self.path / n[0]), stale))
+
+        for (name, stat), trials in zip(stale, rebuilt):
+            index[name] = dict(stat=stat, trials=trials)
+
+        if is_changed or stale:
+            self.__save(index, lines)
+
+        return {n: e['trials'] for n, e in index.items()}
+
+    def get_last_trial(self, name: str) -> Trial:
+        """
+        ### Get the last trial of an experiment
+        """
+        trials = self.load().get(name)
+        if not trials:
+            raise Exception(f"Experiment {name} has no trials")
+
+        return Trial.from_dict(trials[-1])
+
+    def query(self, *,
+              experiments: Optional[List[str]] = None,
+              date_from: Optional[str] = None,
+              date_to: Optional[str] = None,
+              commit: Optional[str] = None,
+              comment: Optional[str] = None,
+              metrics: Optional[List[Tuple[str, str, float]]] = None
+              ) -> List[Tuple[str, Trial]]:
+        """
+        ### Find trials
+
+        * `date_from` and `date_to` are inclusive `YYYY-MM-DD` dates
+        * `commit` matches the start of the commit hash or a part of the commit message
+        * `comment` matches a part of the comment, ignoring case
+        * `metrics` are conditions like `('loss', '<', 0.5)` on the latest progress;
+         trials without the metric don't match
+        """
+        results = []
+        for name, trials in self.load().items():
+            if experiments is not None and name not in experiments:
+                continue
+
+            for t in trials:
+                if date_from is not None and t['trial_date'] < date_from:
+                    continue
+                if date_to is not None and t['trial_date'] > date_to:
+                    continue
+                if commit is not None:
+                    if not (str(t.get('commit') or '').startswith(commit) or
+                            commit in str(t.get('commit_message') or '')):
+                        continue
+                if comment is not None and comment.lower() not in str(t.get('comment') or '').lower():
+                    continue
+                if metrics:
+                    progress = t['progress'][-1] if t['progress'] else {}
+                    values = [_to_float(progress.get(k, '')) for k, _, _ in metrics]
+                    if any(v is None or not _OPERATORS[op](v, threshold)
+                           for v, (_, op, threshold) in zip(values, metrics)):
+                        continue
+
+                results.append((name, Trial.from_dict(t)))
+
+        return results
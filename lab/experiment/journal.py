@@ -0,0 +1,162 @@
+"""
+# Trials journal
+
+Instead of rewriting `trials.yaml` on every save, trial records are
+appended to a journal file, one JSON line per record.
+Appends are serialized with a file lock, so concurrent trials of an
+experiment don't overwrite each other.
+
+The journal is replayed to get the trials,
+and `compact` regenerates the human readable `trials.yaml` from it.
+"""
+import json
+import os
+import pathlib
+from typing import List, Dict
+
+from lab import util
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+class FileLock:
+    """
+    ## Lock on an open file
+
+    Exclusive by default; shared locks are for readers.
+    """
+
+    def __init__(self, file, *, is_shared: bool = False):
+        self.file = file
+        self.is_shared = is_shared
+
+    def __enter__(self):
+        if fcntl is not None:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_SH if self.is_shared else fcntl.LOCK_EX)
+        return self.file
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.file.flush()
+        if fcntl is not None:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+
+
+def _replay(lines: List[str]) -> List[Dict[str, any]]:
+    trials = []
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            # A partially written last line
+            continue
+        index = record['index']
+        if index < len(trials):
+            trials[index] = record['trial']
+        else:
+            trials.append(record['trial'])
+
+    return trials
+
+
+class TrialsJournal:
+    """
+    ## Append-only journal of trials
+    """
+
+    def __init__(self, journal_file: pathlib.PurePath, trials_log_file: pathlib.PurePath):
+        self.journal_file = journal_file
+        self.trials_log_file = trials_log_file
+
+    def __open(self):
+        return open(str(self.journal_file), 'a+')
+
+    def __read_log(self) -> List[Dict[str, any]]:
+        try:
+            with open(str(self.trials_log_file), 'r') as f:
+                trials = util.yaml_load(f.read())
+        except FileNotFoundError:
+            trials = None
+
+        return trials if trials else []
+
+    def __read(self, file) -> List[Dict[str, any]]:
+        file.seek(0)
+        trials = _replay(file.read().splitlines())
+        if trials:
+            return trials
+
+        # Start the journal from an existing `trials.yaml`
+        trials = self.__read_log()
+        for i, t in enumerate(trials):
+            file.write(json.dumps(dict(index=i, trial=t)) + '\n')
+
+        return trials
+
+    def read(self) -> List[Dict[str, any]]:
+        """
+        ### Replay the journal to get the trials
+
+        This doesn't write; a missing or empty journal falls back to `trials.yaml`.
+        """
+        try:
+            with open(str(self.journal_file), 'r') as f:
+                with FileLock(f, is_shared=True):
+                    trials = _replay(f.read().splitlines())
+        except FileNotFoundError:
+            trials = []
+
+        return trials if trials else self.__read_log()
+
+    def add(self, trial: Dict[str, any]) -> int:
+        """
+        ### Append a new trial and get its index
+        """
+        with self.__open() as f:
+            with FileLock(f):
+                index = len(self.__read(f))
+                f.seek(0, os.SEEK_END)
+                f.write(json.dumps(dict(index=index, trial=trial)) + '\n')
+
+        return index
+
+    def update(self, index: int, trial: Dict[str, any]):
+        """
+        ### Append a new state of the trial at `index`
+        """
+        line = json.dumps(dict(index=index, trial=trial)) + '\n'
+        with self.__open() as f:
+            with FileLock(f):
+                f.write(line)
+
+    def compact(self):
+        """
+        ### Regenerate `trials.yaml` and shrink the journal to one record per trial
+        """
+        with self.__open() as f:
+            with FileLock(f):
+                trials = self.__read(f)
+                util.write_atomic(pathlib.Path(self.trials_log_file), util.yaml_dump(trials))
+
+                # Rewritten in place, since other processes may be waiting on the lock
+                f.seek(0)
+                f.truncate()
+                for i, t in enumerate(trials):
+                    f.write(json.dumps(dict(index=i, trial=t)) + '\n')
+
+
+def read_trials(journal_file: pathlib.PurePath, trials_log_file: pathlib.PurePath):
+    """
+    ## Read trials from the journal if there is one, or from `trials.yaml`
+    """
+    if pathlib.Path(journal_file).exists():
+        return TrialsJournal(journal_file, trials_log_file).read()
+
+    with open(str(trials_log_file), "r") as file:
+        trials = util.yaml_load(file.read())
+
+    return trials if trials is not None else []
@@ -0,0 +1,88 @@
+"""
+# Coalescing background writer
+
+Requests to write are coalesced, and only the latest payload is written,
+at most once every `interval` seconds, on a background thread.
+`flush` writes any pending payload right away; it's called at exit.
+"""
+import atexit
+import threading
+import time
+from typing import Callable, Optional
+
+
+class CoalescingWriter:
+    """
+    ## Coalescing background writer
+    """
+
+    def __init__(self, write: Callable[[any], None], interval: float):
+        self.__write = write
+        self.interval = interval
+
+        self.__condition = threading.Condition()
+        self.__write_lock = threading.Lock()
+        self.__payload = None
+        self.__is_pending = False
+        self.__last_write = 0.
+        self.__thread: Optional[threading.Thread] = None
+
+        atexit.register(self.flush)
+
+    def request(self, payload: any):
+        """
+        ### Request a write of `payload`
+
+        This replaces any payload that hasn't been written yet.
+        """
+        if self.interval <= 0:
+            with self.__write_lock:
+                self.__write(payload)
+            return
+
+        with self.__condition:
+            self.__payload = payload
+            self.__is_pending = True
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__run, daemon=True)
+                self.__thread.start()
+            self.__condition.notify()
+
+    def __take(self):
+        with self.__condition:
+            if not self.__is_pending:
+                return False, None
+            payload = self.__payload
+            self.__payload = None
+            self.__is_pending = False
+            return True, payload
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                while True:
+                    if not self.__is_pending:
+                        self.__condition.wait()
+                        continue
+                    remaining = self.__last_write + self.interval - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.__condition.wait(remaining)
+
+            with self.__write_lock:
+                is_pending, payload = self.__take()
+                if is_pending:
+                    self.__write(payload)
+                    self.__last_write = time.monotonic()
+
+    def flush(self):
+        """
+        ### Write the pending payload now
+
+        This also waits for a write in progress on the background thread.
+        """
+        with self.__write_lock:
+            is_pending, payload = self.__take()
+            if is_pending:
+                self.__write(payload)
+                self.__last_write = time.monotonic()
@@ -0,0 +1,161 @@
+"""
+# Reduced precision storage
+
+Floating point arrays can be stored in checkpoints with fewer bits,
+and are converted back to their original type when they are read.
+
+* `float16`: half of `float32`; values beyond ±65504 become infinite
+* `bfloat16`: half of `float32`, with the range of `float32` and 8 bits of precision;
+ stored as `uint16`, rounded to the nearest even
+* `int8`: a quarter of `float32`; each slice along an axis (the last one by default)
+ is scaled by the largest absolute value in it,
+ and the scales are stored as a separate `float32` array.
+ Arrays with less than two dimensions have a single scale.
+ Arrays with NaN or infinite values can't be stored as `int8`.
+
+Conversions are done in chunks of about `CHUNK_SIZE` elements,
+so that temporary arrays are small.
+"""
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+STORAGE_DTYPES = ['float16', 'bfloat16', 'int8']
+
+CHUNK_SIZE = 1 << 20
+
+_STORED = {
+    'float16': np.dtype(np.float16),
+    'bfloat16': np.dtype(np.uint16),
+    'int8': np.dtype(np.int8),
+}
+
+
+class NonFiniteError(ValueError):
+    pass
+
+
+def check(storage_dtype: str):
+    if storage_dtype not in STORAGE_DTYPES:
+        raise ValueError(f"Unknown storage dtype {storage_dtype}")
+
+
+def is_convertible(array: np.ndarray) -> bool:
+    """
+    ## Whether `array` has more precision than the storage types
+    """
+    return array.dtype.kind == 'f' and array.dtype.itemsize >= 4
+
+
+def _rows(array: np.ndarray) -> np.ndarray:
+    if array.ndim < 2:
+        return array.reshape(-1, 1)
+    return array.reshape(array.shape[0], int(np.prod(array.shape[1:], dtype=np.int64)))
+
+
+def _chunks(rows: np.ndarray) -> Iterator[slice]:
+    step = max(1, CHUNK_SIZE // max(rows.shape[1], 1))
+    for start in range(0, rows.shape[0], step):
+        yield slice(start, start + step)
+
+
+def _axis_view(array: np.ndarray, axis: int) -> np.ndarray:
+    """
+    View as `(before, shape[axis], after)`, or `(size, 1, 1)` with less than two dimensions
+    """
+    if array.ndim < 2:
+        return array.reshape(-1, 1, 1)
+    axis = axis % array.ndim
+    before = int(np.prod(array.shape[:axis], dtype=np.int64))
+    after = int(np.prod(array.shape[axis + 1:], dtype=np.int64))
+    return array.reshape(before, array.shape[axis], after)
+
+
+def _axis_chunks(view: np.ndarray) -> Iterator[Tuple[slice, slice]]:
+    before, n, after = view.shape
+    if n * after <= CHUNK_SIZE:
+        step = max(1, CHUNK_SIZE // max(n * after, 1))
+        for start in range(0, before, step):
+            yield slice(start, start + step), slice(None)
+    else:
+        step = max(1, CHUNK_SIZE // max(after, 1))
+        for b in range(before):
+            for start in range(0, n, step):
+                yield slice(b, b + 1), slice(start, start + step)
+
+
+def _to_bfloat16(x: np.ndarray) -> np.ndarray:
+    x = x.astype(np.float32, copy=False)
+    bits = x.view(np.uint32)
+    rounding = ((bits >> 16) & 1) + 0x7FFF
+    result = ((bits + rounding) >> 16).astype(np.uint16)
+    # Rounding can carry the mantissa of a NaN into infinity
+    nan = np.isnan(x)
+    result[nan] = (bits[nan] >> 16).astype(np.uint16) | 0x0040
+
+    return result
+
+
+def _from_bfloat16(x: np.ndarray) -> np.ndarray:
+    return (x.astype(np.uint32) << 16).view(np.float32)
+
+
+def encode(storage_dtype: str, array: np.ndarray, *,
+           axis: int = -1) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    ## Convert `array` to `storage_dtype`
+
+    Returns the stored array and the `int8` scales of the slices along `axis`.
+    Raises `NonFiniteError` if an array with NaN or infinite values is stored as `int8`.
+    """
+    array = np.require(array, requirements='C')
+    stored = np.empty(array.shape, dtype=_STORED[storage_dtype])
+
+    if storage_dtype != 'int8':
+        rows = _rows(array)
+        stored_rows = _rows(stored)
+        for s in _chunks(rows):
+            if storage_dtype == 'float16':
+                stored_rows[s] = rows[s]
+            else:
+                stored_rows[s] = _to_bfloat16(rows[s])
+        return stored, None
+
+    view = _axis_view(array, axis)
+    stored_view = _axis_view(stored, axis)
+    maxima = np.zeros(view.shape[1], dtype=np.float32)
+    for b, c in _axis_chunks(view):
+        np.maximum(maxima[c], np.abs(view[b, c]).max(axis=(0, 2), initial=0), out=maxima[c])
+    if array.ndim < 2:
+        maxima = maxima.max(initial=0, keepdims=True)
+    # NaN and infinity propagate to the maxima
+    if not np.isfinite(maxima).all():
+        raise NonFiniteError("Arrays with NaN or infinite values can't be stored as int8")
+    scales = maxima / 127
+    scales[scales == 0] = 1
+
+    for b, c in _axis_chunks(view):
+        stored_view[b, c] = np.clip(np.rint(view[b, c] / scales[c][None, :, None]), -127, 127)
+
+    return stored, scales
+
+
+def decode(storage_dtype: str, stored: np.ndarray, scales: Optional[np.ndarray],
+           out: np.ndarray, *, axis: int = -1):
+    """
+    ## Convert `stored` back into `out`, a C contiguous array of the original type
+    """
+    if storage_dtype == 'int8':
+        view = _axis_view(stored, axis)
+        out_view = _axis_view(out, axis)
+        for b, c in _axis_chunks(view):
+            np.multiply(view[b, c], scales[c][None, :, None], out=out_view[b, c], casting='unsafe')
+        return
+
+    rows = _rows(stored)
+    out_rows = _rows(out)
+    for s in _chunks(rows):
+        if storage_dtype == 'float16':
+            out_rows[s] = rows[s]
+        else:
+            out_rows[s] = _from_bfloat16(rows[s])
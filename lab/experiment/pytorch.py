@@ -1,23 +1,91 @@
-import json
 import pathlib
-from typing import Optional, Dict
+import queue
+import threading
+from typing import Optional, Dict, Union
 
 import numpy as np
 import torch.nn
 
-from lab import experiment, util, tf_compat
+from lab import experiment, tf_compat
+from lab.experiment import checkpoint
 from lab import logger
 from lab.logger_class import tensorboard_writer, CheckpointSaver
 
 
+class _SnapshotBuffers:
+    """
+    ## Reusable CPU buffers for snapshots of tensors
+
+    Buffers are pinned when CUDA is available, so that copies from the GPU
+    are fast and asynchronous.
+    There are at most `n_sets` sets of buffers;
+    `snapshot` waits for a set to be released when all of them are in use.
+    """
+
+    def __init__(self, n_sets: int):
+        self.__n_sets = n_sets
+        self.__n_created = 0
+        self.__free = queue.Queue()
+        self.__lock = threading.Lock()
+
+    def __acquire(self) -> Dict[str, torch.Tensor]:
+        with self.__lock:
+            if self.__free.empty() and self.__n_created < self.__n_sets:
+                self.__n_created += 1
+                return {}
+
+        return self.__free.get()
+
+    def snapshot(self, tensors: Dict[str, torch.Tensor]) -> Dict[str, torch.Tensor]:
+        buffers = self.__acquire()
+        is_cuda = False
+        with torch.no_grad():
+            for key, tensor in tensors.items():
+                buffer = buffers.get(key)
+                if buffer is None or buffer.shape != tensor.shape or buffer.dtype != tensor.dtype:
+                    buffer = torch.empty(tensor.shape, dtype=tensor.dtype,
+                                         pin_memory=torch.cuda.is_available())
+                    buffers[key] = buffer
+                buffer.copy_(tensor.detach(), non_blocking=True)
+                is_cuda = is_cuda or tensor.is_cuda
+
+        if is_cuda:
+            torch.cuda.synchronize()
+
+        return buffers
+
+    def release(self, buffers: Dict[str, torch.Tensor]):
+        self.__free.put(buffers)
+
+
 class Checkpoint(CheckpointSaver):
     max_step: Optional[int]
     __models: Dict[str, torch.nn.Module]
 
-    def __init__(self, path: pathlib.PurePath):
+    def __init__(self, path: pathlib.PurePath, trash_path: pathlib.PurePath, *,
+                 checkpoint_format: str = 'npy',
+                 codec: Optional[str] = None,
+                 storage_dtype: Union[None, str, Dict[str, Optional[str]]] = None,
+                 keep_checkpoints: int = 1,
+                 threads: Optional[int] = None,
+                 is_async: bool = False,
+                 max_in_flight: int = 1):
         self.path = path
+        self.threads = threads
         self.max_step = None
         self.__models = {}
+        self.__writer = checkpoint.CheckpointWriter(path, trash_path,
+                                                    checkpoint_format=checkpoint_format,
+                                                    codec=codec,
+                                                    storage_dtype=storage_dtype,
+                                                    keep_checkpoints=keep_checkpoints,
+                                                    threads=threads,
+                                                    is_async=is_async,
+                                                    max_in_flight=max_in_flight)
+        if is_async:
+            self.__buffers = _SnapshotBuffers(max_in_flight)
+        else:
+            self.__buffers = None
 
     def add_models(self, models: Dict[str, torch.nn.Module]):
         """
@@ -31,18 +99,13 @@ class Checkpoint(CheckpointSaver):
     def _save(self, global_step):
         """
         ## Save model as a set of numpy arrays
-        """
-
-        checkpoints_path = pathlib.Path(self.path)
-        if not checkpoints_path.exists():
-            checkpoints_path.mkdir()
-
-        checkpoint_path = checkpoints_path / str(global_step)
-        assert not checkpoint_path.exists()
 
-        checkpoint_path.mkdir()
+        In async mode, this copies the tensors to CPU buffers
+        and returns while they are written in the background.
+        """
 
         files = {}
+        tensors = {}
         for name, model in self.__models.items():
             state: Dict[str, torch.Tensor] = model.state_dict()
             files[name] = {}
@@ -52,54 +115,94 @@ class Checkpoint(CheckpointSaver):
 
                 file_name = f"{name}_{key}.npy"
                 files[name][key] = file_name
-
-                np.save(str(checkpoint_path / file_name), tensor.cpu().numpy())
-
-        # Save header
-        with open(str(checkpoint_path / "info.json"), "w") as f:
-            f.write(json.dumps(files))
-
-        # Delete old checkpoints
-        for c in checkpoints_path.iterdir():
-            if c.name != checkpoint_path.name:
-                util.rm_tree(c)
+                tensors[file_name] = tensor
+
+        if self.__buffers is None:
+            arrays = {f: t.cpu().numpy() for f, t in tensors.items()}
+            self.__writer.save(global_step, files, arrays)
+        else:
+            buffers = self.__buffers.snapshot(tensors)
+            arrays = {f: buffers[f].numpy() for f in tensors}
+            self.__writer.save(global_step, files, arrays,
+                               on_written=lambda: self.__buffers.release(buffers))
+
+    def wait(self):
+        """
+        ## Wait for checkpoints being written in the background
+        """
+        self.__writer.wait()
 
     def load(self):
         """
         ## Load model as a set of numpy arrays
-        """
 
-        checkpoints_path = pathlib.Path(self.path)
-        if not checkpoints_path.exists():
-            return False
+        Arrays are read straight into the existing parameters and buffers.
+        CPU tensors are read into their own memory, and other tensors
+        are read into a reused CPU buffer and copied;
+        so this needs memory for at most the largest tensor, besides the model.
+        """
 
-        max_step = -1
-        for c in checkpoints_path.iterdir():
-            max_step = max(max_step, int(c.name))
+        self.wait()
 
-        if max_step < 0:
+        checkpoints_path = pathlib.Path(self.path)
+        max_step = checkpoint.latest_step(checkpoints_path)
+        if max_step is None:
             return False
 
-        checkpoint_path = checkpoints_path / str(max_step)
-
-        with open(str(checkpoint_path / "info.json"), "r") as f:
-            files = json.loads(f.readline())
-
-        # Load each variable
-        for name, model in self.__models.items():
-            state: Dict[str, torch.Tensor] = model.state_dict()
-            for key, tensor in state.items():
-                file_name = files[name][key]
-                saved = np.load(str(checkpoint_path / file_name))
-                saved = torch.from_numpy(saved).to(tensor.device)
-                state[key] = saved
-
-            model.load_state_dict(state)
+        with checkpoint.CheckpointReader(checkpoints_path / str(max_step),
+                                         threads=self.threads) as reader, torch.no_grad():
+            files = reader.files
+
+            direct = {}
+            staged = []
+            for name, model in self.__models.items():
+                for key, tensor in model.state_dict().items():
+                    file_name = files[name][key]
+                    shape, dtype = reader.shape_dtype(file_name)
+                    if tuple(tensor.shape) != shape:
+                        raise RuntimeError(f"Size mismatch for {name}.{key}: "
+                                           f"{list(shape)} in checkpoint, "
+                                           f"{list(tensor.shape)} in model")
+                    array = _numpy_view(tensor)
+                    if array is not None and array.dtype == dtype:
+                        direct[file_name] = array
+                    else:
+                        staged.append((file_name, tensor, shape, dtype))
+
+            sizes = [int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+                     for _, _, shape, dtype in staged]
+            done = sum(a.nbytes for a in direct.values())
+            total = max(done + sum(sizes), 1)
+
+            with logger.section("Reading arrays"):
+                reader.read_into(direct, on_progress=lambda f: logger.progress(f * done / total))
+
+                buffer = torch.empty(max(sizes, default=0), dtype=torch.uint8,
+                                     pin_memory=torch.cuda.is_available())
+                for (file_name, tensor, shape, dtype), size in zip(staged, sizes):
+                    array = buffer[:size].numpy().view(dtype).reshape(shape)
+                    reader.read_into({file_name: array}, on_progress=lambda f: logger.progress(
+                        (done + f * size) / total))
+                    tensor.copy_(torch.from_numpy(array))
+                    done += size
 
         self.max_step = max_step
         return True
 
 
+def _numpy_view(tensor: torch.Tensor) -> Optional[np.ndarray]:
+    """
+    NumPy array that shares memory with `tensor`, if there can be one
+    """
+    if tensor.device.type != 'cpu' or not tensor.is_contiguous():
+        return None
+    try:
+        return tensor.numpy()
+    except (TypeError, RuntimeError):
+        # Types like `bfloat16` that NumPy doesn't have
+        return None
+
+
 class Experiment(experiment.Experiment):
     """
     ## Experiment
@@ -113,7 +216,14 @@ class Experiment(experiment.Experiment):
                  python_file: str,
                  comment: str,
                  check_repo_dirty: Optional[bool] = None,
-                 is_log_python_file: Optional[bool] = None):
+                 is_log_python_file: Optional[bool] = None,
+                 checkpoint_format: str = 'npy',
+                 checkpoint_codec: Optional[str] = None,
+                 checkpoint_storage_dtype: Union[None, str, Dict[str, Optional[str]]] = None,
+                 keep_checkpoints: int = 1,
+                 checkpoint_threads: Optional[int] = None,
+                 is_async_checkpoint: bool = False,
+                 max_checkpoints_in_flight: int = 1):
         """
         ### Create the experiment
 
@@ -123,6 +233,21 @@ class Experiment(experiment.Experiment):
         :param comment: a short description of the experiment
         :param check_repo_dirty: whether not to start the experiment if
          there are uncommitted changes.
+        :param checkpoint_format: `npy` (the default) to save a file per variable,
+         `packed` to save checkpoints in a single file, or `blobs` to save only the parts
+         that changed since earlier checkpoints
+        :param checkpoint_codec: `zlib`, `lzma` or `shuffle-zlib` to compress
+         `packed` and `blobs` checkpoints
+        :param checkpoint_storage_dtype: `float16`, `bfloat16` or `int8` to store
+         floating point variables with less precision, or a dictionary of
+         glob patterns of array names to these (or `None`).
+         They are converted back to their original types when loaded.
+        :param keep_checkpoints: number of latest checkpoints to keep
+        :param checkpoint_threads: number of threads that read and write
+         checkpoints in parallel
+        :param is_async_checkpoint: whether to write checkpoints in the background
+        :param max_checkpoints_in_flight: number of checkpoints that can be
+         waiting to be written, before saving blocks
 
         The experiments log keeps track of `python_file`, `name`, `comment` as
          well as the git commit.
@@ -130,6 +255,15 @@ class Experiment(experiment.Experiment):
         Experiment maintains the locations of checkpoints, logs, etc.
         """
 
+        # Used by `_create_checkpoint_saver`, which is called by `super().__init__`
+        self.__checkpoint_format = checkpoint_format
+        self.__checkpoint_codec = checkpoint_codec
+        self.__checkpoint_storage_dtype = checkpoint_storage_dtype
+        self.__keep_checkpoints = keep_checkpoints
+        self.__checkpoint_threads = checkpoint_threads
+        self.__is_async_checkpoint = is_async_checkpoint
+        self.__max_checkpoints_in_flight = max_checkpoints_in_flight
+
         super().__init__(name=name,
                          python_file=python_file,
                          comment=comment,
@@ -137,9 +271,22 @@ class Experiment(experiment.Experiment):
                          is_log_python_file=is_log_python_file)
 
     def _create_checkpoint_saver(self):
-        self.__checkpoint_saver = Checkpoint(self.info.checkpoint_path)
+        self.__checkpoint_saver = Checkpoint(self.info.checkpoint_path, self.info.trash_path,
+                                             checkpoint_format=self.__checkpoint_format,
+                                             codec=self.__checkpoint_codec,
+                                             storage_dtype=self.__checkpoint_storage_dtype,
+                                             keep_checkpoints=self.__keep_checkpoints,
+                                             threads=self.__checkpoint_threads,
+                                             is_async=self.__is_async_checkpoint,
+                                             max_in_flight=self.__max_checkpoints_in_flight)
         return self.__checkpoint_saver
 
+    def wait_checkpoints(self):
+        """
+        ## Wait for checkpoints being written in the background
+        """
+        self.__checkpoint_saver.wait()
+
     def create_writer(self):
         """
         ## Create TensorFlow summary writer
@@ -1,28 +1,88 @@
-import json
 import pathlib
-from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple, Union
 
 import numpy as np
 import tensorflow as tf
 
-from lab import tf_util, util, experiment, logger, tf_compat
+from lab import tf_util, experiment, logger, tf_compat
+from lab.experiment import checkpoint
 from lab.logger_class import tensorboard_writer, CheckpointSaver
 
 
+def _batches(items: List[any], sizes: List[int], max_bytes: int) -> List[List[any]]:
+    """
+    Split `items` into consecutive batches of at most `max_bytes`,
+    or of a single item if it's larger
+    """
+    batches = []
+    batch, batch_size = [], 0
+    for item, size in zip(items, sizes):
+        if batch and batch_size + size > max_bytes:
+            batches.append(batch)
+            batch, batch_size = [], 0
+        batch.append(item)
+        batch_size += size
+
+    if batch:
+        batches.append(batch)
+
+    return batches
+
+
 class Checkpoint(CheckpointSaver):
     max_step: Optional[int]
     __variables: Optional[List[tf.Variable]]
-
-    def __init__(self, path: pathlib.PurePath):
+    __restore_ops: Optional[List[Tuple[tf.Tensor, tf.Operation]]]
+
+    def __init__(self, path: pathlib.PurePath, trash_path: pathlib.PurePath, *,
+                 checkpoint_format: str = 'npy',
+                 codec: Optional[str] = None,
+                 storage_dtype: Union[None, str, Dict[str, Optional[str]]] = None,
+                 keep_checkpoints: int = 1,
+                 threads: Optional[int] = None,
+                 is_async: bool = False,
+                 max_in_flight: int = 1,
+                 max_batch_bytes: int = 256 * 1024 * 1024,
+                 is_overlapped_save: bool = True):
         self.path = path
+        self.threads = threads
+        self.max_batch_bytes = max_batch_bytes
+        self.is_overlapped_save = is_overlapped_save
+        self.__is_async = is_async
         self.max_step = None
         self.__variables = None
+        self.__restore_ops = None
+        self.__writer = checkpoint.CheckpointWriter(path, trash_path,
+                                                    checkpoint_format=checkpoint_format,
+                                                    codec=codec,
+                                                    storage_dtype=storage_dtype,
+                                                    keep_checkpoints=keep_checkpoints,
+                                                    threads=threads,
+                                                    is_async=is_async,
+                                                    max_in_flight=max_in_flight)
 
     def set_variables(self, variables: List[tf.Variable]):
         """
         ## Set variable for saving and loading
         """
         self.__variables = variables
+        self.__restore_ops = None
+
+    def __get_restore_ops(self) -> List[Tuple[tf.Tensor, tf.Operation]]:
+        """
+        Placeholders and assign operations are created once,
+        so that loading again doesn't add to the graph
+        """
+        if self.__restore_ops is None:
+            self.__restore_ops = []
+            for variable in self.__variables:
+                ph = tf.placeholder(variable.dtype.base_dtype,
+                                    shape=variable.shape,
+                                    name=f"{tf_util.strip_variable_name(variable.name)}_ph")
+                self.__restore_ops.append((ph, tf.assign(variable, ph).op))
+
+        return self.__restore_ops
 
     def save(self, global_step, args):
         self._save(global_step, args[0])
@@ -30,69 +90,98 @@ class Checkpoint(CheckpointSaver):
     def _save(self, global_step, session: tf.Session):
         """
         ## Save model as a set of numpy arrays
-        """
-
-        checkpoints_path = pathlib.Path(self.path)
-        if not checkpoints_path.exists():
-            checkpoints_path.mkdir()
 
-        checkpoint_path = checkpoints_path / str(global_step)
-        assert not checkpoint_path.exists()
+        Variables are fetched in groups of up to `max_batch_bytes`,
+        and each group is written before the next is fetched;
+        with `is_overlapped_save` the next group is fetched while one is written,
+        so up to two groups are in memory.
 
-        checkpoint_path.mkdir()
-
-        values = session.run(self.__variables)
+        In async mode, this returns after fetching all the values,
+        while they are written in the background.
+        """
 
-        # Save each variable
         files = {}
-        for variable, value in zip(self.__variables, values):
+        file_names = []
+        for variable in self.__variables:
             file_name = tf_util.variable_name_to_file_name(
                 tf_util.strip_variable_name(variable.name))
             file_name = f"{file_name}.npy"
             files[variable.name] = file_name
-
-            np.save(str(checkpoint_path / file_name), value)
-
-        # Save header
-        with open(str(checkpoint_path / "info.json"), "w") as f:
-            f.write(json.dumps(files))
-
-        # Delete old checkpoints
-        for c in checkpoints_path.iterdir():
-            if c.name != checkpoint_path.name:
-                util.rm_tree(c)
+            file_names.append(file_name)
+
+        if self.__is_async:
+            # Values must be fetched before training changes them
+            values = session.run(self.__variables)
+            self.__writer.save(global_step, files, dict(zip(file_names, values)))
+        else:
+            self.__writer.save(global_step, files, self.__fetch_groups(session, file_names))
+
+    def __fetch_groups(self, session: tf.Session, file_names: List[str]):
+        sizes = [(variable.shape.num_elements() or 0) * variable.dtype.base_dtype.size
+                 for variable in self.__variables]
+        groups = _batches(list(zip(self.__variables, file_names)), sizes, self.max_batch_bytes)
+
+        def fetch(group):
+            return session.run([variable for variable, _ in group])
+
+        with ThreadPoolExecutor(1) as pool:
+            future = None
+            for i, group in enumerate(groups):
+                if future is None:
+                    values = fetch(group)
+                else:
+                    values = future.result()
+                if self.is_overlapped_save and i + 1 < len(groups):
+                    future = pool.submit(fetch, groups[i + 1])
+                else:
+                    future = None
+
+                for (_, file_name), value in zip(group, values):
+                    yield file_name, value
+                values = None
+
+    def wait(self):
+        """
+        ## Wait for checkpoints being written in the background
+        """
+        self.__writer.wait()
 
     def load(self, session: tf.Session):
         """
         ## Load model as a set of numpy arrays
-        """
 
-        checkpoints_path = pathlib.Path(self.path)
-        if not checkpoints_path.exists():
-            return False
+        Variables are assigned in batches of up to `max_batch_bytes`,
+        with a single `session.run` for each batch.
+        """
 
-        max_step = -1
-        for c in checkpoints_path.iterdir():
-            max_step = max(max_step, int(c.name))
+        self.wait()
 
-        if max_step < 0:
+        checkpoints_path = pathlib.Path(self.path)
+        max_step = checkpoint.latest_step(checkpoints_path)
+        if max_step is None:
             return False
 
-        checkpoint_path = checkpoints_path / str(max_step)
-
-        with open(str(checkpoint_path / "info.json"), "r") as f:
-            files = json.loads(f.readline())
-
-        # Load each variable
-        for variable in self.__variables:
-            file_name = files[variable.name]
-            value = np.load(str(checkpoint_path / file_name))
-            ph = tf.placeholder(value.dtype,
-                                shape=value.shape,
-                                name=f"{tf_util.strip_variable_name(variable.name)}_ph")
-
-            assign_op = tf.assign(variable, ph)
-            session.run(assign_op, feed_dict={ph: value})
+        restore_ops = self.__get_restore_ops()
+
+        with checkpoint.CheckpointReader(checkpoints_path / str(max_step),
+                                         threads=self.threads) as reader:
+            names = [reader.files[variable.name] for variable in self.__variables]
+            sizes = []
+            for name in names:
+                shape, dtype = reader.shape_dtype(name)
+                sizes.append(int(np.prod(shape, dtype=np.int64)) * dtype.itemsize)
+            total = max(sum(sizes), 1)
+
+            with logger.section("Restoring variables"):
+                done = 0
+                for batch in _batches(list(range(len(names))), sizes, self.max_batch_bytes):
+                    batch_size = sum(sizes[i] for i in batch)
+                    arrays = reader.read_all([names[i] for i in batch],
+                                             on_progress=lambda f: logger.progress(
+                                                 (done + f * batch_size) / total))
+                    feed_dict = {restore_ops[i][0]: arrays[names[i]] for i in batch}
+                    session.run([restore_ops[i][1] for i in batch], feed_dict=feed_dict)
+                    done += batch_size
 
         self.max_step = max_step
 
@@ -114,7 +203,16 @@ class Experiment(experiment.Experiment):
                  python_file: str,
                  comment: str,
                  check_repo_dirty: Optional[bool] = None,
-                 is_log_python_file: Optional[bool] = None):
+                 is_log_python_file: Optional[bool] = None,
+                 checkpoint_format: str = 'npy',
+                 checkpoint_codec: Optional[str] = None,
+                 checkpoint_storage_dtype: Union[None, str, Dict[str, Optional[str]]] = None,
+                 keep_checkpoints: int = 1,
+                 checkpoint_threads: Optional[int] = None,
+                 is_async_checkpoint: bool = False,
+                 max_checkpoints_in_flight: int = 1,
+                 checkpoint_batch_bytes: int = 256 * 1024 * 1024,
+                 is_overlapped_checkpoint_save: bool = True):
         """
         ### Create the experiment
 
@@ -124,6 +222,25 @@ class Experiment(experiment.Experiment):
         :param comment: a short description of the experiment
         :param check_repo_dirty: whether not to start the experiment if
          there are uncommitted changes.
+        :param checkpoint_format: `npy` (the default) to save a file per variable,
+         `packed` to save checkpoints in a single file, or `blobs` to save only the parts
+         that changed since earlier checkpoints
+        :param checkpoint_codec: `zlib`, `lzma` or `shuffle-zlib` to compress
+         `packed` and `blobs` checkpoints
+        :param checkpoint_storage_dtype: `float16`, `bfloat16` or `int8` to store
+         floating point variables with less precision, or a dictionary of
+         glob patterns of array names to these (or `None`).
+         They are converted back to their original types when loaded.
+        :param keep_checkpoints: number of latest checkpoints to keep
+        :param checkpoint_threads: number of threads that read and write
+         checkpoints in parallel
+        :param is_async_checkpoint: whether to write checkpoints in the background
+        :param max_checkpoints_in_flight: number of checkpoints that can be
+         waiting to be written, before saving blocks
+        :param checkpoint_batch_bytes: maximum size of the variables
+         fetched or restored with a single `session.run`
+        :param is_overlapped_checkpoint_save: whether to fetch the next group of
+         variables while a group is written
 
         The experiments log keeps track of `python_file`, `name`, `comment` as
          well as the git commit.
@@ -131,6 +248,17 @@ class Experiment(experiment.Experiment):
         Experiment maintains the locations of checkpoints, logs, etc.
         """
 
+        # Used by `_create_checkpoint_saver`, which is called by `super().__init__`
+        self.__checkpoint_format = checkpoint_format
+        self.__checkpoint_codec = checkpoint_codec
+        self.__checkpoint_storage_dtype = checkpoint_storage_dtype
+        self.__keep_checkpoints = keep_checkpoints
+        self.__checkpoint_threads = checkpoint_threads
+        self.__is_async_checkpoint = is_async_checkpoint
+        self.__max_checkpoints_in_flight = max_checkpoints_in_flight
+        self.__checkpoint_batch_bytes = checkpoint_batch_bytes
+        self.__is_overlapped_checkpoint_save = is_overlapped_checkpoint_save
+
         super().__init__(name=name,
                          python_file=python_file,
                          comment=comment,
@@ -138,9 +266,24 @@ class Experiment(experiment.Experiment):
                          is_log_python_file=is_log_python_file)
 
     def _create_checkpoint_saver(self):
-        self.__checkpoint_saver = Checkpoint(self.info.checkpoint_path)
+        self.__checkpoint_saver = Checkpoint(self.info.checkpoint_path, self.info.trash_path,
+                                             checkpoint_format=self.__checkpoint_format,
+                                             codec=self.__checkpoint_codec,
+                                             storage_dtype=self.__checkpoint_storage_dtype,
+                                             keep_checkpoints=self.__keep_checkpoints,
+                                             threads=self.__checkpoint_threads,
+                                             is_async=self.__is_async_checkpoint,
+                                             max_in_flight=self.__max_checkpoints_in_flight,
+                                             max_batch_bytes=self.__checkpoint_batch_bytes,
+                                             is_overlapped_save=self.__is_overlapped_checkpoint_save)
         return self.__checkpoint_saver
 
+    def wait_checkpoints(self):
+        """
+        ## Wait for checkpoints being written in the background
+        """
+        self.__checkpoint_saver.wait()
+
     def create_writer(self, session: tf_compat.Session):
         """
         ## Create TensorFlow summary writer
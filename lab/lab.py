@@ -1,11 +1,45 @@
+import functools
 from pathlib import PurePath, Path
-from typing import List
+from typing import List, Tuple
 
 from lab import util
 
 _CONFIG_FILE_NAME = '.lab.yaml'
 
 
+def _to_bool(value) -> bool:
+    if isinstance(value, str):
+        return value.lower() in ('true', 'yes', '1')
+    return bool(value)
+
+
+@functools.lru_cache()
+def _find_config_files(path: Path) -> Tuple[dict, ...]:
+    """
+    Parse `.lab.yaml` files in `path` and its parents.
+    This is cached, since experiments and tools create `Lab` objects often.
+    """
+    configs = []
+
+    while path.exists():
+        if path.is_dir():
+            config_file = path / _CONFIG_FILE_NAME
+            if config_file.is_file():
+                with open(str(config_file)) as f:
+                    config = util.yaml_load(f.read())
+                    if config is None:
+                        config = {}
+                    config['config_file_path'] = path
+                    configs.append(config)
+
+        if str(path) == path.root:
+            break
+
+        path = path.parent
+
+    return tuple(configs)
+
+
 class Lab:
     """
     ### Lab
@@ -14,7 +48,11 @@ class Lab:
     """
 
     def __init__(self, path: str):
-        configs = self.__get_config_files(path)
+        path = Path(path).resolve()
+        if path.is_file():
+            path = path.parent
+        # Copies, since `__get_config` changes them
+        configs = [dict(c) for c in _find_config_files(path)]
 
         if len(configs) == 0:
             raise RuntimeError("No '.lab.yaml' config file found.")
@@ -24,6 +62,10 @@ class Lab:
         self.path = PurePath(config['path'])
         self.check_repo_dirty = config['check_repo_dirty']
         self.is_log_python_file = config['is_log_python_file']
+        self.is_trials_journal = _to_bool(config['is_trials_journal'])
+        self.progress_save_interval = float(config['progress_save_interval'])
+        self.diff_paths = config['diff_paths']
+        self.max_diff_size = int(config['max_diff_size'])
 
     @staticmethod
     def __get_config(configs):
@@ -31,6 +73,10 @@ class Lab:
             path=None,
             check_repo_dirty=True,
             is_log_python_file=True,
+            is_trials_journal=False,
+            progress_save_interval=10.,
+            diff_paths=None,
+            max_diff_size=16 * 1024 * 1024,
             config_file_path=None
         )
 
@@ -49,29 +95,6 @@ class Lab:
 
         return config
 
-    @staticmethod
-    def __get_config_files(path: str):
-        path = Path(path).resolve()
-        configs = []
-
-        while path.exists():
-            if path.is_dir():
-                config_file = path / _CONFIG_FILE_NAME
-                if config_file.is_file():
-                    with open(str(config_file)) as f:
-                        config = util.yaml_load(f.read())
-                        if config is None:
-                            config = {}
-                        config['config_file_path'] = path
-                        configs.append(config)
-
-            if str(path) == path.root:
-                break
-
-            path = path.parent
-
-        return configs
-
     @property
     def experiments(self) -> PurePath:
         """
@@ -84,4 +107,5 @@ class Lab:
         Get list of experiments
         """
         experiments_path = Path(self.experiments)
-        return [child for child in experiments_path.iterdir()]
+        return [child for child in experiments_path.iterdir()
+                if child.is_dir() and not child.name.startswith('.')]
@@ -1,8 +1,10 @@
-from typing import List
+from typing import List, Optional
 
-from lab import colors, util
+from lab import colors
 from lab.lab import Lab
 from lab.experiment import ExperimentInfo, Trial
+from lab.experiment.index import LabIndex, parse_condition
+from lab.experiment.journal import read_trials
 from lab import Logger
 
 
@@ -42,20 +44,51 @@ def get_tensorboard_cmd(lab: Lab, experiments: List[str]):
 def get_trials(lab: Lab, exp_name: str):
     exp = ExperimentInfo(lab, exp_name)
     trials = []
-    with open(exp.trials_log_file, "r") as file:
-        content = file.read()
-        trials_dict = util.yaml_load(content)
-        for d in trials_dict:
-            trial = Trial.from_dict(d)
-            trials.append(trial)
+    for d in read_trials(exp.trials_journal_file, exp.trials_log_file):
+        trial = Trial.from_dict(d)
+        trials.append(trial)
 
     return trials
 
 
 def get_last_trials(lab: Lab, experiments: List[str]) -> List[Trial]:
+    index = LabIndex(lab).load()
     exp_trials = []
     for exp_name in experiments:
-        trials = get_trials(lab, exp_name)
-        exp_trials.append(trials[-1])
+        trials = index.get(exp_name)
+        if not trials:
+            raise Exception(f"Experiment {exp_name} does not exist")
+        exp_trials.append(Trial.from_dict(trials[-1]))
 
     return exp_trials
+
+
+def query_trials(lab: Lab, *,
+                 experiments: Optional[List[str]] = None,
+                 date_from: Optional[str] = None,
+                 date_to: Optional[str] = None,
+                 commit: Optional[str] = None,
+                 comment: Optional[str] = None,
+                 metrics: Optional[List[str]] = None):
+    """
+    Find trials with the lab index.
+    `metrics` are conditions like `loss<0.5` on the latest progress.
+    """
+    if metrics is not None:
+        metrics = [parse_condition(m) for m in metrics]
+
+    return LabIndex(lab).query(experiments=experiments,
+                               date_from=date_from,
+                               date_to=date_to,
+                               commit=commit,
+                               comment=comment,
+                               metrics=metrics)
+
+
+def list_query_results(results, logger: Logger):
+    name = None
+    for exp_name, trial in results:
+        if exp_name != name:
+            name = exp_name
+            logger.log(name, color=colors.Style.bold)
+        list_trials([trial], logger)
@@ -87,7 +87,7 @@ def _get_pair_histogram(values):
 
 
 class Writer(lab.logger_class.writers.Writer):
-    def __init__(self, file_writer: tf_compat.summary.FileWriter):
+    def __init__(self, file_writer: 'tf_compat.summary.FileWriter'):
         super().__init__()
 
         self.__writer = file_writer
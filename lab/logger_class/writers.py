@@ -1,8 +1,12 @@
-import numpy as np
-
 from lab import colors
 
 
+def _mean(values):
+    # `numpy` is imported on first use to keep `import lab` fast
+    import numpy as np
+    return np.mean(values)
+
+
 class Writer:
     def write(self, *, global_step: int,
               queues,
@@ -34,15 +38,15 @@ class ProgressDictWriter(Writer):
             if k in queues:
                 if len(queues[k]) == 0:
                     continue
-                v = np.mean(queues[k])
+                v = _mean(queues[k])
             elif k in histograms:
                 if len(histograms[k]) == 0:
                     continue
-                v = np.mean(histograms[k])
+                v = _mean(histograms[k])
             else:
                 if len(scalars[k]) == 0:
                     continue
-                v = np.mean(scalars[k])
+                v = _mean(scalars[k])
 
             res[k] = f"{v :8,.2f}"
 
@@ -71,15 +75,15 @@ class ScreenWriter(Writer):
             if k in queues:
                 if len(queues[k]) == 0:
                     continue
-                v = np.mean(queues[k])
+                v = _mean(queues[k])
             elif k in histograms:
                 if len(histograms[k]) == 0:
                     continue
-                v = np.mean(histograms[k])
+                v = _mean(histograms[k])
             else:
                 if len(scalars[k]) == 0:
                     continue
-                v = np.mean(scalars[k])
+                v = _mean(scalars[k])
 
             parts.append((f" {k}: ", None))
             if self.is_color:
@@ -0,0 +1,576 @@
+import threading
+import time
+from pathlib import Path
+from typing import List, Union, Optional, Callable, Iterator, Dict, Tuple
+
+import numpy as np
+from matplotlib.axes import Axes
+
+from lab.experiment import ExperimentInfo
+from lab.lab import Lab
+from lab.tb import downsample
+from lab.tb.aggregate import RunsSummary, aggregate_runs, DEFAULT_PERCENTILES
+from lab.tb.cache import SummaryCache
+from lab.tb.event_file import Events, ScalarSeries, HistogramSeries, TensorSeries, \
+    EventDirectory, DecodedFile
+
+_BASIS_POINTS = np.array([
+    0,
+    668,
+    1587,
+    3085,
+    5000,
+    6915,
+    8413,
+    9332,
+    10000
+])
+
+
+_PERCENTILES = np.array([
+    0,
+    6.68,
+    15.87,
+    30.85,
+    50.00,
+    69.15,
+    84.13,
+    93.32,
+    100.00
+])
+
+
+def _compress_histograms(bucket_limit: np.ndarray, bucket: np.ndarray, offsets: np.ndarray,
+                         h_min: np.ndarray, h_max: np.ndarray, num: np.ndarray) -> np.ndarray:
+    """
+    ### Values of histograms at `_BASIS_POINTS`
+
+    This gives the same values as TensorBoard's `compress_histogram_proto`,
+    for all the histograms at once.
+    Buckets of histogram `i` are `offsets[i]:offsets[i + 1]`
+    of `bucket_limit` and `bucket`.
+    """
+    starts = offsets[:-1]
+    ends = offsets[1:]
+
+    # Cumulative counts within each histogram
+    cumsum = np.concatenate(([0.], np.cumsum(bucket)))
+    totals = cumsum[ends] - cumsum[starts]
+    event = np.repeat(np.arange(len(starts)), ends - starts)
+    local = cumsum[1:] - cumsum[starts][event]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weights = local * _BASIS_POINTS[-1] / totals[event]
+
+    # Index of the first bucket with weight greater than each basis point;
+    # `np.searchsorted(side='right')` within each histogram
+    below = np.zeros((len(_BASIS_POINTS), len(weights) + 1), dtype=np.int64)
+    np.cumsum(weights[None, :] <= _BASIS_POINTS[:, None], axis=1, out=below[:, 1:])
+    i = starts[None, :] + below[:, ends] - below[:, starts]
+    is_inside = i < ends[None, :]
+    i = np.minimum(i, max(len(weights) - 1, 0))
+
+    bp = _BASIS_POINTS[:, None]
+    if len(weights) == 0:
+        values = np.broadcast_to(h_max, bp.shape[:1] + h_max.shape).copy()
+    else:
+        is_first = i == starts[None, :]
+        cumsum_i = weights[i]
+        cumsum_prev = np.where(is_first, 0., weights[i - 1])
+        lhs = np.where(is_first | (cumsum_prev == 0),
+                       h_min[None, :],
+                       np.maximum(bucket_limit[i - 1], h_min[None, :]))
+        rhs = np.minimum(bucket_limit[i], h_max[None, :])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = lhs + (bp - cumsum_prev) * (rhs - lhs) / (cumsum_i - cumsum_prev)
+        values = np.where(is_inside, values, h_max[None, :])
+
+    values[:, (num == 0) | (totals == 0)] = 0.
+
+    return values.T
+
+
+def _matrix_densities(matrices: np.ndarray):
+    """
+    ### Densities of 2D histograms
+
+    `matrices` has shape `[..., rows, cols]`; the first row and column
+    are the bin edges and the rest are counts.
+    Returns x edges, y edges and densities of the cells within the edges.
+    """
+    x_edges = matrices[..., 0, 1:]
+    y_edges = matrices[..., 1:, 0]
+    widths = np.diff(x_edges, axis=-1)
+    heights = np.diff(y_edges, axis=-1)
+    areas = heights[..., :, None] * widths[..., None, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        densities = matrices[..., 1:-1, 1:-1] / areas
+
+    return x_edges, y_edges, densities
+
+
+class _DensityPlot:
+    """
+    ### A density plot that is redrawn for the visible x-range
+
+    `compute(x_range, width)` returns the line and the density data
+    for the range, reduced to `width` pixels.
+    """
+
+    def __init__(self, ax: Axes, compute, color, name, *,
+                 x_bounds: Optional[Tuple[float, float]],
+                 levels: int,
+                 line_width: float,
+                 alpha: float):
+        self.ax = ax
+        self.compute = compute
+        self.color = color
+        self.x_bounds = x_bounds
+        self.levels = levels
+        self.alpha = alpha
+        self.x_range = None
+        self.bands = []
+
+        self.line = ax.plot([], [],
+                            lw=line_width,
+                            color=color,
+                            alpha=1,
+                            label=name)
+        self.draw(None)
+
+        # Matplotlib keeps only weak references to bound methods
+        ax.callbacks.connect('xlim_changed', lambda a: self.on_xlim_changed(a))
+
+    def draw(self, x_range: Optional[Tuple[float, float]]):
+        self.x_range = x_range
+        line_x, line_y, data = self.compute(x_range, downsample.pixel_width(self.ax))
+
+        # Mean line
+        self.line[0].set_data(line_x, line_y)
+
+        # Other percentiles
+        for b in self.bands:
+            b.remove()
+        self.bands = []
+        for i in range(1, self.levels):
+            self.bands.append(self.ax.fill_between(
+                data[:, 0],
+                data[:, 5 - i],
+                data[:, 5 + i],
+                color=self.color,
+                lw=0,
+                alpha=self.alpha ** i))
+
+        self.ax.relim()
+
+    def on_xlim_changed(self, ax: Axes):
+        x_range = ax.get_xlim()
+        if self.x_bounds is None or x_range == self.x_range:
+            return
+        # Everything is already drawn
+        is_all = x_range[0] <= self.x_bounds[0] and x_range[1] >= self.x_bounds[1]
+        if is_all and self.x_range is None:
+            return
+
+        self.draw(None if is_all else x_range)
+
+
+class Analyzer:
+    """
+    # TensorBoard Summary Analyzer
+
+    This loads TensorBoard summaries, and provides a set of tools to
+    create customized charts on Jupyter notebooks.
+
+    Summaries are read with `lab.tb.event_file`, without TensorFlow,
+    into columnar NumPy arrays.
+    Pass `tags` to decode only the summaries you need.
+    Decoded event files are cached in the experiment's `log_cache` directory,
+    unless `is_cache` is `False`.
+
+    The data format we use is as follows 👇
+
+    ```
+    [index,
+     0%,
+     6.68%,
+     15.87%,
+     30.85%,
+     50.00%,
+     69.15%,
+     84.13%,
+     93.32%,
+     100.00%]
+    ```
+
+    Each data point gives a histogram in the the above format.
+    """
+
+    def __init__(self, lab: Lab, experiment: str, *,
+                 tags: Optional[List[str]] = None,
+                 is_cache: bool = True):
+        self.info = ExperimentInfo(lab, experiment)
+        self.tags = tags
+        if is_cache:
+            self.cache = SummaryCache(Path(self.info.summary_cache_path))
+        else:
+            self.cache = None
+        self.events = Events()
+        self.__directory = self.__create_directory()
+
+    def __create_directory(self):
+        return EventDirectory(Path(self.info.summary_path), self.tags, cache=self.cache)
+
+    def load(self, *, decoded: Optional[Dict[Path, DecodedFile]] = None):
+        """
+        ## Load summaries
+
+        Event files in `decoded` are not read again;
+        `lab.tb.batch.load_experiments` uses this to pass
+        event files decoded in parallel.
+        """
+        self.__directory = self.__create_directory()
+        self.events, _ = self.__directory.read(decoded)
+
+    def update(self) -> Events:
+        """
+        ## Load summaries written since the last `load` or `update`
+
+        Only records appended to the event files are read.
+        Returns the new events; if an event file was deleted or replaced,
+        everything is reloaded and all events are returned.
+        """
+        events, is_reset = self.__directory.read()
+        if is_reset:
+            self.events = events
+        else:
+            self.events.extend(events)
+
+        return events
+
+    def follow(self, interval: float = 1., timeout: Optional[float] = None) -> Iterator[Events]:
+        """
+        ## Follow a running experiment
+
+        This yields new events whenever summaries are written.
+        It checks for new summaries every `interval` seconds,
+        and stops if nothing is written for `timeout` seconds.
+
+        ```python
+        for _ in analyzer.follow():
+            # update plots
+        ```
+        """
+        last = time.time()
+        while True:
+            events = self.update()
+            if not events.is_empty:
+                last = time.time()
+                yield events
+            elif timeout is not None and time.time() - last > timeout:
+                return
+            else:
+                time.sleep(interval)
+
+    def start_polling(self, interval: float,
+                      callback: Callable[['Analyzer', Events], None]) -> 'Poller':
+        """
+        ## Poll for new summaries on a background thread
+
+        `callback` is called with the analyzer and the new events.
+        Call `stop()` on the returned poller to stop.
+        """
+        poller = Poller(self, interval, callback)
+        poller.start()
+        return poller
+
+    def tensor(self, name=None) -> Union[List[str], TensorSeries]:
+        """
+        ## Get a tensor summary
+
+        If 'name' is 'None' it returns a list of all available tensors.
+        """
+        if name is None:
+            return list(self.events.tensors.keys())
+
+        return self.events.tensors[name]
+
+    def scalar(self, name=None) -> Union[List[str], ScalarSeries]:
+        """
+        ## Get a scalar summary
+
+        If 'name' is 'None' it returns a list of all available scalars.
+        """
+        if name is None:
+            return list(self.events.scalars.keys())
+
+        return self.events.scalars[name]
+
+    def histogram(self, name=None) -> Union[List[str], HistogramSeries]:
+        """
+        ## Get a histogram summary
+
+        If 'name' is 'None' it returns a list of all available histograms.
+        """
+        if name is None:
+            return list(self.events.histograms.keys())
+
+        return self.events.histograms[name]
+
+    @staticmethod
+    def summarize(steps: np.ndarray, values: np.ndarray):
+        """
+        ## Merge many data points and get a distribution
+        """
+
+        step = np.mean(steps)
+        basis_points = np.percentile(values, _PERCENTILES)
+
+        return np.concatenate(([step], basis_points))
+
+    @staticmethod
+    def summarize_series(series: Union[ScalarSeries, Tuple[np.ndarray, np.ndarray]],
+                         buckets: int = 100):
+        """
+        ### Shrink data points and produce a histogram
+
+        `series` is a `ScalarSeries` or a pair of `steps` and `values` arrays.
+        Consecutive points are grouped into equal sized groups
+        and all the groups are summarized with a single `np.percentile` call.
+        """
+
+        if isinstance(series, ScalarSeries):
+            steps, values = series.step, series.value
+        else:
+            steps, values = series
+
+        # Shrink to `buckets` histograms
+        interval = max(1, len(values) // buckets)
+        full = len(values) // interval * interval
+
+        results = np.empty((len(values) // interval, 1 + len(_PERCENTILES)))
+        results[:, 0] = steps[:full].reshape(-1, interval).mean(axis=1)
+        results[:, 1:] = np.percentile(values[:full].reshape(-1, interval),
+                                       _PERCENTILES, axis=1).T
+
+        if full < len(values):
+            tail = Analyzer.summarize(steps[full:], values[full:])
+            results = np.concatenate((results, tail[None, :]))
+
+        return results
+
+    @staticmethod
+    def summarize_compressed_histogram(series: HistogramSeries):
+        """
+        ## Convert a TensorBoard histogram to our format
+        """
+        results = np.empty((len(series), 1 + len(_BASIS_POINTS)))
+        results[:, 0] = series.step
+        results[:, 1:] = _compress_histograms(series.bucket_limit, series.bucket, series.offsets,
+                                              series.min, series.max, series.num)
+
+        return results
+
+    @staticmethod
+    def aggregate_scalars(runs: List['Analyzer'], name: str, *,
+                          steps: Optional[np.ndarray] = None,
+                          n_steps: Optional[int] = None,
+                          percentiles=DEFAULT_PERCENTILES,
+                          chunk_size: int = 1 << 16) -> RunsSummary:
+        """
+        ## Aggregate a scalar across runs
+
+        The scalar `name` of each analyzer is resampled onto a common step grid,
+        and the mean, standard error and percentiles across runs are computed.
+        Runs can have different lengths and steps.
+        See `lab.tb.aggregate.aggregate_runs`.
+
+        ```python
+        summary = Analyzer.aggregate_scalars(seeds, 'loss')
+        Analyzer.render_density(ax, summary.density(), color, 'loss')
+        ```
+        """
+        return aggregate_runs([r.scalar(name) for r in runs],
+                              steps=steps,
+                              n_steps=n_steps,
+                              percentiles=percentiles,
+                              chunk_size=chunk_size)
+
+    @staticmethod
+    def render_density(ax: Axes, data, color, name, *,
+                       levels=5,
+                       line_width=1,
+                       alpha=0.6):
+        """
+        ## Render a density plot from data
+
+        Rows are reduced to the pixel width of the axes;
+        the median line with LTTB and the bands to min/max envelopes.
+        The plot is refined when the x-limits change.
+        """
+
+        def compute(x_range: Optional[Tuple[float, float]], width: int):
+            if x_range is not None:
+                data_range = data[downsample.visible_range(data[:, 0], *x_range)]
+            else:
+                data_range = data
+            idx = downsample.lttb(data_range[:, 0], data_range[:, 5], width)
+            return (data_range[idx, 0], data_range[idx, 5],
+                    downsample.reduce_density(data_range, width))
+
+        plot = _DensityPlot(ax, compute, color, name,
+                            x_bounds=(data[0, 0], data[-1, 0]) if len(data) else None,
+                            levels=levels,
+                            line_width=line_width,
+                            alpha=alpha)
+
+        return plot.line
+
+    def render_scalar(self, name, ax: Axes, color, *, levels=5, line_width=1, alpha=0.6):
+        """
+        ## Summarize and render a scalar
+
+        Points are summarized into about one distribution per pixel,
+        and the line is the LTTB downsampled series.
+        The plot is refined when the x-limits change.
+        """
+        series = self.scalar(name)
+        steps, values = series.step, series.value
+
+        def compute(x_range: Optional[Tuple[float, float]], width: int):
+            if x_range is not None:
+                visible = downsample.visible_range(steps, *x_range)
+            else:
+                visible = slice(None)
+            s, v = steps[visible], values[visible]
+            idx = downsample.lttb(s, v, width)
+            return s[idx], v[idx], self.summarize_series((s, v), buckets=width)
+
+        plot = _DensityPlot(ax, compute, color, name,
+                            x_bounds=(steps[0], steps[-1]) if len(steps) else None,
+                            levels=levels,
+                            line_width=line_width,
+                            alpha=alpha)
+
+        return plot.line
+
+    def render_histogram(self, name, ax: Axes, color, *, levels=5, line_width=1, alpha=0.6):
+        """
+        ## Summarize and render a histogram
+        """
+        data = self.summarize_compressed_histogram(self.histogram(name))
+        return self.render_density(ax, data, color, name,
+                                   levels=levels,
+                                   line_width=line_width,
+                                   alpha=alpha)
+
+    @staticmethod
+    def render_matrix(matrix, ax, color):
+        from matplotlib.collections import PolyCollection
+        from matplotlib.colors import to_rgba
+
+        x_ticks, y_ticks, densities = _matrix_densities(matrix)
+        max_density = np.max(densities)
+        # alpha = np.log(density) / np.log(max_density)
+        alphas = np.minimum(np.maximum(densities, 1) / max_density, 1)
+
+        # Corners of the boxes, row by row
+        x0, y0 = np.meshgrid(x_ticks[:-1], y_ticks[:-1])
+        x1, y1 = np.meshgrid(x_ticks[1:], y_ticks[1:])
+        boxes = np.stack([np.stack([x0, y0], -1),
+                          np.stack([x1, y0], -1),
+                          np.stack([x1, y1], -1),
+                          np.stack([x0, y1], -1)], axis=-2).reshape(-1, 4, 2)
+
+        colors = np.tile(to_rgba(color), (len(boxes), 1))
+        colors[:, 3] = alphas.reshape(-1)
+
+        pc = PolyCollection(boxes, facecolors=colors, edgecolors='none')
+
+        ax.add_collection(pc)
+
+        # Plot something
+        _ = ax.errorbar([], [], xerr=[], yerr=[],
+                        fmt='None', ecolor='k')
+
+        return x_ticks[0], x_ticks[-1], y_ticks[0], y_ticks[-1]
+
+    @staticmethod
+    def render_matrices(matrices: np.ndarray, axes: List[Axes], color):
+        """
+        ## Render 2D histograms as rasters
+
+        `matrices` has shape `[n, rows, cols]` with the bin edges in the first
+        row and column, like `render_matrix`.
+        Densities of all the matrices are computed at once and each is drawn
+        with a single `pcolormesh` on its (non-uniform) bin edges.
+
+        Returns the x and y limits covering all the matrices.
+        """
+        from matplotlib.colors import LinearSegmentedColormap, to_rgba
+
+        x_edges, y_edges, densities = _matrix_densities(matrices)
+        max_densities = np.max(densities, axis=(-2, -1), keepdims=True)
+        alphas = np.minimum(np.maximum(densities, 1) / max_densities, 1)
+
+        rgb = to_rgba(color)[:3]
+        cmap = LinearSegmentedColormap.from_list('density', [rgb + (0.,), rgb + (1.,)])
+
+        for ax, xe, ye, a in zip(axes, x_edges, y_edges, alphas):
+            ax.pcolormesh(xe, ye, a, cmap=cmap, vmin=0., vmax=1., shading='flat')
+
+        return (min(0, np.min(x_edges[:, 0])), max(0, np.max(x_edges[:, -1])),
+                min(0, np.min(y_edges[:, 0])), max(0, np.max(y_edges[:, -1])))
+
+    def render_tensors(self, tensors: Union[str, TensorSeries], axes: np.ndarray, color):
+        if type(tensors) == str:
+            tensors = self.tensor(tensors)
+        assert len(axes.shape) == 2
+        assert axes.shape[0] * axes.shape[1] == len(tensors)
+
+        shapes = {tuple(tensors.value(i).shape) for i in range(len(tensors))}
+        if len(shapes) == 1:
+            shape = shapes.pop()
+            offsets = tensors.offsets
+            matrices = tensors.data[offsets[0]:offsets[-1]].reshape((len(tensors),) + shape)
+            x_min, x_max, y_min, y_max = self.render_matrices(matrices,
+                                                              list(axes.reshape(-1)),
+                                                              color)
+        else:
+            limits = np.array([self.render_matrix(tensors.value(i), ax, color)
+                               for i, ax in enumerate(axes.reshape(-1))])
+            x_min = min(0, np.min(limits[:, 0]))
+            x_max = max(0, np.max(limits[:, 1]))
+            y_min = min(0, np.min(limits[:, 2]))
+            y_max = max(0, np.max(limits[:, 3]))
+
+        for ax, step in zip(axes.reshape(-1), tensors.step):
+            ax.set_title(f"{step :,}")
+            ax.set_xlim(x_min, x_max)
+            ax.set_ylim(y_min, y_max)
+
+
+class Poller:
+    """
+    ## Calls `Analyzer.update` on a timer
+    """
+
+    def __init__(self, analyzer: Analyzer, interval: float,
+                 callback: Callable[[Analyzer, Events], None]):
+        self.analyzer = analyzer
+        self.interval = interval
+        self.callback = callback
+        self.__stop = threading.Event()
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+
+    def start(self):
+        self.__thread.start()
+
+    def stop(self):
+        self.__stop.set()
+        self.__thread.join()
+
+    def __run(self):
+        while not self.__stop.wait(self.interval):
+            events = self.analyzer.update()
+            if not events.is_empty:
+                self.callback(self.analyzer, events)
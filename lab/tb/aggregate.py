@@ -0,0 +1,131 @@
+"""
+# Aggregate a scalar over many runs
+
+Runs (seeds, trials or experiments) are resampled onto a common step grid
+by linear interpolation, and statistics across runs are computed
+for all grid steps at once.
+The grid is processed in chunks so that memory stays bounded
+with many long runs.
+"""
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from lab.tb.event_file import ScalarSeries
+
+DEFAULT_PERCENTILES = (0, 6.68, 15.87, 30.85, 50.00, 69.15, 84.13, 93.32, 100.00)
+
+
+class RunsSummary:
+    """
+    ## Statistics of runs on a step grid
+
+    `count` is the number of runs that cover each step;
+    steps outside a run's first and last steps don't count that run.
+    `percentiles` has a row for each of `percentile_levels`.
+    """
+
+    def __init__(self, steps: np.ndarray, count: np.ndarray, mean: np.ndarray,
+                 sem: np.ndarray, percentile_levels: Sequence[float], percentiles: np.ndarray):
+        self.steps = steps
+        self.count = count
+        self.mean = mean
+        self.sem = sem
+        self.percentile_levels = percentile_levels
+        self.percentiles = percentiles
+
+    def density(self) -> np.ndarray:
+        """
+        ### Steps and percentiles in the format of `Analyzer.render_density`
+        """
+        return np.concatenate((self.steps[:, None], self.percentiles.T), axis=1)
+
+
+def _sorted(run: ScalarSeries):
+    steps, values = run.step, run.value
+    if len(steps) > 1 and np.any(steps[1:] < steps[:-1]):
+        order = np.argsort(steps, kind='stable')
+        steps, values = steps[order], values[order]
+
+    return steps.astype(np.float64), values.astype(np.float64)
+
+
+def _percentiles(values: np.ndarray, count: np.ndarray, levels: np.ndarray):
+    """
+    ### Percentiles along the first axis, ignoring `NaN`s
+
+    This is linear interpolation like `np.percentile`, but vectorized over
+    columns with different numbers of valid values,
+    which `np.nanpercentile` handles one column at a time.
+    """
+    # `NaN`s are sorted to the end
+    values = np.sort(values, axis=0)
+    rank = levels[:, None] / 100 * np.maximum(count - 1, 0)[None, :]
+    lower = np.floor(rank).astype(np.int64)
+    upper = np.minimum(lower + 1, np.maximum(count - 1, 0)[None, :])
+    fraction = rank - lower
+    columns = np.arange(values.shape[1])[None, :]
+    result = (values[lower, columns] * (1 - fraction) +
+              values[upper, columns] * fraction)
+    result[:, count == 0] = np.nan
+
+    return result
+
+
+def aggregate_runs(runs: List[ScalarSeries], *,
+                   steps: Optional[np.ndarray] = None,
+                   n_steps: Optional[int] = None,
+                   percentiles: Sequence[float] = DEFAULT_PERCENTILES,
+                   chunk_size: int = 1 << 16) -> RunsSummary:
+    """
+    ## Aggregate runs of a scalar
+
+    If `steps` is not given, the grid has `n_steps` evenly spaced steps
+    (by default the length of the longest run) from the first step of any run
+    to the last step of any run.
+    Runs are resampled `chunk_size` grid steps at a time.
+    """
+    runs = [_sorted(r) for r in runs if len(r) > 0]
+    levels = np.asarray(percentiles, dtype=np.float64)
+
+    if steps is None:
+        if not runs:
+            steps = np.zeros(0)
+        else:
+            if n_steps is None:
+                n_steps = max(len(s) for s, _ in runs)
+            steps = np.linspace(min(s[0] for s, _ in runs),
+                                max(s[-1] for s, _ in runs),
+                                n_steps)
+    steps = np.asarray(steps, dtype=np.float64)
+
+    n = len(steps)
+    count = np.zeros(n, dtype=np.int64)
+    mean = np.full(n, np.nan)
+    sem = np.full(n, np.nan)
+    result_percentiles = np.full((len(levels), n), np.nan)
+
+    for start in range(0, n, chunk_size):
+        end = min(start + chunk_size, n)
+        grid = steps[start:end]
+
+        values = np.empty((len(runs), len(grid)))
+        for i, (s, v) in enumerate(runs):
+            values[i] = np.interp(grid, s, v, left=np.nan, right=np.nan)
+
+        is_valid = ~np.isnan(values)
+        c = is_valid.sum(axis=0)
+        total = np.where(is_valid, values, 0.).sum(axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            m = total / c
+            deviations = np.where(is_valid, values - m[None, :], 0.)
+            variance = (deviations ** 2).sum(axis=0) / (c - 1)
+            sem[start:end] = np.sqrt(variance / c)
+
+        count[start:end] = c
+        mean[start:end] = m
+        result_percentiles[:, start:end] = _percentiles(values, c, levels)
+
+    sem[count < 2] = np.nan
+
+    return RunsSummary(steps, count, mean, sem, tuple(levels), result_percentiles)
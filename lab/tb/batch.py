@@ -0,0 +1,57 @@
+"""
+# Load many experiments in parallel
+
+Event files of all the experiments are decoded on a process pool.
+Workers send back the flat column arrays of each file,
+which are pickled as raw buffers, instead of per-event objects.
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Optional, Dict, Tuple
+
+import numpy as np
+
+from lab import logger
+from lab.lab import Lab
+from lab.tb import Analyzer
+from lab.tb.event_file import Events, event_files, decode_event_file, DecodedFile
+
+
+def _decode(path: str, tags: Optional[List[str]]) -> Tuple[Dict[str, np.ndarray], int, Dict[bytes, bytes]]:
+    events, offset, plugins = decode_event_file(Path(path), tags)
+    return events.to_arrays(), offset, plugins
+
+
+def load_experiments(lab: Lab, experiments: List[str], *,
+                     tags: Optional[List[str]] = None,
+                     is_cache: bool = True,
+                     processes: Optional[int] = None) -> Dict[str, Analyzer]:
+    """
+    ## Create and load analyzers of many experiments
+
+    Event files that are not cached are decoded on a pool of `processes`
+    worker processes; by default one per CPU.
+    Progress is shown with `logger.iterator`.
+    """
+    analyzers = {name: Analyzer(lab, name, tags=tags, is_cache=is_cache)
+                 for name in experiments}
+
+    pending: List[Path] = []
+    for analyzer in analyzers.values():
+        for path in event_files(Path(analyzer.info.summary_path)):
+            if analyzer.cache is None or not analyzer.cache.is_valid(path, analyzer.tags):
+                pending.append(path)
+
+    decoded: Dict[Path, DecodedFile] = {}
+    if pending:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = {executor.submit(_decode, str(p), tags): p for p in pending}
+            for f in logger.iterator("Decoding event files", as_completed(futures),
+                                     total_steps=len(futures)):
+                arrays, offset, plugins = f.result()
+                decoded[futures[f]] = (Events.from_arrays(arrays), offset, plugins)
+
+    for analyzer in logger.iterator("Loading experiments", list(analyzers.values())):
+        analyzer.load(decoded=decoded)
+
+    return analyzers
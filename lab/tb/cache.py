@@ -0,0 +1,138 @@
+"""
+# Cache of decoded event files
+
+Decoded series of each event file are saved as `.npy` files,
+in a directory per event file.
+An entry is used only if the size and modification time of the
+event file haven't changed since it was decoded.
+Arrays are loaded with `mmap`, so opening a cached experiment
+doesn't read the summaries into memory.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Optional, Set, Dict, Tuple, List, Iterable
+
+import numpy as np
+
+from lab import util
+from lab.tb.event_file import Events
+
+_META_FILE = 'meta.json'
+
+
+def _file_stat(path: Path) -> Tuple[int, int]:
+    stat = os.stat(str(path))
+    return stat.st_size, stat.st_mtime_ns
+
+
+class SummaryCache:
+    """
+    ## Cache of decoded event files
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def _entry_path(self, event_file: Path) -> Path:
+        key = hashlib.sha1(str(event_file.resolve()).encode('utf-8')).hexdigest()
+        return self.path / key
+
+    def _valid_meta(self, event_file: Path, tags: Optional[Set[str]]) -> Optional[Dict[str, any]]:
+        try:
+            with open(str(self._entry_path(event_file) / _META_FILE), 'r') as f:
+                meta = json.load(f)
+            size, mtime = _file_stat(event_file)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        if meta['size'] != size or meta['mtime'] != mtime:
+            return None
+
+        if meta['tags'] is not None:
+            if tags is None or not tags.issubset(meta['tags']):
+                return None
+
+        return meta
+
+    def is_valid(self, event_file: Path, tags: Optional[Iterable[str]]) -> bool:
+        """
+        ### Whether there is a valid entry for an event file
+
+        Only `meta.json` is read.
+        """
+        return self._valid_meta(event_file, None if tags is None else set(tags)) is not None
+
+    def load(self, event_file: Path,
+             tags: Optional[Iterable[str]]) -> Optional[Tuple[Events, int, Dict[bytes, bytes]]]:
+        """
+        ### Load the events of an event file
+
+        Returns the events, the number of bytes of the event file they cover,
+        and the plugin names of tags; or `None` if there is no valid entry.
+        """
+        tags = None if tags is None else set(tags)
+        meta = self._valid_meta(event_file, tags)
+        if meta is None:
+            return None
+
+        entry = self._entry_path(event_file)
+        arrays = {}
+        for i, key in enumerate(meta['arrays']):
+            kind, rest = key.split('/', 1)
+            tag = rest.rsplit('/', 1)[0]
+            if tags is not None and tag not in tags:
+                continue
+            arrays[key] = np.load(str(entry / f"{i}.npy"), mmap_mode='r')
+
+        plugins = {k.encode('utf-8'): v.encode('utf-8') for k, v in meta['plugins'].items()}
+
+        return Events.from_arrays(arrays), meta['offset'], plugins
+
+    def save(self, event_file: Path, tags: Optional[Set[str]],
+             events: Events, offset: int, plugins: Dict[bytes, bytes]):
+        """
+        ### Save the events decoded from the first `offset` bytes of an event file
+        """
+        size, mtime = _file_stat(event_file)
+        # Only cache if the whole file was decoded
+        if offset != size:
+            return
+
+        entry = self._entry_path(event_file)
+        tmp = entry.parent / f"{entry.name}.{os.getpid()}.tmp"
+        if tmp.exists():
+            util.rm_tree(tmp)
+        tmp.mkdir(parents=True)
+
+        arrays = events.to_arrays()
+        for i, a in enumerate(arrays.values()):
+            np.save(str(tmp / f"{i}.npy"), a)
+
+        meta = dict(source=str(event_file.resolve()),
+                    size=size,
+                    mtime=mtime,
+                    offset=offset,
+                    tags=None if tags is None else sorted(tags),
+                    arrays=list(arrays.keys()),
+                    plugins={k.decode('utf-8'): v.decode('utf-8')
+                             for k, v in plugins.items() if v is not None})
+        with open(str(tmp / _META_FILE), 'w') as f:
+            json.dump(meta, f)
+
+        if entry.exists():
+            util.rm_tree(entry)
+        tmp.rename(entry)
+
+    def prune(self, event_files: List[Path]):
+        """
+        ### Remove entries of event files that no longer exist
+        """
+        if not self.path.exists():
+            return
+
+        keep = {self._entry_path(p).name for p in event_files}
+        for entry in self.path.iterdir():
+            if entry.name not in keep and entry.suffix != '.tmp':
+                util.rm_tree(entry)
@@ -0,0 +1,116 @@
+"""
+# Downsampling for rendering
+
+Series with more points than the axes have pixels are reduced before plotting.
+Lines are downsampled with Largest-Triangle-Three-Buckets (LTTB),
+which keeps the points that shape the line, including spikes,
+and bands are reduced to their min/max envelopes over the same buckets.
+"""
+from typing import Tuple
+
+import numpy as np
+from matplotlib.axes import Axes
+
+
+def pixel_width(ax: Axes) -> int:
+    """
+    ## Width of the axes in pixels
+    """
+    return max(int(ax.get_window_extent().width), 2)
+
+
+def visible_range(x: np.ndarray, x_min: float, x_max: float) -> slice:
+    """
+    ## Points of sorted `x` within `[x_min, x_max]`, and one more on either side
+    """
+    start = max(np.searchsorted(x, x_min, side='left') - 1, 0)
+    end = min(np.searchsorted(x, x_max, side='right') + 1, len(x))
+    return slice(start, end)
+
+
+def bucket_starts(n: int, buckets: int) -> np.ndarray:
+    """
+    ## Start indexes of `buckets` buckets of nearly equal size over `n` points
+    """
+    return np.linspace(0, n, buckets + 1).astype(np.int64)[:-1]
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    ## Indexes of points selected by Largest-Triangle-Three-Buckets
+
+    The first and last points are always kept, and from each of the
+    `n_out - 2` buckets in between the point forming the largest triangle
+    with the point selected from the previous bucket and the
+    average of the next bucket.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # Buckets over the points between the first and the last
+    edges = 1 + np.linspace(0, n - 2, n_out - 1).astype(np.int64)
+    sums_x = np.add.reduceat(x[1:-1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:-1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    mean_x = np.append(sums_x / counts, x[-1])
+    mean_y = np.append(sums_y / counts, y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for b in range(n_out - 2):
+        start, end = edges[b], edges[b + 1]
+        cx, cy = mean_x[b + 1], mean_y[b + 1]
+        ax, ay = x[a], y[a]
+        # Twice the triangle areas
+        areas = np.abs((ax - cx) * (y[start:end] - ay) -
+                       (ax - x[start:end]) * (cy - ay))
+        a = start + int(np.argmax(areas))
+        selected[b + 1] = a
+
+    return selected
+
+
+def envelope(x: np.ndarray, y: np.ndarray, buckets: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    ## Mean `x` and min, max `y` of each bucket
+    """
+    n = len(x)
+    if buckets >= n:
+        return x, y, y
+
+    starts = bucket_starts(n, buckets)
+    counts = np.diff(np.append(starts, n))
+    return (np.add.reduceat(x, starts) / counts,
+            np.minimum.reduceat(y, starts),
+            np.maximum.reduceat(y, starts))
+
+
+def reduce_density(data: np.ndarray, buckets: int) -> np.ndarray:
+    """
+    ## Reduce rows of density data to `buckets` rows
+
+    `data` has the step in the first column followed by percentiles
+    in ascending order.
+    Lower percentiles are reduced to their minimum and
+    higher percentiles to their maximum in each bucket,
+    so that bands never hide values.
+    The median is reduced to its mean.
+    """
+    n = len(data)
+    if buckets >= n:
+        return data
+
+    starts = bucket_starts(n, buckets)
+    counts = np.diff(np.append(starts, n))
+    mid = data.shape[1] // 2
+
+    reduced = np.empty((len(starts), data.shape[1]))
+    reduced[:, 0] = np.add.reduceat(data[:, 0], starts) / counts
+    reduced[:, 1:mid] = np.minimum.reduceat(data[:, 1:mid], starts, axis=0)
+    reduced[:, mid] = np.add.reduceat(data[:, mid], starts) / counts
+    reduced[:, mid + 1:] = np.maximum.reduceat(data[:, mid + 1:], starts, axis=0)
+
+    return reduced
@@ -0,0 +1,921 @@
+"""
+# TensorBoard event file reader
+
+This reads TensorBoard event files without TensorFlow or TensorBoard.
+It parses the TFRecord framing and the `Event`, `Summary`,
+`HistogramProto` and `TensorProto` protobufs directly
+and collects the values into columnar NumPy arrays.
+
+Unlike `EventAccumulator` nothing is reservoir sampled;
+every event in the files is kept.
+"""
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Dict, List, Optional, Iterable, Tuple, Set
+
+import numpy as np
+
+_U64 = struct.Struct('<Q')
+_F32 = struct.Struct('<f')
+_F64 = struct.Struct('<d')
+
+# TFRecord framing: `uint64 length`, `uint32 masked_crc(length)`,
+# `bytes data`, `uint32 masked_crc(data)`
+_HEADER_SIZE = 12
+_FOOTER_SIZE = 4
+
+# `tensorflow.DataType` to NumPy
+_DTYPES = {
+    1: np.dtype('<f4'),
+    2: np.dtype('<f8'),
+    3: np.dtype('<i4'),
+    4: np.dtype('u1'),
+    5: np.dtype('<i2'),
+    6: np.dtype('i1'),
+    9: np.dtype('<i8'),
+    10: np.dtype('?'),
+    14: np.dtype('<u2'),  # bfloat16, converted to float32
+    17: np.dtype('<u2'),
+    19: np.dtype('<f2'),
+    22: np.dtype('<u4'),
+    23: np.dtype('<u8'),
+}
+_DT_BFLOAT16 = 14
+_DT_HALF = 19
+
+_SCALARS_PLUGIN = b'scalars'
+_HISTOGRAMS_PLUGIN = b'histograms'
+
+
+def _varint(buf, pos: int):
+    b = buf[pos]
+    pos += 1
+    if b < 0x80:
+        return b, pos
+    result = b & 0x7f
+    shift = 7
+    while True:
+        b = buf[pos]
+        pos += 1
+        result |= (b & 0x7f) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _signed(value: int):
+    if value >= 1 << 63:
+        return value - (1 << 64)
+    return value
+
+
+def _skip(buf, pos: int, wire: int):
+    if wire == 0:
+        _, pos = _varint(buf, pos)
+        return pos
+    elif wire == 1:
+        return pos + 8
+    elif wire == 2:
+        n, pos = _varint(buf, pos)
+        return pos + n
+    elif wire == 5:
+        return pos + 4
+    else:
+        raise ValueError(f"Unsupported protobuf wire type {wire}")
+
+
+def _packed_varints(buf, pos: int, end: int, is_signed: bool = True):
+    values = []
+    while pos < end:
+        v, pos = _varint(buf, pos)
+        values.append(_signed(v) if is_signed else v)
+    return values
+
+
+def _varints(buf, wire: int, pos: int, end: int, is_signed: bool = True):
+    """
+    ### Values of a repeated varint field, packed or not
+    """
+    if wire == 2:
+        return _packed_varints(buf, pos, end, is_signed)
+
+    v, _ = _varint(buf, pos)
+    return [_signed(v) if is_signed else v]
+
+
+def _fields(buf, pos: int, end: int):
+    """
+    ### Iterate `(field, wire, start, end)` of a message
+    """
+    while pos < end:
+        key, pos = _varint(buf, pos)
+        wire = key & 7
+        if wire == 2:
+            n, pos = _varint(buf, pos)
+            yield key >> 3, wire, pos, pos + n
+            pos += n
+        else:
+            start = pos
+            pos = _skip(buf, pos, wire)
+            yield key >> 3, wire, start, pos
+
+
+class _Column:
+    """
+    ## Growable array
+
+    Appending reallocates with doubled capacity, so extending a series
+    costs time proportional to the new values only.
+    Arrays handed out earlier stay valid.
+    """
+
+    def __init__(self, array: np.ndarray):
+        self._array = array
+        self._size = len(array)
+
+    @property
+    def array(self) -> np.ndarray:
+        return self._array[:self._size]
+
+    def extend(self, values: np.ndarray):
+        size = self._size + len(values)
+        if size > len(self._array) or not self._array.flags.writeable:
+            capacity = max(size, 2 * len(self._array), 16)
+            dtype = np.result_type(self._array, values)
+            array = np.empty((capacity,) + self._array.shape[1:], dtype=dtype)
+            array[:self._size] = self._array[:self._size]
+            self._array = array
+        elif np.result_type(self._array, values) != self._array.dtype:
+            self._array = self._array.astype(np.result_type(self._array, values))
+
+        self._array[self._size:size] = values
+        self._size = size
+
+
+class _Series:
+    """
+    ## Columns of a series
+
+    `_OFFSETS` are columns of indexes into other columns,
+    which are shifted when series are appended.
+    """
+
+    _OFFSETS: Tuple[str, ...] = ()
+
+    def __init__(self, **arrays: np.ndarray):
+        self._columns = {k: _Column(v) for k, v in arrays.items()}
+
+    def _column(self, name: str) -> np.ndarray:
+        return self._columns[name].array
+
+    @property
+    def step(self) -> np.ndarray:
+        return self._column('step')
+
+    @property
+    def wall_time(self) -> np.ndarray:
+        return self._column('wall_time')
+
+    def __len__(self):
+        return len(self._column('step'))
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {k: c.array for k, c in self._columns.items()}
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]):
+        return cls(**arrays)
+
+    def extend(self, other: '_Series'):
+        """
+        ### Append the events of `other`
+        """
+        for k, c in self._columns.items():
+            values = other._column(k)
+            if k in self._OFFSETS:
+                values = values[1:] + c.array[-1]
+            c.extend(values)
+
+    @classmethod
+    def concat(cls, series: List['_Series']):
+        merged = cls.from_arrays(series[0].to_arrays())
+        for s in series[1:]:
+            merged.extend(s)
+
+        return merged
+
+
+class ScalarSeries(_Series):
+    """
+    ## Scalar summaries of a tag
+
+    `step`, `wall_time` and `value` are arrays of the same length.
+    """
+
+    def __init__(self, step: np.ndarray, wall_time: np.ndarray, value: np.ndarray):
+        super().__init__(step=step, wall_time=wall_time, value=value)
+
+    @property
+    def value(self) -> np.ndarray:
+        return self._column('value')
+
+    def __getitem__(self, item: slice):
+        return ScalarSeries(self.step[item], self.wall_time[item], self.value[item])
+
+
+class HistogramSeries(_Series):
+    """
+    ## Histogram summaries of a tag
+
+    Buckets of all events are concatenated into `bucket_limit` and `bucket`;
+    the buckets of event `i` are in `offsets[i]:offsets[i + 1]`.
+    """
+
+    _OFFSETS = ('offsets',)
+
+    def __init__(self, step: np.ndarray, wall_time: np.ndarray, stats: np.ndarray,
+                 bucket_limit: np.ndarray, bucket: np.ndarray, offsets: np.ndarray):
+        # Columns of `stats` are `min`, `max`, `num`, `sum`, `sum_squares`
+        super().__init__(step=step, wall_time=wall_time, stats=stats,
+                         bucket_limit=bucket_limit, bucket=bucket, offsets=offsets)
+
+    @property
+    def stats(self) -> np.ndarray:
+        return self._column('stats')
+
+    @property
+    def bucket_limit(self) -> np.ndarray:
+        return self._column('bucket_limit')
+
+    @property
+    def bucket(self) -> np.ndarray:
+        return self._column('bucket')
+
+    @property
+    def offsets(self) -> np.ndarray:
+        return self._column('offsets')
+
+    @property
+    def min(self):
+        return self.stats[:, 0]
+
+    @property
+    def max(self):
+        return self.stats[:, 1]
+
+    @property
+    def num(self):
+        return self.stats[:, 2]
+
+    def buckets(self, i: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        ### Bucket limits and counts of event `i`
+        """
+        offsets = self.offsets
+        start, end = offsets[i], offsets[i + 1]
+        return self.bucket_limit[start:end], self.bucket[start:end]
+
+
+class TensorEvent:
+    def __init__(self, step: int, wall_time: float, value: np.ndarray):
+        self.step = step
+        self.wall_time = wall_time
+        self.value = value
+
+
+class TensorSeries(_Series):
+    """
+    ## Tensor summaries of a tag
+
+    Tensor values are flattened and concatenated into `data`;
+    tensor `i` is `data[offsets[i]:offsets[i + 1]]` and its shape is
+    `dims[dim_offsets[i]:dim_offsets[i + 1]]`.
+    """
+
+    _OFFSETS = ('offsets', 'dim_offsets')
+
+    def __init__(self, step: np.ndarray, wall_time: np.ndarray,
+                 data: np.ndarray, offsets: np.ndarray,
+                 dims: np.ndarray, dim_offsets: np.ndarray):
+        super().__init__(step=step, wall_time=wall_time, data=data,
+                         offsets=offsets, dims=dims, dim_offsets=dim_offsets)
+
+    @property
+    def data(self) -> np.ndarray:
+        return self._column('data')
+
+    @property
+    def offsets(self) -> np.ndarray:
+        return self._column('offsets')
+
+    @property
+    def dims(self) -> np.ndarray:
+        return self._column('dims')
+
+    @property
+    def dim_offsets(self) -> np.ndarray:
+        return self._column('dim_offsets')
+
+    def value(self, i: int) -> np.ndarray:
+        dim_offsets = self.dim_offsets
+        offsets = self.offsets
+        shape = self.dims[dim_offsets[i]:dim_offsets[i + 1]]
+        return self.data[offsets[i]:offsets[i + 1]].reshape(shape)
+
+    def __getitem__(self, i: int) -> TensorEvent:
+        return TensorEvent(int(self.step[i]), float(self.wall_time[i]), self.value(i))
+
+
+_SERIES = [('scalars', ScalarSeries),
+           ('histograms', HistogramSeries),
+           ('tensors', TensorSeries)]
+
+
+class Events:
+    """
+    ## Series of all the tags read from event files
+    """
+
+    def __init__(self):
+        self.scalars: Dict[str, ScalarSeries] = {}
+        self.histograms: Dict[str, HistogramSeries] = {}
+        self.tensors: Dict[str, TensorSeries] = {}
+
+    @property
+    def is_empty(self):
+        return not (self.scalars or self.histograms or self.tensors)
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """
+        ### Flatten into a dictionary of arrays
+
+        Keys are `<kind>/<tag>/<column>`.
+        """
+        arrays = {}
+        for kind, _ in _SERIES:
+            for tag, s in getattr(self, kind).items():
+                for column, a in s.to_arrays().items():
+                    arrays[f"{kind}/{tag}/{column}"] = a
+
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]):
+        columns: Dict[Tuple[str, str], Dict[str, np.ndarray]] = {}
+        for key, a in arrays.items():
+            kind, rest = key.split('/', 1)
+            tag, column = rest.rsplit('/', 1)
+            columns.setdefault((kind, tag), {})[column] = a
+
+        events = cls()
+        for kind, series_cls in _SERIES:
+            series = getattr(events, kind)
+            for (k, tag), c in columns.items():
+                if k == kind:
+                    series[tag] = series_cls.from_arrays(c)
+
+        return events
+
+    def extend(self, other: 'Events'):
+        """
+        ### Append the events of `other`
+        """
+        for kind, _ in _SERIES:
+            series = getattr(self, kind)
+            for tag, s in getattr(other, kind).items():
+                if tag in series:
+                    series[tag].extend(s)
+                else:
+                    series[tag] = s
+
+    @classmethod
+    def concat(cls, events: List['Events']):
+        merged = cls()
+        for e in events:
+            merged.extend(e)
+
+        return merged
+
+
+class _Decoder:
+    """
+    ## Decodes events into per-tag columns
+    """
+
+    def __init__(self, tags: Optional[Set[str]], plugins: Optional[Dict[bytes, bytes]] = None):
+        if tags is None:
+            self._tags = None
+        else:
+            self._tags = {t.encode('utf-8') for t in tags}
+
+        self._tag_names: Dict[bytes, str] = {}
+        # Plugin metadata is only written with the first event of a tag,
+        # so this is kept across incremental reads
+        self._plugins: Dict[bytes, bytes] = {} if plugins is None else plugins
+
+        # tag -> (step, wall_time, value)
+        self._scalars: Dict[str, Tuple[list, list, list]] = {}
+        # tag -> (step, wall_time, stats, bucket_limit, bucket, counts)
+        self._histograms: Dict[str, Tuple[list, list, list, list, list, list]] = {}
+        # tag -> (step, wall_time, values)
+        self._tensors: Dict[str, Tuple[list, list, list]] = {}
+
+    def decode_event(self, buf, pos: int, end: int):
+        wall_time = 0.
+        step = 0
+        summary = None
+        while pos < end:
+            key = buf[pos]
+            pos += 1
+            if key == 0x09:
+                wall_time, = _F64.unpack_from(buf, pos)
+                pos += 8
+            elif key == 0x10:
+                step, pos = _varint(buf, pos)
+                step = _signed(step)
+            elif key == 0x2a:
+                n, pos = _varint(buf, pos)
+                summary = (pos, pos + n)
+                pos += n
+            else:
+                if key > 0x7f:
+                    key, pos = _varint(buf, pos - 1)
+                pos = _skip(buf, pos, key & 7)
+
+        if summary is None:
+            return
+
+        pos, end = summary
+        while pos < end:
+            key = buf[pos]
+            pos += 1
+            if key == 0x0a:
+                n, pos = _varint(buf, pos)
+                self._decode_value(buf, pos, pos + n, step, wall_time)
+                pos += n
+            else:
+                if key > 0x7f:
+                    key, pos = _varint(buf, pos - 1)
+                pos = _skip(buf, pos, key & 7)
+
+    @property
+    def plugins(self) -> Dict[bytes, bytes]:
+        return self._plugins
+
+    def _tag_name(self, tag: bytes):
+        name = self._tag_names.get(tag, None)
+        if name is None:
+            name = tag.decode('utf-8')
+            self._tag_names[tag] = name
+        return name
+
+    def _decode_value(self, buf, pos: int, end: int, step: int, wall_time: float):
+        tag = None
+        histo = None
+        tensor = None
+        metadata = None
+        while pos < end:
+            key = buf[pos]
+            pos += 1
+            if key == 0x0a:
+                n, pos = _varint(buf, pos)
+                tag = buf[pos:pos + n]
+                pos += n
+                # `tag` is the first field of a serialized value
+                if self._tags is not None and tag not in self._tags:
+                    return
+            elif key == 0x15:
+                value, = _F32.unpack_from(buf, pos)
+                pos += 4
+                if tag is not None:
+                    self._add_scalar(self._tag_name(tag), step, wall_time, value)
+                return
+            elif key == 0x2a:
+                n, pos = _varint(buf, pos)
+                histo = (pos, pos + n)
+                pos += n
+            elif key == 0x42:
+                n, pos = _varint(buf, pos)
+                tensor = (pos, pos + n)
+                pos += n
+            elif key == 0x4a:
+                n, pos = _varint(buf, pos)
+                metadata = (pos, pos + n)
+                pos += n
+            else:
+                if key > 0x7f:
+                    key, pos = _varint(buf, pos - 1)
+                pos = _skip(buf, pos, key & 7)
+
+        if tag is None:
+            return
+        if self._tags is not None and tag not in self._tags:
+            return
+
+        if histo is not None:
+            self._add_histogram(self._tag_name(tag), step, wall_time,
+                                *_decode_histogram(buf, *histo))
+        elif tensor is not None:
+            if metadata is not None:
+                self._plugins[tag] = _decode_plugin_name(buf, *metadata)
+            value = _decode_tensor(buf, *tensor)
+            if value is None:
+                return
+            self.add_tensor_value(self._tag_name(tag), step, wall_time, value,
+                                  self._plugins.get(tag, None))
+
+    def add_tensor_value(self, tag: str, step: int, wall_time: float, value: np.ndarray,
+                         plugin: Optional[bytes]):
+        """
+        ### Add a tensor value as a scalar, a histogram or a tensor, based on its plugin
+        """
+        if plugin == _SCALARS_PLUGIN and value.size == 1:
+            self._add_scalar(tag, step, wall_time, float(value.reshape(-1)[0]))
+        elif plugin == _HISTOGRAMS_PLUGIN and value.ndim == 2 and value.shape[1] == 3:
+            self._add_histogram(tag, step, wall_time, *_tensor_to_histogram(value))
+        else:
+            self._add_tensor(tag, step, wall_time, value)
+
+    def _add_scalar(self, tag: str, step: int, wall_time: float, value: float):
+        columns = self._scalars.get(tag, None)
+        if columns is None:
+            columns = self._scalars[tag] = ([], [], [])
+        columns[0].append(step)
+        columns[1].append(wall_time)
+        columns[2].append(value)
+
+    def _add_histogram(self, tag: str, step: int, wall_time: float,
+                       stats: List[float], limits: np.ndarray, counts: np.ndarray):
+        columns = self._histograms.get(tag, None)
+        if columns is None:
+            columns = self._histograms[tag] = ([], [], [], [], [], [])
+        columns[0].append(step)
+        columns[1].append(wall_time)
+        columns[2].append(stats)
+        columns[3].append(limits)
+        columns[4].append(counts)
+        columns[5].append(len(limits))
+
+    def _add_tensor(self, tag: str, step: int, wall_time: float, value: np.ndarray):
+        columns = self._tensors.get(tag, None)
+        if columns is None:
+            columns = self._tensors[tag] = ([], [], [])
+        columns[0].append(step)
+        columns[1].append(wall_time)
+        columns[2].append(value)
+
+    def events(self) -> Events:
+        """
+        ### Convert the collected columns to arrays
+        """
+        events = Events()
+
+        for tag, (step, wall_time, value) in self._scalars.items():
+            events.scalars[tag] = ScalarSeries(np.array(step, dtype=np.int64),
+                                               np.array(wall_time, dtype=np.float64),
+                                               np.array(value, dtype=np.float64))
+
+        for tag, (step, wall_time, stats, limits, counts, n) in self._histograms.items():
+            offsets = np.zeros(len(n) + 1, dtype=np.int64)
+            np.cumsum(n, out=offsets[1:])
+            events.histograms[tag] = HistogramSeries(
+                np.array(step, dtype=np.int64),
+                np.array(wall_time, dtype=np.float64),
+                np.array(stats, dtype=np.float64).reshape(-1, 5),
+                np.concatenate(limits) if limits else np.zeros(0),
+                np.concatenate(counts) if counts else np.zeros(0),
+                offsets)
+
+        for tag, (step, wall_time, values) in self._tensors.items():
+            offsets = np.zeros(len(values) + 1, dtype=np.int64)
+            np.cumsum([v.size for v in values], out=offsets[1:])
+            dim_offsets = np.zeros(len(values) + 1, dtype=np.int64)
+            np.cumsum([v.ndim for v in values], out=dim_offsets[1:])
+            dims = [d for v in values for d in v.shape]
+            events.tensors[tag] = TensorSeries(
+                np.array(step, dtype=np.int64),
+                np.array(wall_time, dtype=np.float64),
+                np.concatenate([v.reshape(-1) for v in values]),
+                offsets,
+                np.array(dims, dtype=np.int64),
+                dim_offsets)
+
+        return events
+
+
+def _decode_histogram(buf, pos: int, end: int):
+    stats = [0., 0., 0., 0., 0.]
+    limits = []
+    counts = []
+    for field, wire, start, stop in _fields(buf, pos, end):
+        if field <= 5 and wire == 1:
+            stats[field - 1], = _F64.unpack_from(buf, start)
+        elif field == 6:
+            limits.append(buf[start:stop])
+        elif field == 7:
+            counts.append(buf[start:stop])
+
+    limits = np.frombuffer(b''.join(limits), dtype='<f8')
+    counts = np.frombuffer(b''.join(counts), dtype='<f8')
+
+    return stats, limits, counts
+
+
+def _tensor_to_histogram(value: np.ndarray):
+    """
+    ### Convert a `histograms` plugin tensor of `[left, right, count]` rows
+    """
+    value = value.astype(np.float64)
+    counts = value[:, 2]
+    if len(value) == 0:
+        return [0., 0., 0., 0., 0.], np.zeros(0), np.zeros(0)
+
+    centers = (value[:, 0] + value[:, 1]) / 2
+    stats = [float(value[0, 0]), float(value[-1, 1]), float(counts.sum()),
+             float((centers * counts).sum()), float((centers ** 2 * counts).sum())]
+
+    return stats, value[:, 1].copy(), counts.copy()
+
+
+def _decode_plugin_name(buf, pos: int, end: int) -> Optional[bytes]:
+    for field, wire, start, stop in _fields(buf, pos, end):
+        if field == 1 and wire == 2:
+            for f, w, s, e in _fields(buf, start, stop):
+                if f == 1 and w == 2:
+                    return buf[s:e]
+    return None
+
+
+def _decode_tensor(buf, pos: int, end: int) -> Optional[np.ndarray]:
+    dtype_id = 0
+    shape = []
+    content = None
+    values = []
+    half = []
+    for field, wire, start, stop in _fields(buf, pos, end):
+        if field == 1:
+            dtype_id, _ = _varint(buf, start)
+        elif field == 2:
+            for f, w, s, e in _fields(buf, start, stop):
+                if f == 2:
+                    size = 0
+                    for df, dw, ds, de in _fields(buf, s, e):
+                        if df == 1:
+                            size, _ = _varint(buf, ds)
+                            size = _signed(size)
+                    shape.append(size)
+        elif field == 4:
+            content = buf[start:stop]
+        elif field == 5:
+            values.append(np.frombuffer(buf[start:stop], dtype='<f4'))
+        elif field == 6:
+            values.append(np.frombuffer(buf[start:stop], dtype='<f8'))
+        elif field in (7, 10, 11):
+            values.append(np.array(_varints(buf, wire, start, stop)))
+        elif field == 13:
+            # `half_val` has the bits of `float16` and `bfloat16` values
+            half.extend(_varints(buf, wire, start, stop))
+        elif field == 16:
+            values.append(np.array(_varints(buf, wire, start, stop), dtype=np.uint32))
+        elif field == 17:
+            values.append(np.array(_varints(buf, wire, start, stop, False), dtype=np.uint64))
+
+    dtype = _DTYPES.get(dtype_id, None)
+    if dtype is None:
+        return None
+
+    if half:
+        bits = np.asarray(half, np.uint16)
+        values.append(bits.view(np.float16) if dtype_id == _DT_HALF else bits)
+
+    size = int(np.prod(shape, dtype=np.int64))
+    if content is not None:
+        value = np.frombuffer(content, dtype=dtype)
+    elif values:
+        value = np.concatenate(values).astype(dtype)
+        if len(value) == 1 and size != 1:
+            value = np.full(size, value[0], dtype=dtype)
+    else:
+        value = np.zeros(size, dtype=dtype)
+
+    if dtype_id == _DT_BFLOAT16:
+        value = (value.astype(np.uint32) << 16).view(np.float32)
+
+    return value.reshape(shape)
+
+
+def _resolve_tensors(events: Events, plugins: Dict[bytes, bytes]) -> Events:
+    """
+    ### Convert tensors of tags with `plugins` to scalars and histograms
+
+    Plugin metadata is only written with the first event of a tag,
+    so an event file decoded on its own keeps values of tags
+    described in earlier files as tensors.
+    """
+    tags = [t for t in events.tensors
+            if plugins.get(t.encode('utf-8'), None) in (_SCALARS_PLUGIN, _HISTOGRAMS_PLUGIN)]
+    if not tags:
+        return events
+
+    resolved = Events()
+    resolved.scalars = dict(events.scalars)
+    resolved.histograms = dict(events.histograms)
+    resolved.tensors = {t: s for t, s in events.tensors.items() if t not in tags}
+
+    decoder = _Decoder(None, plugins)
+    for tag in tags:
+        series = events.tensors[tag]
+        plugin = plugins[tag.encode('utf-8')]
+        for i in range(len(series)):
+            e = series[i]
+            decoder.add_tensor_value(tag, e.step, e.wall_time, e.value, plugin)
+
+    resolved.extend(decoder.events())
+    return resolved
+
+
+class EventFileReader:
+    """
+    ## Reads records of a single event file
+
+    This remembers how far the file has been read,
+    so that `read` only decodes records appended since the last call.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.offset = 0
+        self._identity = None
+
+    def is_rotated(self) -> bool:
+        """
+        ### Whether the file was replaced or truncated since it was last read
+        """
+        try:
+            stat = os.stat(str(self.path))
+        except FileNotFoundError:
+            return True
+
+        if self._identity is not None and self._identity != (stat.st_dev, stat.st_ino):
+            return True
+
+        return stat.st_size < self.offset
+
+    def read(self, decoder: '_Decoder'):
+        """
+        ### Decode all complete records after `offset`
+
+        A partially written record at the end is left for the next call.
+        """
+        with open(str(self.path), 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self._identity = (stat.st_dev, stat.st_ino)
+            if stat.st_size <= self.offset:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                self.offset = self._read_records(buf, decoder, self.offset, len(buf))
+
+    @staticmethod
+    def _read_records(buf, decoder: '_Decoder', pos: int, size: int) -> int:
+        decode_event = decoder.decode_event
+        while pos + _HEADER_SIZE <= size:
+            length, = _U64.unpack_from(buf, pos)
+            start = pos + _HEADER_SIZE
+            end = start + length
+            # Stop at a partially written record
+            if end + _FOOTER_SIZE > size:
+                break
+            decode_event(buf, start, end)
+            pos = end + _FOOTER_SIZE
+
+        return pos
+
+
+def event_files(path: Path) -> List[Path]:
+    """
+    ## Event files in a summaries directory, in the order they were written
+    """
+    if not path.exists():
+        return []
+    files = [p for p in path.iterdir()
+             if p.is_file() and 'tfevents' in p.name]
+    return sorted(files, key=lambda p: p.name)
+
+
+class EventDirectory:
+    """
+    ## Incrementally reads the event files of a summaries directory
+
+    Each call to `read` decodes only the records appended since the last call,
+    including those of event files created in the meantime.
+    If an event file was deleted, replaced or truncated
+    the directory is read again from the start.
+
+    If a `cache` is given, event files read from the start are
+    loaded from and saved to it.
+    """
+
+    def __init__(self, path: Path, tags: Optional[Iterable[str]] = None, *,
+                 cache: Optional['SummaryCache'] = None):
+        self.path = path
+        self.tags = None if tags is None else set(tags)
+        self.cache = cache
+        self.readers: Dict[str, EventFileReader] = {}
+        self._plugins: Dict[bytes, bytes] = {}
+
+    def read(self, decoded: Optional[Dict[Path, 'DecodedFile']] = None) -> Tuple[Events, bool]:
+        """
+        ### Read new events
+
+        Returns the new events and whether the directory was read from the start,
+        in which case the events replace everything read before.
+
+        Event files in `decoded` were decoded elsewhere and are not read again.
+        """
+        files = event_files(self.path)
+        names = {p.name for p in files}
+
+        is_reset = any(r.is_rotated() or name not in names
+                       for name, r in self.readers.items())
+        if is_reset:
+            self.readers = {}
+            self._plugins = {}
+
+        if self.cache is not None and (is_reset or not self.readers):
+            self.cache.prune(files)
+
+        events = []
+        for p in files:
+            if p.name not in self.readers:
+                self.readers[p.name] = EventFileReader(p)
+            events.append(self._read_file(self.readers[p.name], decoded))
+
+        return Events.concat(events), is_reset
+
+    def _read_file(self, reader: EventFileReader,
+                   decoded: Optional[Dict[Path, 'DecodedFile']]) -> Events:
+        events = []
+        is_save = False
+        if reader.offset == 0:
+            is_save = self.cache is not None
+            loaded = None
+            if is_save:
+                loaded = self.cache.load(reader.path, self.tags)
+            if loaded is not None:
+                is_save = False
+            elif decoded is not None:
+                loaded = decoded.get(reader.path, None)
+                if loaded is not None:
+                    # Decoded without the plugin names of earlier event files
+                    loaded_events, offset, plugins = loaded
+                    loaded = _resolve_tensors(loaded_events, self._plugins), offset, plugins
+
+            if loaded is not None:
+                loaded_events, reader.offset, plugins = loaded
+                self._plugins.update(plugins)
+                events.append(loaded_events)
+
+        decoder = _Decoder(self.tags, self._plugins)
+        reader.read(decoder)
+        events.append(decoder.events())
+        events = Events.concat(events)
+
+        if is_save:
+            self.cache.save(reader.path, self.tags, events, reader.offset, self._plugins)
+
+        return events
+
+
+# Events of an event file, the number of bytes decoded, and plugin names of tags
+DecodedFile = Tuple[Events, int, Dict[bytes, bytes]]
+
+
+def decode_event_file(path: Path, tags: Optional[Iterable[str]] = None) -> DecodedFile:
+    """
+    ## Decode a whole event file
+    """
+    decoder = _Decoder(None if tags is None else set(tags))
+    reader = EventFileReader(path)
+    reader.read(decoder)
+
+    return decoder.events(), reader.offset, decoder.plugins
+
+
+def read_event_file(path: Path, tags: Optional[Iterable[str]] = None) -> Events:
+    """
+    ## Read a single event file
+
+    Only summaries of `tags` are decoded, if given.
+    """
+    events, _, _ = decode_event_file(path, tags)
+    return events
+
+
+def read_event_files(path: Path, tags: Optional[Iterable[str]] = None) -> Events:
+    """
+    ## Read all event files in a summaries directory
+    """
+    events, _ = EventDirectory(path, tags).read()
+    return events
@@ -1,21 +1,34 @@
-import tensorflow as tf
-
-TF_VERSION = [int(s) for s in tf.__version__.split('.')]
-TF_VERSION = TF_VERSION[0] * 1000 + TF_VERSION[1]
-
-if TF_VERSION < 1014:
-    Session = tf.Session
-    global_variables_initializer = tf.global_variables_initializer
-    set_random_seed = tf.set_random_seed
-    summary = tf.summary
-    make_tensor_proto = tf.make_tensor_proto
-    Summary = tf.Summary
-    HistogramProto = tf.HistogramProto
-else:
-    Session = tf.compat.v1.Session
-    global_variables_initializer = tf.compat.v1.global_variables_initializer
-    set_random_seed = tf.compat.v1.set_random_seed
-    summary = tf.compat.v1.summary
-    make_tensor_proto = tf.compat.v1.make_tensor_proto
-    Summary = tf.compat.v1.Summary
-    HistogramProto = tf.compat.v1.HistogramProto
+"""
+TensorFlow compatibility aliases.
+
+TensorFlow is imported when an alias is first used,
+so that importing this module is cheap.
+"""
+import importlib
+
+_V1_NAMES = ['Session', 'global_variables_initializer', 'set_random_seed', 'summary',
+             'make_tensor_proto', 'Summary', 'HistogramProto']
+
+
+def _tf_version(tf) -> int:
+    version = [int(s) for s in tf.__version__.split('.')[:2]]
+    return version[0] * 1000 + version[1]
+
+
+def __getattr__(name: str):
+    if name != 'TF_VERSION' and name not in _V1_NAMES:
+        raise AttributeError(f"module {__name__} has no attribute {name}")
+
+    tf = importlib.import_module('tensorflow')
+    tf_version = _tf_version(tf)
+    if tf_version < 1014:
+        v1 = tf
+    else:
+        v1 = tf.compat.v1
+
+    module = globals()
+    module['TF_VERSION'] = tf_version
+    for n in _V1_NAMES:
+        module[n] = getattr(v1, n)
+
+    return module[name]
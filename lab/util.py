@@ -1,14 +1,23 @@
+import atexit
+import collections
 import io
+import os
 import pathlib
+import queue
+import shutil
+import threading
+import uuid
 
-import numpy as np
 import yaml
-from matplotlib import pyplot
 
 import functools
 import inspect
+import typing
 import warnings
 
+if typing.TYPE_CHECKING:
+    import numpy as np
+
 
 def yaml_load(s: str):
     return yaml.load(s, Loader=yaml.BaseLoader)
@@ -18,28 +27,48 @@ def yaml_dump(obj: any):
     return yaml.dump(obj, default_flow_style=False)
 
 
-def overlay_image_green(result: np.ndarray,
-                        base: np.ndarray,
-                        overlay: np.ndarray,
+def overlay_image_green(result: 'np.ndarray',
+                        base: 'np.ndarray',
+                        overlay: 'np.ndarray',
                         base_factor: float):
     """
     #### Overlays a map on an image
     """
+    import numpy as np
+
     result[:, :, 0] = base * base_factor
     result[:, :, 1] = base * base_factor
     result[:, :, 2] = base * base_factor
     result[:, :, 1] += (1 - base_factor) * 255 * overlay / (np.max(overlay) - np.min(overlay))
 
 
-def create_png(frame: np.ndarray):
+def create_png(frame: 'np.ndarray'):
     """
     #### Create a PNG from a numpy array.
     """
+    from matplotlib import pyplot
+
     png = io.BytesIO()
     pyplot.imsave(png, frame, format='png', cmap='gray')
     return png
 
 
+def write_atomic(path: pathlib.Path, content: str):
+    """
+    #### Write a file through a temporary file and a rename
+
+    Readers see either the old or the new content, even after a crash.
+    """
+    tmp = path.parent / f".{path.name}.{os.getpid()}.tmp"
+    with open(str(tmp), "w") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    if path.exists():
+        shutil.copymode(str(path), str(tmp))
+    os.replace(str(tmp), str(path))
+
+
 def rm_tree(path_to_remove: pathlib.Path):
     if path_to_remove.is_dir():
         for f in path_to_remove.iterdir():
@@ -52,6 +81,90 @@ def rm_tree(path_to_remove: pathlib.Path):
         path_to_remove.unlink()
 
 
+_removals = queue.Queue()
+_removals_pending = set()
+_removals_lock = threading.Lock()
+_removals_thread = None
+
+
+def _remove_worker():
+    while True:
+        path = _removals.get()
+        try:
+            if path.is_dir() and not path.is_symlink():
+                shutil.rmtree(str(path), ignore_errors=True)
+            else:
+                path.unlink()
+        except OSError:
+            # Left in the trash for `resume_removals`
+            pass
+        finally:
+            with _removals_lock:
+                _removals_pending.discard(path)
+            _removals.task_done()
+
+
+def _queue_removal(path: pathlib.Path):
+    global _removals_thread
+
+    with _removals_lock:
+        if path in _removals_pending:
+            return
+        _removals_pending.add(path)
+        if _removals_thread is None:
+            _removals_thread = threading.Thread(target=_remove_worker, daemon=True)
+            _removals_thread.start()
+            atexit.register(_removals.join)
+
+    _removals.put(path)
+
+
+def rm_tree_background(path_to_remove: pathlib.Path, trash_path: pathlib.Path):
+    """
+    #### Remove a directory or a file on a background thread
+
+    It is renamed into `trash_path` right away,
+    so it is gone from its location when this returns.
+    `trash_path` should be on the same file system.
+    Removals are finished before the program exits,
+    and leftovers are removed by `resume_removals`.
+    """
+    trash_path.mkdir(parents=True, exist_ok=True)
+    target = trash_path / uuid.uuid4().hex
+    os.rename(str(path_to_remove), str(target))
+    _queue_removal(target)
+
+
+def resume_removals(trash_path: pathlib.Path):
+    """
+    #### Remove what is left in `trash_path` on a background thread
+    """
+    if not trash_path.is_dir():
+        return
+
+    for c in trash_path.iterdir():
+        _queue_removal(c)
+
+
+def map_ordered(pool, fn, items, window: int):
+    """
+    #### Map `fn` over `items` on an executor, in order
+
+    At most `window` items are in flight, which bounds memory
+    when items are large. Yields each item with its result.
+    """
+    pending = collections.deque()
+    for item in items:
+        pending.append((item, pool.submit(fn, item)))
+        if len(pending) >= window:
+            item, future = pending.popleft()
+            yield item, future.result()
+
+    while pending:
+        item, future = pending.popleft()
+        yield item, future.result()
+
+
 def deprecated(message: str):
     """
     Mark a class, a function or a class method as deprecated.
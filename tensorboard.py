@@ -22,10 +22,34 @@ def main():
                         nargs='+',
                         dest='experiments',
                         help='List of experiments')
+    parser.add_argument('--from',
+                        dest='date_from',
+                        help='List trials on or after this date (YYYY-MM-DD)')
+    parser.add_argument('--to',
+                        dest='date_to',
+                        help='List trials on or before this date (YYYY-MM-DD)')
+    parser.add_argument('--commit',
+                        help='List trials of a commit hash prefix or message')
+    parser.add_argument('--comment',
+                        help='List trials with comments containing this')
+    parser.add_argument('--metric',
+                        nargs='+',
+                        help='List trials with latest progress matching conditions like loss<0.5')
 
     args = parser.parse_args()
+    is_query = any(v is not None for v in [args.date_from, args.date_to,
+                                           args.commit, args.comment, args.metric])
 
-    if args.list:
+    if args.list and is_query:
+        results = utils.query_trials(lab,
+                                     experiments=args.experiments,
+                                     date_from=args.date_from,
+                                     date_to=args.date_to,
+                                     commit=args.commit,
+                                     comment=args.comment,
+                                     metrics=args.metric)
+        utils.list_query_results(results, logger)
+    elif args.list:
         utils.list_experiments(lab, logger)
     elif args.experiments:
         # List out the experiments.
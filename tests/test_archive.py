@@ -0,0 +1,118 @@
+import json
+import os
+import pathlib
+import zlib
+
+import pytest
+
+from lab import archive
+
+
+@pytest.fixture
+def experiment(tmp_path: pathlib.Path) -> pathlib.Path:
+    path = tmp_path / 'experiment'
+    (path / 'checkpoints' / '10').mkdir(parents=True)
+    (path / 'checkpoints' / '20').mkdir(parents=True)
+    (path / '.trash').mkdir()
+    (path / 'trials.yaml').write_text('- comment: test\n')
+    (path / 'empty').write_bytes(b'')
+    (path / 'checkpoints' / '10' / 'info.json').write_text('{}')
+    (path / 'checkpoints' / '20' / 'info.json').write_text('{}')
+    # Spans several chunks
+    (path / 'checkpoints' / '20' / 'tensors.bin').write_bytes(os.urandom(3 * 1000 + 17))
+    (path / '.trash' / 'removed').write_text('removed')
+    os.chmod(str(path / 'trials.yaml'), 0o600)
+
+    return path
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(archive, 'CHUNK_SIZE', 1000)
+
+
+def _files(path: pathlib.Path):
+    return {p.relative_to(path).as_posix(): p.read_bytes()
+            for p in path.rglob('*') if p.is_file()}
+
+
+def _rewrite_index(archive_path: pathlib.Path, members):
+    """
+    Append a new index, as if the archive was made with these members
+    """
+    index = zlib.compress(json.dumps(dict(members=members)).encode('utf-8'))
+    with open(str(archive_path), 'r+b') as f:
+        f.seek(0, os.SEEK_END)
+        offset = f.tell()
+        f.write(index)
+        f.write(archive._FOOTER.pack(offset, len(index), archive._FOOTER_MAGIC))
+
+
+def test_round_trip(tmp_path: pathlib.Path, experiment: pathlib.Path, small_chunks):
+    archive_path = tmp_path / 'experiment.lab'
+    archive.create(experiment, archive_path, threads=3)
+
+    members = archive.read_index(archive_path)
+    assert sorted(m['name'] for m in members) == sorted(
+        n for n in _files(experiment) if not n.startswith('.trash/'))
+    assert archive.verify(archive_path) == []
+
+    out = tmp_path / 'out'
+    archive.extract(archive_path, out, members, threads=3)
+    expected = {n: d for n, d in _files(experiment).items() if not n.startswith('.trash/')}
+    assert _files(out) == expected
+    assert os.stat(str(out / 'trials.yaml')).st_mode & 0o777 == 0o600
+
+
+def test_select(tmp_path: pathlib.Path, experiment: pathlib.Path):
+    archive_path = tmp_path / 'experiment.lab'
+    archive.create(experiment, archive_path)
+    members = archive.read_index(archive_path)
+
+    names = {m['name'] for m in archive.select(members, is_latest_checkpoint=True)}
+    assert names == {'trials.yaml', 'checkpoints/20/info.json', 'checkpoints/20/tensors.bin'}
+    names = {m['name'] for m in archive.select(members, ['checkpoints/10/*'])}
+    assert names == {'checkpoints/10/info.json'}
+
+
+@pytest.mark.parametrize('name', ['../outside', 'checkpoints/../../outside', '/tmp/outside'])
+def test_path_traversal(tmp_path: pathlib.Path, experiment: pathlib.Path, name: str):
+    archive_path = tmp_path / 'experiment.lab'
+    archive.create(experiment, archive_path)
+    members = archive.read_index(archive_path)
+    members[0]['name'] = name
+    _rewrite_index(archive_path, members)
+
+    out = tmp_path / 'out'
+    out.mkdir()
+    with pytest.raises(archive.ArchiveError):
+        archive.extract(archive_path, out, archive.read_index(archive_path))
+    assert not (tmp_path / 'outside').exists()
+
+
+def test_corruption(tmp_path: pathlib.Path, experiment: pathlib.Path, small_chunks):
+    archive_path = tmp_path / 'experiment.lab'
+    archive.create(experiment, archive_path)
+    members = archive.read_index(archive_path)
+    member = next(m for m in members if m['name'] == 'checkpoints/20/tensors.bin')
+
+    # A valid chunk with other content
+    offset, size, raw_size = member['chunks'][1]
+    data = zlib.compress(bytes(raw_size))
+    member['chunks'][1] = [os.path.getsize(str(archive_path)), len(data), raw_size]
+    with open(str(archive_path), 'ab') as f:
+        f.write(data)
+    _rewrite_index(archive_path, members)
+
+    assert archive.verify(archive_path) == ['checkpoints/20/tensors.bin']
+    out = tmp_path / 'out'
+    with pytest.raises(archive.ArchiveError):
+        archive.extract(archive_path, out, [member])
+    assert not (out / 'checkpoints' / '20' / 'tensors.bin').exists()
+
+
+def test_not_an_archive(tmp_path: pathlib.Path):
+    path = tmp_path / 'file'
+    path.write_bytes(b'not an archive' * 10)
+    with pytest.raises(archive.ArchiveError):
+        archive.read_index(path)
@@ -0,0 +1,231 @@
+import json
+import pathlib
+
+import numpy as np
+import pytest
+
+from lab.experiment import checkpoint, codecs, precision
+
+# Lossless round trips must match exactly; reduced precision ones within a tolerance
+_TOLERANCE = {
+    None: 0,
+    'float16': 1e-3,
+    'bfloat16': 1e-2,
+    'int8': 1e-2,
+}
+
+_TARGETS = ([('npy', None, None)] +
+            [(f, c, None) for f in ['packed', 'blobs'] for c in [None] + codecs.CODECS] +
+            [(f, c, d) for f in ['packed', 'blobs'] for c in [None, 'zlib']
+             for d in precision.STORAGE_DTYPES])
+
+
+def _arrays():
+    rng = np.random.default_rng(0)
+    return {
+        'matrix.npy': rng.standard_normal((33, 17)).astype(np.float32),
+        'conv.npy': rng.standard_normal((4, 3, 5, 5)).astype(np.float32),
+        'vector.npy': rng.standard_normal(1000).astype(np.float64),
+        'scalar.npy': np.array(3.5, dtype=np.float32),
+        'empty.npy': np.zeros((0, 4), dtype=np.float32),
+        'zeros.npy': np.zeros((2, 3), dtype=np.float32),
+        'counts.npy': np.arange(-50, 50, dtype=np.int64),
+        'mask.npy': rng.random(77) > 0.5,
+        'half.npy': rng.standard_normal(31).astype(np.float16),
+    }
+
+
+def _files(arrays):
+    return {'model': {name[:-len('.npy')]: name for name in arrays}}
+
+
+@pytest.fixture
+def small_shards(monkeypatch):
+    # Split arrays into many shards, chunks and blobs
+    monkeypatch.setattr(checkpoint, 'SHARD_SIZE', 256)
+    monkeypatch.setattr(checkpoint, 'BLOB_SIZE', 512)
+    monkeypatch.setattr(codecs, 'CHUNK_SIZE', 384)
+    monkeypatch.setattr(precision, 'CHUNK_SIZE', 64)
+
+
+def _assert_close(array: np.ndarray, expected: np.ndarray, storage_dtype):
+    assert array.shape == expected.shape
+    assert array.dtype == expected.dtype
+    tolerance = _TOLERANCE[storage_dtype] if precision.is_convertible(expected) else 0
+    if tolerance == 0:
+        np.testing.assert_array_equal(array, expected)
+    else:
+        scale = max(float(np.abs(expected).max(initial=0)), 1)
+        np.testing.assert_allclose(array, expected, rtol=tolerance, atol=tolerance * scale)
+
+
+@pytest.mark.parametrize('checkpoint_format,codec,storage_dtype', _TARGETS)
+def test_round_trip(tmp_path: pathlib.Path, small_shards, checkpoint_format, codec, storage_dtype):
+    arrays = _arrays()
+    writer = checkpoint.CheckpointWriter(tmp_path / 'checkpoints', tmp_path / 'trash',
+                                         checkpoint_format=checkpoint_format,
+                                         codec=codec,
+                                         storage_dtype=storage_dtype,
+                                         threads=4)
+    writer.save(10, _files(arrays), arrays)
+    assert checkpoint.latest_step(tmp_path / 'checkpoints') == 10
+
+    with checkpoint.CheckpointReader(tmp_path / 'checkpoints' / '10', threads=4) as reader:
+        assert reader.format == checkpoint_format
+        assert reader.files == _files(arrays)
+        assert sorted(reader.names()) == sorted(arrays)
+
+        for name, expected in arrays.items():
+            assert reader.shape_dtype(name) == (expected.shape, expected.dtype)
+            _assert_close(reader.read(name), expected, storage_dtype)
+
+        progress = []
+        read = reader.read_all(list(arrays), on_progress=progress.append)
+        for name, expected in arrays.items():
+            _assert_close(read[name], expected, storage_dtype)
+        assert progress and progress[-1] == pytest.approx(1)
+
+        out = {name: np.empty_like(a) for name, a in arrays.items()}
+        reader.read_into(out)
+        for name, expected in arrays.items():
+            _assert_close(out[name], expected, storage_dtype)
+
+
+def test_read_into_mismatch(tmp_path: pathlib.Path):
+    arrays = {'a.npy': np.ones((2, 3), dtype=np.float32)}
+    writer = checkpoint.CheckpointWriter(tmp_path / 'checkpoints', tmp_path / 'trash',
+                                         checkpoint_format='packed')
+    writer.save(1, {'a': 'a.npy'}, arrays)
+
+    with checkpoint.CheckpointReader(tmp_path / 'checkpoints' / '1') as reader:
+        with pytest.raises(ValueError):
+            reader.read_into({'a.npy': np.empty((3, 2), dtype=np.float32)})
+        with pytest.raises(ValueError):
+            reader.read_into({'a.npy': np.empty((2, 3), dtype=np.float64)})
+        with pytest.raises(ValueError):
+            reader.read_into({'a.npy': np.empty((3, 2), dtype=np.float32).T})
+
+
+def test_default_format_is_npy(tmp_path: pathlib.Path):
+    arrays = _arrays()
+    writer = checkpoint.CheckpointWriter(tmp_path / 'checkpoints', tmp_path / 'trash')
+    writer.save(1, _files(arrays), arrays)
+
+    assert (tmp_path / 'checkpoints' / '1' / 'matrix.npy').exists()
+    with checkpoint.CheckpointReader(tmp_path / 'checkpoints' / '1') as reader:
+        assert reader.format == 'npy'
+
+
+def test_npy_options(tmp_path: pathlib.Path):
+    with pytest.raises(ValueError):
+        checkpoint.CheckpointWriter(tmp_path, tmp_path / 'trash', codec='zlib')
+    with pytest.raises(ValueError):
+        checkpoint.CheckpointWriter(tmp_path, tmp_path / 'trash', storage_dtype='int8')
+
+
+def test_iterable_and_async(tmp_path: pathlib.Path):
+    arrays = _arrays()
+    writer = checkpoint.CheckpointWriter(tmp_path / 'checkpoints', tmp_path / 'trash',
+                                         checkpoint_format='packed',
+                                         keep_checkpoints=2,
+                                         is_async=True,
+                                         max_in_flight=2)
+    written = []
+    for step in range(1, 5):
+        writer.save(step, _files(arrays), iter(list(arrays.items())),
+                    on_written=lambda s=step: written.append(s))
+    writer.wait()
+
+    assert written == [1, 2, 3, 4]
+    assert checkpoint.checkpoint_steps(tmp_path / 'checkpoints') == [3, 4]
+    with checkpoint.CheckpointReader(tmp_path / 'checkpoints' / '4') as reader:
+        for name, expected in arrays.items():
+            np.testing.assert_array_equal(reader.read(name), expected)
+
+
+def test_blobs_are_shared(tmp_path: pathlib.Path, small_shards):
+    arrays = _arrays()
+    path = tmp_path / 'checkpoints'
+    writer = checkpoint.CheckpointWriter(path, tmp_path / 'trash',
+                                         checkpoint_format='blobs', keep_checkpoints=2)
+    writer.save(1, _files(arrays), arrays)
+    blobs = {p.name for p in (path / checkpoint.BLOBS_DIR).rglob('*') if p.is_file()}
+
+    writer.save(2, _files(arrays), arrays)
+    assert {p.name for p in (path / checkpoint.BLOBS_DIR).rglob('*') if p.is_file()} == blobs
+
+    changed = dict(arrays, **{'vector.npy': arrays['vector.npy'] + 1})
+    writer.save(3, _files(changed), changed)
+    writer.save(4, _files(changed), changed)
+    remaining = {p.name for p in (path / checkpoint.BLOBS_DIR).rglob('*') if p.is_file()}
+    # Blobs of the old `vector` are collected once no checkpoint refers to them
+    assert remaining != blobs
+    with checkpoint.CheckpointReader(path / '4') as reader:
+        np.testing.assert_array_equal(reader.read('vector.npy'), changed['vector.npy'])
+
+
+def test_int8_non_finite(tmp_path: pathlib.Path):
+    arrays = {'finite.npy': np.linspace(-1, 1, 12, dtype=np.float32).reshape(3, 4),
+              'nan.npy': np.array([[1, np.nan], [np.inf, 2]], dtype=np.float32)}
+    writer = checkpoint.CheckpointWriter(tmp_path / 'checkpoints', tmp_path / 'trash',
+                                         checkpoint_format='packed', storage_dtype='int8')
+    writer.save(1, {'finite': 'finite.npy', 'nan': 'nan.npy'}, arrays)
+
+    with checkpoint.CheckpointReader(tmp_path / 'checkpoints' / '1') as reader:
+        assert reader.tensors['finite.npy']['storage_dtype'] == 'int8'
+        assert 'storage_dtype' not in reader.tensors['nan.npy']
+        np.testing.assert_array_equal(reader.read('nan.npy'), arrays['nan.npy'])
+
+
+@pytest.mark.parametrize('axis', [0, 1, -1])
+def test_int8_axis(axis):
+    rng = np.random.default_rng(1)
+    array = rng.standard_normal((6, 5, 4)).astype(np.float32)
+    # Slices along the axis have very different magnitudes
+    magnitudes = np.logspace(-3, 3, array.shape[axis]).astype(np.float32)
+    array *= np.expand_dims(magnitudes, [a for a in range(3) if a != axis % 3])
+
+    stored, scales = precision.encode('int8', array, axis=axis)
+    assert scales.shape == (array.shape[axis],)
+    out = np.empty_like(array)
+    precision.decode('int8', stored, scales, out, axis=axis)
+
+    error = np.abs(out - array).max(axis=tuple(a for a in range(3) if a != axis % 3))
+    assert np.all(error <= magnitudes * 3 / 127)
+
+
+def test_int8_scales_without_axis(tmp_path: pathlib.Path):
+    # Checkpoints written before `scales_axis` have scales along the first axis
+    array = np.arange(12, dtype=np.float32).reshape(3, 4)
+    writer = checkpoint.CheckpointWriter(tmp_path / 'checkpoints', tmp_path / 'trash',
+                                         checkpoint_format='packed')
+    stored, scales = precision.encode('int8', array, axis=0)
+    writer.save(1, {'a': 'a.npy'}, {'a.npy': stored, 'a.npy.scales': scales})
+
+    info_file = tmp_path / 'checkpoints' / '1' / checkpoint.INFO_FILE
+    info = json.loads(info_file.read_text())
+    info['tensors']['a.npy'].update(storage_dtype='int8', original_dtype='<f4',
+                                    scales='a.npy.scales')
+    info_file.write_text(json.dumps(info))
+
+    with checkpoint.CheckpointReader(tmp_path / 'checkpoints' / '1') as reader:
+        np.testing.assert_allclose(reader.read('a.npy'), array, atol=0.1)
+
+
+@pytest.mark.parametrize('checkpoint_format', ['npy', 'blobs'])
+def test_convert_to_packed(tmp_path: pathlib.Path, small_shards, checkpoint_format):
+    arrays = _arrays()
+    path = tmp_path / 'checkpoints'
+    writer = checkpoint.CheckpointWriter(path, tmp_path / 'trash', checkpoint_format=checkpoint_format)
+    writer.save(1, _files(arrays), arrays)
+
+    checkpoint.convert_to_packed(path / '1', tmp_path / 'trash', codec='zlib')
+
+    with checkpoint.CheckpointReader(path / '1') as reader:
+        assert reader.format == 'packed'
+        assert reader.codec == 'zlib'
+        for name, expected in arrays.items():
+            np.testing.assert_array_equal(reader.read(name), expected)
+
+    blobs_path = path / checkpoint.BLOBS_DIR
+    assert not blobs_path.exists() or not [p for p in blobs_path.rglob('*') if p.is_file()]
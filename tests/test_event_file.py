@@ -0,0 +1,209 @@
+import json
+import pathlib
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from lab.tb.event_file import EventDirectory, decode_event_file, event_files, read_event_files
+
+# Writes event files with TensorBoard and reads them back with `EventAccumulator`.
+# This runs in a separate process, since `tensorboard.py` in the repository root
+# shadows the package.
+_SCRIPT = r'''
+import json
+import sys
+
+import numpy as np
+from tensorboard.backend.event_processing import event_accumulator
+from tensorboard.compat.proto import event_pb2, summary_pb2, tensor_pb2, tensor_shape_pb2
+from tensorboard.summary.writer.record_writer import RecordWriter
+from tensorboard.util import tensor_util
+
+logdir = sys.argv[1]
+
+UNSIGNED = {22: np.uint32, 23: np.uint64}
+
+
+def tensor(dtype, shape, **values):
+    shape = tensor_shape_pb2.TensorShapeProto(
+        dim=[tensor_shape_pb2.TensorShapeProto.Dim(size=s) for s in shape])
+    return tensor_pb2.TensorProto(dtype=dtype, tensor_shape=shape, **values)
+
+
+def values(step, is_first):
+    rng = np.random.default_rng(step)
+    limits = np.sort(rng.standard_normal(5))
+    counts = rng.integers(0, 10, 5).astype(np.float64)
+    histo = summary_pb2.HistogramProto(min=limits[0], max=limits[-1], num=counts.sum(),
+                                       sum=float(step), sum_squares=float(step * step),
+                                       bucket_limit=limits.tolist(), bucket=counts.tolist())
+    half = rng.standard_normal(3).astype(np.float16)
+    buckets = np.stack([limits, limits + 1, counts], axis=1)
+    tensors = {
+        'accuracy': (tensor(1, [], float_val=[step / 100]), 'scalars'),
+        'buckets': (tensor(2, list(buckets.shape), tensor_content=buckets.tobytes()), 'histograms'),
+        'half': (tensor(19, [3], half_val=half.view(np.uint16).tolist()), None),
+        'matrix': (tensor(1, [2, 3], tensor_content=rng.standard_normal(6).astype('<f4').tobytes()),
+                   None),
+        'int32': (tensor(3, [3], int_val=[-step, 0, step]), None),
+        'uint32': (tensor(22, [2], uint32_val=[step, 2 ** 32 - 1]), None),
+        'uint64': (tensor(23, [2], uint64_val=[step, 2 ** 64 - 1]), None),
+    }
+
+    result = [summary_pb2.Summary.Value(tag='loss', simple_value=1 / (step + 1)),
+              summary_pb2.Summary.Value(tag='weights', histo=histo)]
+    for tag, (t, plugin) in tensors.items():
+        value = summary_pb2.Summary.Value(tag=tag, tensor=t)
+        # Only the first event of a tag has the metadata
+        if plugin is not None and is_first:
+            value.metadata.plugin_data.plugin_name = plugin
+        result.append(value)
+
+    return result
+
+
+for i, steps in enumerate([range(0, 50), range(50, 100)]):
+    with open(f"{logdir}/events.out.tfevents.{i}.test", 'wb') as f:
+        writer = RecordWriter(f)
+        writer.write(event_pb2.Event(wall_time=1.0, file_version='brain.Event:2').SerializeToString())
+        for step in steps:
+            event = event_pb2.Event(wall_time=1000.5 + step, step=step,
+                                    summary=summary_pb2.Summary(value=values(step, step == 0)))
+            writer.write(event.SerializeToString())
+
+accumulator = event_accumulator.EventAccumulator(logdir, size_guidance={
+    event_accumulator.SCALARS: 0,
+    event_accumulator.HISTOGRAMS: 0,
+    event_accumulator.TENSORS: 0,
+})
+accumulator.Reload()
+tags = accumulator.Tags()
+
+result = dict(scalars={}, histograms={}, tensors={})
+for tag in tags['scalars']:
+    result['scalars'][tag] = [[e.step, e.wall_time, e.value] for e in accumulator.Scalars(tag)]
+for tag in tags['histograms']:
+    result['histograms'][tag] = [
+        [e.step, e.wall_time,
+         [e.histogram_value.min, e.histogram_value.max, e.histogram_value.num,
+          e.histogram_value.sum, e.histogram_value.sum_squares],
+         list(e.histogram_value.bucket_limit), list(e.histogram_value.bucket)]
+        for e in accumulator.Histograms(tag)]
+for tag in tags['tensors']:
+    events = []
+    for e in accumulator.Tensors(tag):
+        proto = e.tensor_proto
+        if proto.dtype in UNSIGNED:
+            # Not supported by `make_ndarray`
+            values = list(proto.uint32_val) + list(proto.uint64_val)
+            value = np.array(values, dtype=UNSIGNED[proto.dtype])
+            value = value.reshape([d.size for d in proto.tensor_shape.dim])
+        else:
+            value = tensor_util.make_ndarray(proto)
+        events.append([e.step, e.wall_time, value.dtype.str, list(value.shape),
+                       [str(v) for v in value.reshape(-1).tolist()]])
+    result['tensors'][tag] = events
+
+print(json.dumps(result))
+'''
+
+
+@pytest.fixture(scope='module')
+def expected(tmp_path_factory):
+    logdir = tmp_path_factory.mktemp('events')
+    result = subprocess.run([sys.executable, '-c', _SCRIPT, str(logdir)],
+                            cwd=str(logdir), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        if b'ModuleNotFoundError' in result.stderr:
+            pytest.skip("TensorBoard is not installed")
+        raise RuntimeError(result.stderr.decode('utf-8'))
+
+    return logdir, json.loads(result.stdout)
+
+
+def _tensor_values(events):
+    return [np.array([float(v) if '.' in v or 'e' in v else int(v) for v in values],
+                     dtype=np.dtype(dtype)).reshape(shape)
+            for _, _, dtype, shape, values in events]
+
+
+def _check(events, expected):
+    assert set(events.scalars) == set(expected['scalars']) | {'accuracy'}
+    assert set(events.histograms) == set(expected['histograms']) | {'buckets'}
+    assert set(events.tensors) == set(expected['tensors']) - {'accuracy', 'buckets'}
+
+    for tag, scalars in expected['scalars'].items():
+        step, wall_time, value = zip(*scalars)
+        np.testing.assert_array_equal(events.scalars[tag].step, step)
+        np.testing.assert_array_equal(events.scalars[tag].wall_time, wall_time)
+        np.testing.assert_array_equal(events.scalars[tag].value, value)
+
+    for tag, histograms in expected['histograms'].items():
+        series = events.histograms[tag]
+        np.testing.assert_array_equal(series.step, [h[0] for h in histograms])
+        np.testing.assert_array_equal(series.stats, [h[2] for h in histograms])
+        for i, (_, _, _, limits, counts) in enumerate(histograms):
+            bucket_limit, bucket = series.buckets(i)
+            np.testing.assert_array_equal(bucket_limit, limits)
+            np.testing.assert_array_equal(bucket, counts)
+
+    # Tensors of the `scalars` and `histograms` plugins
+    accuracy = expected['tensors']['accuracy']
+    np.testing.assert_array_equal(events.scalars['accuracy'].step, [e[0] for e in accuracy])
+    np.testing.assert_array_equal(events.scalars['accuracy'].value,
+                                  [v.item() for v in _tensor_values(accuracy)])
+    buckets = _tensor_values(expected['tensors']['buckets'])
+    for i, value in enumerate(buckets):
+        bucket_limit, bucket = events.histograms['buckets'].buckets(i)
+        np.testing.assert_array_equal(bucket_limit, value[:, 1])
+        np.testing.assert_array_equal(bucket, value[:, 2])
+
+    for tag, tensors in expected['tensors'].items():
+        if tag in ('accuracy', 'buckets'):
+            continue
+        series = events.tensors[tag]
+        np.testing.assert_array_equal(series.step, [e[0] for e in tensors])
+        np.testing.assert_array_equal(series.wall_time, [e[1] for e in tensors])
+        for i, value in enumerate(_tensor_values(tensors)):
+            assert series[i].value.dtype == value.dtype
+            np.testing.assert_array_equal(series[i].value, value)
+
+
+def test_event_accumulator(expected):
+    logdir, expected = expected
+    _check(read_event_files(logdir), expected)
+
+
+def test_parallel_decode(expected):
+    logdir, expected = expected
+    # Files decoded on their own don't have the plugin names of earlier files
+    decoded = {p: decode_event_file(p) for p in event_files(logdir)}
+    events, is_reset = EventDirectory(logdir).read(decoded)
+    _check(events, expected)
+
+
+def test_incremental(expected, tmp_path: pathlib.Path):
+    logdir, expected = expected
+    files = event_files(logdir)
+    directory = EventDirectory(tmp_path)
+
+    # A partially written record is read once it's complete
+    first = files[0].read_bytes()
+    (tmp_path / files[0].name).write_bytes(first[:len(first) // 2])
+    events, is_reset = directory.read()
+    (tmp_path / files[0].name).write_bytes(first)
+    events.extend(directory.read()[0])
+    (tmp_path / files[1].name).write_bytes(files[1].read_bytes())
+    events.extend(directory.read()[0])
+
+    _check(events, expected)
+
+
+def test_tags(expected):
+    logdir, expected = expected
+    events = read_event_files(logdir, ['loss', 'half'])
+    assert set(events.scalars) == {'loss'}
+    assert set(events.tensors) == {'half'}
+    assert not events.histograms
@@ -0,0 +1,95 @@
+import pathlib
+
+import numpy as np
+import pytest
+
+_TARGETS = [('npy', None, None),
+            ('packed', None, None),
+            ('packed', 'zlib', None),
+            ('blobs', 'shuffle-zlib', None),
+            ('packed', None, 'bfloat16')]
+
+
+@pytest.mark.parametrize('checkpoint_format,codec,storage_dtype', _TARGETS)
+def test_pytorch(tmp_path: pathlib.Path, checkpoint_format, codec, storage_dtype):
+    torch = pytest.importorskip('torch')
+    from lab.experiment import pytorch
+
+    def model():
+        m = torch.nn.Sequential(torch.nn.Linear(7, 5), torch.nn.BatchNorm1d(5), torch.nn.Linear(5, 3))
+        # Parameters that are not contiguous are read through the staging buffer
+        m[2].weight = torch.nn.Parameter(torch.randn(5, 3).t())
+        return m
+
+    torch.manual_seed(0)
+    saved = model()
+    saved[1].running_mean.uniform_()
+    checkpoint = pytorch.Checkpoint(tmp_path / 'checkpoints', tmp_path / 'trash',
+                                    checkpoint_format=checkpoint_format,
+                                    codec=codec,
+                                    storage_dtype=storage_dtype)
+    checkpoint.add_models({'model': saved})
+    checkpoint.save(100, None)
+
+    torch.manual_seed(1)
+    loaded = model()
+    checkpoint = pytorch.Checkpoint(tmp_path / 'checkpoints', tmp_path / 'trash')
+    checkpoint.add_models({'model': loaded})
+    assert checkpoint.load()
+    assert checkpoint.max_step == 100
+
+    tolerance = 1e-2 if storage_dtype is not None else 0
+    for key, expected in saved.state_dict().items():
+        value = loaded.state_dict()[key]
+        assert value.dtype == expected.dtype
+        assert torch.allclose(value.float(), expected.float(), rtol=tolerance, atol=tolerance)
+
+
+def test_pytorch_size_mismatch(tmp_path: pathlib.Path):
+    torch = pytest.importorskip('torch')
+    from lab.experiment import pytorch
+
+    checkpoint = pytorch.Checkpoint(tmp_path / 'checkpoints', tmp_path / 'trash',
+                                    checkpoint_format='packed')
+    checkpoint.add_models({'model': torch.nn.Linear(3, 2)})
+    checkpoint.save(1, None)
+
+    checkpoint = pytorch.Checkpoint(tmp_path / 'checkpoints', tmp_path / 'trash')
+    checkpoint.add_models({'model': torch.nn.Linear(4, 2)})
+    with pytest.raises(RuntimeError):
+        checkpoint.load()
+
+
+@pytest.mark.parametrize('checkpoint_format,codec,storage_dtype', _TARGETS)
+def test_tensorflow(tmp_path: pathlib.Path, checkpoint_format, codec, storage_dtype):
+    tf = pytest.importorskip('tensorflow')
+    if not hasattr(tf, 'placeholder'):
+        pytest.skip("Needs the TensorFlow 1 graph API")
+    from lab.experiment import tensorflow
+
+    rng = np.random.default_rng(0)
+    values = [rng.standard_normal((6, 4)).astype(np.float32),
+              rng.standard_normal(4).astype(np.float32),
+              np.arange(5, dtype=np.int64)]
+
+    with tf.Graph().as_default():
+        variables = [tf.Variable(v, name=f"v{i}") for i, v in enumerate(values)]
+        with tf.Session() as session:
+            session.run(tf.global_variables_initializer())
+            # Small batches, so that variables are fetched and restored in several groups
+            checkpoint = tensorflow.Checkpoint(tmp_path / 'checkpoints', tmp_path / 'trash',
+                                               checkpoint_format=checkpoint_format,
+                                               codec=codec,
+                                               storage_dtype=storage_dtype,
+                                               max_batch_bytes=64)
+            checkpoint.set_variables(variables)
+            checkpoint.save(100, [session])
+
+            session.run([v.assign(tf.zeros_like(v)) for v in variables])
+            assert checkpoint.load(session)
+            restored = session.run(variables)
+
+    tolerance = 1e-2 if storage_dtype is not None else 0
+    for value, expected in zip(restored, values):
+        assert value.dtype == expected.dtype
+        np.testing.assert_allclose(value, expected, rtol=tolerance, atol=tolerance)